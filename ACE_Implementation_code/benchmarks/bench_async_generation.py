@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Async generation benchmark - Generator.generate_batch throughput over concurrency
+
+Uses MockLLM with a simulated per-request latency as an offline stand-in for a
+network-bound provider, so throughput should scale with the semaphore size and,
+with --prompt-batch-size, with the number of questions packed per prompt.
+
+Usage:
+    python benchmarks/bench_async_generation.py
+    python benchmarks/bench_async_generation.py --questions 2000 --latency 0.2
+    python benchmarks/bench_async_generation.py --prompt-batch-size 1 8
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.generator import Generator
+from src.components.playbook import Playbook
+from src.models.mock_llm import MockLLM
+
+QUESTIONS = [
+    "How many orders are there?",
+    "What is the total revenue?",
+    "Show employees with salary greater than 50000",
+    "Find the average price of products",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generator.generate_batch concurrency scaling")
+    parser.add_argument("--questions", type=int, default=400, help="Questions per run")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="Semaphore sizes to measure")
+    parser.add_argument("--prompt-batch-size", type=int, nargs="+", default=[1],
+                        help="Questions per prompt to measure")
+    args = parser.parse_args()
+    
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+    schemas = [{"tables": ["orders"], "columns": ["id", "amount", "price", "salary"]}] * args.questions
+    playbook = Playbook()
+    
+    results = []
+    for prompt_batch_size in args.prompt_batch_size:
+        for concurrency in args.concurrency:
+            generator = Generator(llm=MockLLM(latency=args.latency), use_mock_llm=False,
+                                  max_concurrency=concurrency, prompt_batch_size=prompt_batch_size)
+            start = time.perf_counter()
+            generator.generate_batch(questions, schemas, playbook)
+            results.append((prompt_batch_size, concurrency, len(questions) / (time.perf_counter() - start)))
+    
+    print(f"{'per prompt':>10} {'concurrency':>12} {'questions/s':>12} {'speedup':>8}")
+    baseline = results[0][2]
+    for prompt_batch_size, concurrency, rate in results:
+        print(f"{prompt_batch_size:>10} {concurrency:>12} {rate:>12,.1f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Budget benchmark - training under a token budget, with checkpoint and resume
+
+Trains ACETrainer on the synthetic dataset with the real AzureOpenAILLM and
+EmbeddingService clients against the local stand-in server, under a token
+budget worth about --budget-epochs epochs. Prints per-epoch accuracy,
+tokens and accuracy gained per 1k tokens, where the budget ran out, and
+that a fresh trainer resumes from the checkpoint. The stand-in answers with
+fixed rules that ignore the playbook, so accuracy gains reflect example
+selection only.
+
+Usage:
+    python benchmarks/bench_budget.py
+    python benchmarks/bench_budget.py --budget-epochs 1.5 --epochs 5
+"""
+
+import sys
+import random
+import argparse
+import contextlib
+import io
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.generator import Generator
+from src.components.playbook import Playbook
+from src.data.dataset import WikiSQLDataset
+from src.models.azure_openai_llm import AzureOpenAILLM
+from src.models.embedding_service import EmbeddingService
+from src.models.local_server import StandInServer
+from src.models.usage_meter import UsageMeter
+from src.training.budget import TrainingBudget
+from src.training.trainer import ACETrainer
+
+
+def build_trainer(server: StandInServer, dataset: WikiSQLDataset, meter: UsageMeter) -> ACETrainer:
+    llm = AzureOpenAILLM("local", server.url, "local-deployment", "gpt-4o", "2025-01-01-preview",
+                         usage_meter=meter)
+    embeddings = EmbeddingService("local", server.url, "local-embeddings", usage_meter=meter)
+    playbook = Playbook(embedding_service=embeddings, use_semantic_search=True)
+    generator = Generator(llm=llm, use_mock_llm=False, similarity_threshold=-1.0)
+    return ACETrainer(dataset, generator=generator, playbook=playbook, embedding_service=embeddings,
+                      usage_meter=meter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training under a token budget, with checkpoint and resume")
+    parser.add_argument("--epochs", type=int, default=4, help="Most training epochs")
+    parser.add_argument("--budget-epochs", type=float, default=2.5, help="Token budget, in first-epoch costs")
+    args = parser.parse_args()
+
+    random.seed(0)
+    dataset = WikiSQLDataset(use_real_data=False)
+    train = dataset._create_expanded_synthetic_data()
+
+    with StandInServer() as server, tempfile.TemporaryDirectory() as tmp:
+        checkpoint = Path(tmp) / "checkpoint.json"
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Price one epoch first, then train from scratch under the budget
+            probe_meter = UsageMeter()
+            build_trainer(server, dataset, probe_meter).train_offline(list(train), num_epochs=1,
+                                                                      target_accuracy=101.0)
+            epoch_tokens = probe_meter.totals()["input_tokens"] + probe_meter.totals()["output_tokens"]
+
+            meter = UsageMeter()
+            budget = TrainingBudget(max_tokens=int(epoch_tokens * args.budget_epochs), usage_meter=meter)
+            trainer = build_trainer(server, dataset, meter)
+            trainer.train_offline(list(train), num_epochs=args.epochs, target_accuracy=101.0,
+                                  budget=budget, checkpoint_path=checkpoint)
+
+            resumed = build_trainer(server, dataset, UsageMeter())
+            resumed.load_checkpoint(checkpoint)
+
+    metrics = trainer.metrics
+    print(f"\nToken budget {budget.max_tokens} (~{args.budget_epochs} epochs of {epoch_tokens} tokens)\n")
+    print(f"{'epoch':>6} {'accuracy':>9} {'tokens':>8} {'gain/1k tokens':>15}")
+    for epoch, (accuracy, usage, gain) in enumerate(zip(metrics["accuracy_history"], metrics["usage_history"],
+                                                        metrics["accuracy_gain_per_1k_tokens"]), 1):
+        tokens = usage["input_tokens"] + usage["output_tokens"]
+        print(f"{epoch:>6} {accuracy:>8.1f}% {tokens:>8} {'n/a' if gain is None else f'{gain:+.3f}':>15}")
+    stats = metrics["budget"]
+    print(f"\nStopped: {stats['exhausted'] or 'epochs done'} after {stats['examples']} examples, "
+          f"{stats['used']['tokens']} tokens, {stats['used']['requests']} requests")
+    print(f"Resumed trainer: {len(resumed.metrics['accuracy_history'])} epochs, "
+          f"{len(resumed.playbook.bullets)} bullets, {len(resumed.outcomes)} question outcomes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Cascade benchmark - LLM calls, latency and accuracy with and without the cascade
+
+Calibrates a CascadeRouter on a training split of the synthetic dataset and
+answers the test split twice with Generator.generate_batch: once sending
+every question to the LLM and once through the cascade. The LLM is a
+simulated model with a fixed latency that returns the gold SQL with a given
+accuracy, so the numbers isolate the routing itself. The synthetic training
+split has only a few examples per question shape, hence the lower default
+threshold.
+
+Usage:
+    python benchmarks/bench_cascade.py
+    python benchmarks/bench_cascade.py --latency 0.5 --llm-accuracy 0.8 --threshold 0.85
+"""
+
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.cascade import CascadeRouter
+from src.components.generator import Generator
+from src.components.playbook import Playbook
+from src.data.dataset import WikiSQLDataset
+from src.models.base_llm import BaseLLM
+from src.utils.mock_sql import rule_sql
+from src.utils.sql_canonical import sql_equal
+
+
+class SimulatedLLM(BaseLLM):
+    """Returns the gold SQL with probability `accuracy` after `latency` seconds"""
+
+    def __init__(self, gold, latency: float, accuracy: float, seed: int = 0):
+        self.gold = gold
+        self.latency = latency
+        self.accuracy = accuracy
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def _answer(self, question, schema):
+        self.calls += 1
+        return self.gold[question] if self._rng.random() < self.accuracy else rule_sql(question, schema)
+
+    def generate_sql(self, question, schema, playbook, relevant_bullets):
+        time.sleep(self.latency)
+        return self._answer(question, schema)
+
+    async def agenerate_sql(self, question, schema, playbook, relevant_bullets):
+        await asyncio.sleep(self.latency)
+        return self._answer(question, schema)
+
+
+def run(examples, gold, args, cascade=None):
+    llm = SimulatedLLM(gold, args.latency, args.llm_accuracy)
+    generator = Generator(llm=llm, use_mock_llm=False, max_concurrency=args.concurrency, cascade=cascade)
+    playbook = Playbook()
+    start = time.perf_counter()
+    answers = generator.generate_batch([e["question"] for e in examples], [e["schema"] for e in examples],
+                                       playbook)
+    elapsed = time.perf_counter() - start
+    correct = 0
+    for example, (sql, _) in zip(examples, answers):
+        is_correct = sql_equal(sql, example["sql"])
+        generator.record_outcome(example["question"], example["sql"], is_correct)
+        correct += is_correct
+    return llm.calls, elapsed, correct / len(examples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM calls, latency and accuracy with and without the cascade")
+    parser.add_argument("--repeat", type=int, default=20, help="Copies of the test split to answer")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated LLM seconds per call")
+    parser.add_argument("--llm-accuracy", type=float, default=0.85, help="Simulated LLM accuracy")
+    parser.add_argument("--threshold", type=float, default=0.75, help="Cascade confidence threshold")
+    parser.add_argument("--audit-rate", type=float, default=0.05, help="Share of local answers audited")
+    parser.add_argument("--concurrency", type=int, default=8, help="In-flight LLM requests")
+    args = parser.parse_args()
+
+    dataset = WikiSQLDataset(use_real_data=False)
+    data = dataset._create_expanded_synthetic_data()
+    random.Random(0).shuffle(data)
+    split = int(len(data) * 0.6)
+    train, test = data[:split], data[split:]
+    gold = {e["question"]: e["sql"] for e in data}
+    # Trailing spaces keep repeated questions distinct for per-question outcome tracking
+    examples = [dict(e, question=e["question"] + " " * i) for i in range(args.repeat) for e in test]
+    gold.update({e["question"]: e["sql"] for e in examples})
+
+    cascade = CascadeRouter(threshold=args.threshold, audit_rate=args.audit_rate).fit(train)
+    llm_calls, llm_time, llm_accuracy = run(examples, gold, args)
+    cascade_calls, cascade_time, cascade_accuracy = run(examples, gold, args, cascade)
+    stats = cascade.stats()
+
+    print(f"Calibrated on {len(train)} examples; answering {len(examples)} questions\n")
+    print(f"{'mode':>10} {'LLM calls':>10} {'wall time':>10} {'accuracy':>9}")
+    print(f"{'LLM only':>10} {llm_calls:>10} {llm_time:>9.2f}s {llm_accuracy:>9.1%}")
+    print(f"{'cascade':>10} {cascade_calls:>10} {cascade_time:>9.2f}s {cascade_accuracy:>9.1%}")
+    print(f"\nLocal answers: {stats['local_answers']}/{stats['routed']} "
+          f"({stats['llm_calls_avoided_ratio']:.0%} of LLM calls avoided, "
+          f"~{stats['estimated_latency_saved']:.1f}s of LLM latency saved)")
+    local_accuracy, escalated_accuracy = stats["local_accuracy"], stats["escalated_accuracy"]
+    print(f"Accuracy: local {'n/a' if local_accuracy is None else f'{local_accuracy:.1%}'}, "
+          f"escalated {'n/a' if escalated_accuracy is None else f'{escalated_accuracy:.1%}'}")
+    if stats["audit_accuracy_delta"] is not None:
+        print(f"Audit: local vs LLM accuracy delta {stats['audit_accuracy_delta']:+.1%} "
+              f"over {stats['audited']} audited questions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Hedging benchmark - p50/p95/p99 latency with and without hedged requests
+
+Runs AzureOpenAILLM against a local stand-in server with a heavy-tailed
+(lognormal) latency, once plain and once wrapped in HedgedLLM, and reports
+latency percentiles and the share of requests hedged, plus HedgedLLM's own
+primary-attempt ("before") and winner ("after") percentiles. The client's AIMD
+in-flight limit is pinned above the offered concurrency, so duplicates are
+not queued behind the requests they hedge.
+
+Usage:
+    python benchmarks/bench_hedging.py
+    python benchmarks/bench_hedging.py --requests 500 --sigma 1.2 --percentile 95 --sync
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.playbook import Playbook
+from src.models.azure_openai_llm import AzureOpenAILLM
+from src.models.hedged_llm import HedgedLLM, latency_percentiles
+from src.models.local_server import LatencyModel, StandInConfig, StandInServer
+from src.models.rate_limiter import AIMDController
+
+QUESTIONS = [
+    "How many orders are there?",
+    "What is the total revenue?",
+    "Show employees with salary greater than 50000",
+    "Find the average price of products",
+]
+SCHEMA = {"tables": ["orders"], "columns": ["amount", "price", "salary"]}
+
+
+async def run_async(llm, requests: int, concurrency: int):
+    playbook = Playbook()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await llm.agenerate_sql(QUESTIONS[i % len(QUESTIONS)], SCHEMA, playbook, [])
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        await llm.arelease_loop()
+    return latencies
+
+
+def run_sync(llm, requests: int):
+    playbook = Playbook()
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        llm.generate_sql(QUESTIONS[i % len(QUESTIONS)], SCHEMA, playbook, [])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency percentiles with and without hedged requests")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="In-flight requests (async mode)")
+    parser.add_argument("--latency-mean", type=float, default=0.05, help="Mean server seconds per request")
+    parser.add_argument("--sigma", type=float, default=1.0, help="Lognormal sigma of server latency")
+    parser.add_argument("--percentile", type=float, default=90, help="Hedging deadline percentile")
+    parser.add_argument("--max-hedge-ratio", type=float, default=0.1, help="Most hedges per request")
+    parser.add_argument("--sync", action="store_true", help="Sequential generate_sql instead of async")
+    args = parser.parse_args()
+
+    config = StandInConfig(latency=LatencyModel("lognormal", args.latency_mean, args.sigma))
+    with StandInServer(config=config) as server:
+        results = {}
+        for mode in ("plain", "hedged"):
+            sent = server.stats["chat"]
+            limit = 2 * args.concurrency
+            llm = AzureOpenAILLM("local", server.url, "local-deployment", "gpt-4o", "2025-01-01-preview",
+                                 concurrency=AIMDController(initial=limit, minimum=limit, maximum=limit))
+            if mode == "hedged":
+                llm = HedgedLLM(llm, percentile=args.percentile, max_hedge_ratio=args.max_hedge_ratio)
+            if args.sync:
+                latencies = run_sync(llm, args.requests)
+            else:
+                latencies = asyncio.run(run_async(llm, args.requests, args.concurrency))
+            results[mode] = (latencies, llm.usage_stats(), server.stats["chat"] - sent)
+
+    print(f"\n{'mode':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'requests sent':>14}")
+    for mode, (latencies, _, sent) in results.items():
+        percentiles = latency_percentiles(latencies)
+        print(f"{mode:>8} {percentiles['p50']:>7.3f}s {percentiles['p95']:>7.3f}s {percentiles['p99']:>7.3f}s "
+              f"{sent:>14}")
+    hedging = results["hedged"][1]["hedging"]
+    for label in ("primary", "winner"):
+        percentiles = hedging[label]
+        print(f"{label:>8} {percentiles['p50']:>7.3f}s {percentiles['p95']:>7.3f}s {percentiles['p99']:>7.3f}s "
+              f"{'(HedgedLLM)':>14}")
+    print(f"\nHedged {hedging['hedged']}/{hedging['requests']} requests ({hedging['hedge_ratio']:.1%}), "
+          f"{hedging['hedge_wins']} won by the duplicate; final deadline {hedging['deadline']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
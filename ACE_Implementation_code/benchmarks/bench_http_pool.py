@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+HTTP pool benchmark - connections opened and throughput with pooled clients
+
+Sends chat batches (each Generator.generate_batch call runs its own event
+loop) and embedding requests through AzureOpenAILLM and EmbeddingService
+against the local stand-in server, once with a shared keep-alive pool and
+once with keep-alive disabled, and counts the TCP connections the server
+accepted.
+
+Usage:
+    python benchmarks/bench_http_pool.py
+    python benchmarks/bench_http_pool.py --batches 10 --questions 200 --concurrency 32
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.generator import Generator
+from src.components.playbook import Playbook
+from src.models.azure_openai_llm import AzureOpenAILLM
+from src.models.embedding_service import EmbeddingService
+from src.models.http_pool import HTTPClientFactory
+from src.models.local_server import LatencyModel, StandInConfig, StandInServer
+
+
+def run(clients: HTTPClientFactory, args):
+    questions = [f"How many orders are there? (#{i})" for i in range(args.questions)]
+    schemas = [{"tables": ["orders"], "columns": ["id", "amount"]}] * args.questions
+    playbook = Playbook()
+    config = StandInConfig(latency=LatencyModel("fixed", args.latency_mean))
+
+    with StandInServer(config=config) as server:
+        llm = AzureOpenAILLM("local", server.url, "local-deployment", "gpt-4o",
+                             "2025-01-01-preview", http_clients=clients)
+        embeddings = EmbeddingService("local", server.url, "local-embeddings", http_clients=clients)
+        generator = Generator(llm=llm, use_mock_llm=False, max_concurrency=args.concurrency)
+
+        start = time.perf_counter()
+        failed = 0
+        for _ in range(args.batches):
+            results = generator.generate_batch(questions, schemas, playbook)
+            failed += sum(1 for sql, _ in results if sql is None)
+            for question in questions[:args.embeddings]:
+                embeddings.embed_text(question)
+        elapsed = time.perf_counter() - start
+        requests = server.stats["chat"] + server.stats["embeddings"]
+        return requests / elapsed, server.stats["connections"], requests, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connections and throughput with pooled HTTP clients")
+    parser.add_argument("--batches", type=int, default=5, help="generate_batch calls (event loops)")
+    parser.add_argument("--questions", type=int, default=100, help="Questions per batch")
+    parser.add_argument("--embeddings", type=int, default=20, help="Embedding requests after each batch")
+    parser.add_argument("--concurrency", type=int, default=16, help="Generator semaphore size")
+    parser.add_argument("--latency-mean", type=float, default=0.005, help="Server seconds per request")
+    args = parser.parse_args()
+
+    print(f"{'mode':>12} {'requests/s':>11} {'requests':>9} {'connections':>12} {'failed':>7}")
+    for mode, clients in (
+        ("pooled", HTTPClientFactory()),
+        ("no reuse", HTTPClientFactory(max_keepalive_connections=0)),
+    ):
+        rate, connections, requests, failed = run(clients, args)
+        clients.close()
+        print(f"{mode:>12} {rate:>11,.1f} {requests:>9} {connections:>12} {failed:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test against the local Azure OpenAI stand-in server
+
+Runs the real AzureOpenAILLM client (retries, rate limiting, AIMD
+concurrency, prompt packing) through Generator.generate_batch against
+src/models/local_server.py with injected latency, 429s and 5xx errors.
+
+Usage:
+    python benchmarks/bench_local_server.py
+    python benchmarks/bench_local_server.py --questions 2000 --throttle-rate 0.1 --error-rate 0.02
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.generator import Generator
+from src.components.playbook import Playbook
+from src.models.azure_openai_llm import AzureOpenAILLM
+from src.models.local_server import LatencyModel, StandInConfig, StandInServer
+from src.models.rate_limiter import RetryPolicy
+
+QUESTIONS = [
+    "How many orders are there?",
+    "What is the total revenue?",
+    "Show employees with salary greater than 50000",
+    "Find the average price of products",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test AzureOpenAILLM against the local stand-in")
+    parser.add_argument("--questions", type=int, default=400, help="Questions per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="Generator semaphore sizes to measure")
+    parser.add_argument("--prompt-batch-size", type=int, default=1, help="Questions per prompt")
+    parser.add_argument("--latency-dist", choices=LatencyModel.DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=0.05, help="Mean server seconds per request")
+    parser.add_argument("--rpm", type=float, default=None, help="Server requests/min before 429s")
+    parser.add_argument("--throttle-rate", type=float, default=0.05, help="Share of random 429s")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Share of random 500/503s")
+    args = parser.parse_args()
+    
+    questions = [f"{QUESTIONS[i % len(QUESTIONS)]} (#{i})" for i in range(args.questions)]
+    schemas = [{"tables": ["orders"], "columns": ["id", "amount", "price", "salary"]}] * args.questions
+    playbook = Playbook()
+    retry_policy = RetryPolicy(max_retries=8, base_delay=0.05, max_delay=1.0)
+    
+    print(f"{'concurrency':>12} {'questions/s':>12} {'failed':>7} {'429s':>6} {'5xx':>5} {'AIMD limit':>11}")
+    for concurrency in args.concurrency:
+        config = StandInConfig(
+            latency=LatencyModel(args.latency_dist, args.latency_mean),
+            requests_per_minute=args.rpm,
+            throttle_rate=args.throttle_rate,
+            error_rate=args.error_rate,
+            retry_after=0.05,
+        )
+        with StandInServer(config=config) as server:
+            llm = AzureOpenAILLM("local", server.url, "local-deployment", "gpt-4o",
+                                 "2025-01-01-preview", retry_policy=retry_policy)
+            generator = Generator(llm=llm, use_mock_llm=False, max_concurrency=concurrency,
+                                  prompt_batch_size=args.prompt_batch_size)
+            
+            start = time.perf_counter()
+            results = generator.generate_batch(questions, schemas, playbook)
+            rate = len(questions) / (time.perf_counter() - start)
+            failed = sum(1 for sql, _ in results if sql is None)
+            print(f"{concurrency:>12} {rate:>12,.1f} {failed:>7} {server.stats['throttled']:>6} "
+                  f"{server.stats['errors']:>5} {llm.concurrency.limit:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
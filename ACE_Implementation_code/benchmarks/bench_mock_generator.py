@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Mock generator microbenchmark - questions per second
+
+Compares the compiled intent table (per call and through generate_batch)
+with the original per-call if/elif rules, and checks that both produce the
+same SQL.
+
+Usage:
+    python benchmarks/bench_mock_generator.py
+    python benchmarks/bench_mock_generator.py --questions 1000000
+"""
+
+import re
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.data.dataset import WikiSQLDataset
+from src.utils.mock_sql import generate_batch, rule_sql
+
+
+def legacy_rule_sql(question, schema):
+    """The if/elif rules the compiled classifier replaced"""
+    question_lower = question.lower()
+    tables = schema.get("tables", ["table"])
+    columns = schema.get("columns", ["*"])
+    if "count" in question_lower or "how many" in question_lower:
+        return f"SELECT COUNT(*) FROM {tables[0]}"
+    elif "sum" in question_lower or "total" in question_lower:
+        return f"SELECT SUM({columns[0] if columns else 'amount'}) FROM {tables[0]}"
+    elif "average" in question_lower or "avg" in question_lower:
+        return f"SELECT AVG({columns[0] if columns else 'price'}) FROM {tables[0]}"
+    elif "maximum" in question_lower or "max" in question_lower:
+        return f"SELECT MAX({columns[0] if columns else 'value'}) FROM {tables[0]}"
+    elif "greater than" in question_lower or "more than" in question_lower:
+        numbers = re.findall(r'\d+', question)
+        value = numbers[0] if numbers else "100"
+        return f"SELECT * FROM {tables[0]} WHERE {columns[0] if columns else 'value'} > {value}"
+    elif "less than" in question_lower:
+        numbers = re.findall(r'\d+', question)
+        value = numbers[0] if numbers else "100"
+        return f"SELECT * FROM {tables[0]} WHERE {columns[0] if columns else 'price'} < {value}"
+    elif "group by" in question_lower or "by" in question_lower:
+        col1 = columns[0] if len(columns) > 0 else "category"
+        col2 = columns[1] if len(columns) > 1 else "amount"
+        return f"SELECT {col1}, SUM({col2}) FROM {tables[0]} GROUP BY {col1}"
+    else:
+        return f"SELECT * FROM {tables[0]}"
+
+
+def build_questions(num_questions: int):
+    """Synthetic questions, made unique with a numeric suffix"""
+    examples = WikiSQLDataset(sample_size=1000, use_real_data=False)._create_expanded_synthetic_data()
+    rng = random.Random(0)
+    picked = [rng.choice(examples) for _ in range(num_questions)]
+    questions = [f"{example['question']} #{i}" for i, example in enumerate(picked)]
+    return questions, [example["schema"] for example in picked]
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock generator questions per second")
+    parser.add_argument("--questions", type=int, default=200000, help="Questions per run")
+    args = parser.parse_args()
+
+    questions, schemas = build_questions(args.questions)
+    n = len(questions)
+
+    legacy = timed(lambda: [legacy_rule_sql(q, s) for q, s in zip(questions, schemas)])
+    single = timed(lambda: [rule_sql(q, s) for q, s in zip(questions, schemas)])
+    batch = timed(lambda: generate_batch(questions, schemas))
+
+    mismatches = sum(
+        legacy_rule_sql(q, s) != sql for q, s, sql in zip(questions, schemas, generate_batch(questions, schemas))
+    )
+
+    print(f"Questions: {n:,}")
+    print(f"Legacy if/elif rules:      {n / legacy:,.0f} questions/s")
+    print(f"rule_sql per call:         {n / single:,.0f} questions/s")
+    print(f"generate_batch:            {n / batch:,.0f} questions/s")
+    print(f"Output mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Reflector microbenchmark - analyses per second
+
+Usage:
+    python benchmarks/bench_reflector.py
+    python benchmarks/bench_reflector.py --pairs 100000
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.generator import Generator
+from src.components.playbook import Playbook
+from src.components.reflector import Reflector, sql_features
+from src.data.dataset import WikiSQLDataset
+from src.utils.sql_canonical import canonicalize_sql, canonical_sql_text, tokenize_sql
+
+
+def build_pairs(num_pairs: int):
+    """(question, generated, correct) triples from the synthetic dataset and the mock generator"""
+    dataset = WikiSQLDataset(sample_size=1000, use_real_data=False)
+    examples = dataset._create_expanded_synthetic_data()
+    generator = Generator(use_mock_llm=True)
+    playbook = Playbook()
+    
+    base = [
+        (ex["question"], generator.generate_sql(ex["question"], ex["schema"], playbook)[0], ex["sql"])
+        for ex in examples
+    ]
+    rng = random.Random(0)
+    return [rng.choice(base) for _ in range(num_pairs)]
+
+
+def clear_caches():
+    for cached in (tokenize_sql, canonicalize_sql, canonical_sql_text, sql_features):
+        cached.cache_clear()
+
+
+def run(reflector: Reflector, pairs) -> float:
+    start = time.perf_counter()
+    for question, generated_sql, correct_sql in pairs:
+        reflector.analyze(question, generated_sql, correct_sql, generated_sql == correct_sql)
+    return len(pairs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reflector analyses per second")
+    parser.add_argument("--pairs", type=int, default=50000, help="Number of analyses per run")
+    args = parser.parse_args()
+    
+    pairs = build_pairs(args.pairs)
+    reflector = Reflector()
+    
+    clear_caches()
+    cold = run(reflector, pairs[:len(set(pairs))])
+    warm = run(reflector, pairs)
+    
+    print(f"Distinct triples: {len(set(pairs))}")
+    print(f"Cold (caches cleared): {cold:,.0f} analyses/s")
+    print(f"Warm (repeated SQL):   {warm:,.0f} analyses/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Reflector scaling benchmark - analyze_batch throughput from 1 worker to the core count
+
+Every attempt carries distinct SQL literals so per-process caches do not hide
+the CPU work.
+
+Usage:
+    python benchmarks/bench_reflector_parallel.py
+    python benchmarks/bench_reflector_parallel.py --items 400000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.reflector import Reflector
+
+TEMPLATES = [
+    ("SELECT * FROM employees", "SELECT * FROM employees WHERE salary > {n}"),
+    ("SELECT name FROM employees WHERE salary > {n}", "SELECT COUNT(*) FROM employees WHERE salary > {n}"),
+    ("SELECT SUM(amount) FROM orders WHERE id < {n}", "SELECT customer, SUM(amount) FROM orders WHERE id < {n} GROUP BY customer"),
+    ("SELECT * FROM orders WHERE id = {n}", "SELECT * FROM orders WHERE id = {n} ORDER BY date DESC LIMIT 1"),
+    ("SELECT name AS n FROM products WHERE price > {n}", "SELECT name FROM products WHERE price > {n}"),
+]
+
+
+def build_items(num_items: int, seed: int = 0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(num_items):
+        generated, correct = rng.choice(TEMPLATES)
+        items.append((f"question {i}", generated.format(n=i), correct.format(n=i), False))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reflector.analyze_batch scaling")
+    parser.add_argument("--items", type=int, default=200000, help="Attempts per run")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1,
+                        help="Largest worker count to measure (default: core count)")
+    args = parser.parse_args()
+    
+    print(f"{'workers':>8} {'analyses/s':>14} {'speedup':>8}")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        # Fresh literals per run so no worker has them cached
+        items = build_items(args.items, seed=workers)
+        reflector = Reflector(cache_size=0)
+        if workers > 1:
+            reflector._get_pool(workers)  # keep process start-up out of the timing
+        
+        start = time.perf_counter()
+        reflector.analyze_batch(items, workers=workers)
+        rate = len(items) / (time.perf_counter() - start)
+        reflector.close()
+        
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>14,.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
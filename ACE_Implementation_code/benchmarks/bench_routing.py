@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Routing benchmark - traffic shares, draining and recovery across deployments
+
+Starts three local stand-in servers with different latency profiles and
+routes async requests across them with RoutedLLM in three phases: all
+healthy, the fastest endpoint failing every request, and the fastest
+endpoint recovered. Reports the traffic share per endpoint, failovers and
+latency percentiles per phase.
+
+Usage:
+    python benchmarks/bench_routing.py
+    python benchmarks/bench_routing.py --requests 400 --concurrency 16
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.playbook import Playbook
+from src.models.azure_openai_llm import AzureOpenAILLM
+from src.models.local_server import LatencyModel, StandInConfig, StandInServer
+from src.models.rate_limiter import RetryPolicy
+from src.models.router_llm import Backend, RoutedLLM
+
+PROFILES = {"fast": 0.05, "medium": 0.15, "slow": 0.4}
+
+QUESTIONS = [
+    "How many orders are there?",
+    "What is the total revenue?",
+    "Show employees with salary greater than 50000",
+    "Find the average price of products",
+]
+
+
+async def run_phase(router: RoutedLLM, requests: int, concurrency: int):
+    schema = {"tables": ["orders"], "columns": ["amount", "price", "salary"]}
+    playbook = Playbook()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await router.agenerate_sql(QUESTIONS[i % len(QUESTIONS)], schema, playbook, [])
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        await router.arelease_loop()
+    return latencies
+
+
+def percentile(values, q: float) -> float:
+    return statistics.quantiles(values, n=100)[int(q) - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency-aware routing across stand-in deployments")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per phase")
+    parser.add_argument("--concurrency", type=int, default=8, help="In-flight requests")
+    parser.add_argument("--drain-seconds", type=float, default=0.5, help="First drain cooldown")
+    args = parser.parse_args()
+
+    servers = {
+        name: StandInServer(config=StandInConfig(latency=LatencyModel("lognormal", mean, 0.3), seed=i)).start()
+        for i, (name, mean) in enumerate(PROFILES.items())
+    }
+    backends = [
+        Backend(name, AzureOpenAILLM("local", server.url, name, "gpt-4o", "2025-01-01-preview",
+                                     retry_policy=RetryPolicy(max_retries=0)))
+        for name, server in servers.items()
+    ]
+    router = RoutedLLM(backends, drain_seconds=args.drain_seconds, max_drain_seconds=args.drain_seconds * 4)
+
+    phases = [("healthy", 0.0), ("fast failing", 1.0), ("fast recovered", 0.0)]
+    print(f"\n{'phase':>16} " + " ".join(f"{name:>8}" for name in PROFILES) +
+          f" {'failovers':>10} {'p50':>7} {'p95':>7}")
+    try:
+        for phase, error_rate in phases:
+            servers["fast"].config.error_rate = error_rate
+            before = {b.name: b.stats["routed"] for b in backends}
+            failovers = router.decisions["failovers"]
+            latencies = asyncio.run(run_phase(router, args.requests, args.concurrency))
+            routed = {b.name: b.stats["routed"] - before[b.name] for b in backends}
+            total = sum(routed.values())
+            shares = " ".join(f"{routed[name] / total:>8.0%}" for name in PROFILES)
+            print(f"{phase:>16} {shares} {router.decisions['failovers'] - failovers:>10} "
+                  f"{percentile(latencies, 50):>6.3f}s {percentile(latencies, 95):>6.3f}s")
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    print("\nFinal backend state:")
+    for name, backend in router.routing_stats()["backends"].items():
+        print(f"  {name:>6}: {backend['state']}, EWMA {backend['latency_ewma'] or 0:.3f}s, "
+              f"{backend['drains']} drains, {backend['recoveries']} recoveries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark - import time of main.py, with a regression budget
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and reports
+the median total import time and the slowest modules. Exits with status 1
+when the median exceeds the budget or when a heavy dependency that should
+load lazily (datasets, langchain, openai, httpx, sklearn) is imported at
+startup.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 250
+"""
+
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Dependencies that must not be imported just by importing main
+LAZY_MODULES = ("datasets", "langchain", "langchain_core", "langchain_openai", "openai", "httpx", "sklearn")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_profile(module: str):
+    """(total microseconds, {module: cumulative microseconds}) for one fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    total = 0
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        _, micros, indent, name = match.groups()
+        cumulative[name] = int(micros)
+        if len(indent) == 1:
+            # Top-level import: its cumulative time includes everything it pulled in
+            total += int(micros)
+    return total, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of main.py with a regression budget")
+    parser.add_argument("--module", default="main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="Median total import time allowed")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(total for total, _ in profiles) / 1000
+    _, cumulative = profiles[-1]
+
+    print(f"Slowest imports of `{args.module}` (cumulative, last run):")
+    for name, micros in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {micros / 1000:>8.1f} ms  {name}")
+
+    eager = sorted(name for name in cumulative if name.split(".")[0] in LAZY_MODULES)
+    print(f"\nMedian total import time over {args.runs} runs: {median_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if median_ms > args.budget_ms:
+        print("FAIL: import time is over budget")
+        failed = True
+    if eager:
+        roots = sorted({name.split(".")[0] for name in eager})
+        print(f"FAIL: heavy dependencies imported at startup: {', '.join(roots)}")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
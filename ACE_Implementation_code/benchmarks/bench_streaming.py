@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Streaming benchmark - latency of full completions vs early-terminated streams
+
+Runs AzureOpenAILLM against the local stand-in server, whose answers are
+generated token by token and followed by an explanation (as chatty models
+do), once waiting for full completions and once streaming with early
+termination. Reports time to first token, time to SQL and output tokens.
+
+Usage:
+    python benchmarks/bench_streaming.py
+    python benchmarks/bench_streaming.py --questions 100 --token-delay 0.01
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.components.playbook import Playbook
+from src.models.azure_openai_llm import AzureOpenAILLM
+from src.models.local_server import StandInConfig, StandInServer
+
+QUESTIONS = [
+    "How many orders are there?",
+    "What is the total revenue?",
+    "Show employees with salary greater than 50000",
+    "Find the average price of products",
+]
+
+EXPLANATION = (
+    "\n\nThis query reads the table and applies the requested aggregation or filter. "
+    "It assumes the column names given in the schema and returns a single result set."
+)
+
+
+def run(server: StandInServer, stream: bool, questions, schema, playbook):
+    llm = AzureOpenAILLM("local", server.url, "local-deployment", "gpt-4o", "2025-01-01-preview", stream=stream)
+    latencies = []
+    answers = []
+    for question in questions:
+        start = time.perf_counter()
+        answers.append(llm.generate_sql(question, schema, playbook, []))
+        latencies.append(time.perf_counter() - start)
+    return llm.usage_stats(), latencies, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs early-terminated streaming completions")
+    parser.add_argument("--questions", type=int, default=40, help="Questions per mode")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Server seconds per output token")
+    args = parser.parse_args()
+
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+    schema = {"tables": ["orders"], "columns": ["amount", "price", "salary"]}
+    playbook = Playbook()
+    config = StandInConfig(token_delay=args.token_delay, trailing_text=EXPLANATION)
+
+    with StandInServer(config=config) as server:
+        full_usage, full_latencies, full_answers = run(server, False, questions, schema, playbook)
+        stream_usage, stream_latencies, stream_answers = run(server, True, questions, schema, playbook)
+
+    print(f"{'mode':>10} {'p50 latency':>12} {'mean latency':>13} {'TTFT':>8} {'output tokens':>14}")
+    print(f"{'full':>10} {statistics.median(full_latencies):>11.3f}s {statistics.mean(full_latencies):>12.3f}s "
+          f"{'-':>8} {full_usage['completion_tokens']:>14}")
+    print(f"{'streaming':>10} {statistics.median(stream_latencies):>11.3f}s {statistics.mean(stream_latencies):>12.3f}s "
+          f"{stream_usage['avg_time_to_first_token']:>7.3f}s {stream_usage['completion_tokens']:>14}")
+    print(f"Average time to SQL: {stream_usage['avg_time_to_sql']:.3f}s "
+          f"({stream_usage['early_stops']}/{stream_usage['streamed_requests']} streams closed early)")
+    print(f"Answers stripped of trailing text: {sum(a != b for a, b in zip(full_answers, stream_answers))}"
+          f"/{len(questions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Usage benchmark - tokens, wall time and cost as the playbook grows
+
+Trains ACETrainer for a few epochs on the synthetic dataset with the real
+AzureOpenAILLM and EmbeddingService clients pointed at the local stand-in
+server, all reporting to one UsageMeter, then evaluates. Prints usage per
+phase (epoch / evaluation), per stage (generation / embedding) and per
+number of playbook bullets in the prompt. The similarity threshold is
+disabled so every prompt carries up to --top-k bullets, as a grown
+playbook does.
+
+Usage:
+    python benchmarks/bench_usage.py
+    python benchmarks/bench_usage.py --epochs 4 --top-k 10 --latency-mean 0.02
+"""
+
+import sys
+import random
+import argparse
+import contextlib
+import io
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import USAGE_CONFIG
+from src.components.generator import Generator
+from src.components.playbook import Playbook
+from src.data.dataset import WikiSQLDataset
+from src.models.azure_openai_llm import AzureOpenAILLM
+from src.models.embedding_service import EmbeddingService
+from src.models.local_server import LatencyModel, StandInConfig, StandInServer
+from src.models.usage_meter import UsageMeter
+from src.training.trainer import ACETrainer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens, wall time and cost as the playbook grows")
+    parser.add_argument("--epochs", type=int, default=3, help="Training epochs")
+    parser.add_argument("--top-k", type=int, default=8, help="Most bullets per prompt")
+    parser.add_argument("--latency-mean", type=float, default=0.005, help="Mean server seconds per request")
+    args = parser.parse_args()
+
+    random.seed(0)
+    dataset = WikiSQLDataset(use_real_data=False)
+    data = dataset._create_expanded_synthetic_data()
+    random.shuffle(data)
+    split = int(len(data) * 0.7)
+    train, test = data[:split], data[split:]
+
+    meter = UsageMeter(prices=USAGE_CONFIG["prices_per_1k_tokens"])
+    config = StandInConfig(latency=LatencyModel("lognormal", args.latency_mean, 0.5))
+    with StandInServer(config=config) as server:
+        llm = AzureOpenAILLM("local", server.url, "local-deployment", "gpt-4o", "2025-01-01-preview",
+                             usage_meter=meter)
+        embeddings = EmbeddingService("local", server.url, "local-embeddings", usage_meter=meter)
+        playbook = Playbook(embedding_service=embeddings, use_semantic_search=True)
+        generator = Generator(llm=llm, use_mock_llm=False, top_k_bullets=args.top_k, similarity_threshold=-1.0)
+        trainer = ACETrainer(dataset, generator=generator, playbook=playbook, embedding_service=embeddings,
+                             usage_meter=meter)
+        with contextlib.redirect_stdout(io.StringIO()):
+            trainer.train_offline(train, num_epochs=args.epochs, target_accuracy=101.0)
+            trainer.evaluate(test)
+
+    report = meter.report()
+    row = "{:>18} {:>6} {:>10} {:>8} {:>10} {:>9} {:>9}"
+    print(f"\nTrained {args.epochs} epochs on {len(train)} examples, evaluated on {len(test)}\n")
+    print(row.format("", "calls", "in/call", "out/call", "s/call", "cached", "cost $"))
+
+    def print_row(label, usage):
+        print(row.format(label, usage["calls"], f"{usage['avg_input_tokens']:.0f}",
+                         f"{usage['avg_output_tokens']:.1f}", f"{usage['avg_seconds']:.4f}",
+                         f"{usage['cached_ratio']:.0%}", f"{usage['cost']:.4f}"))
+
+    for phase, usage in report["by_phase"].items():
+        print_row(phase, usage["total"])
+    print()
+    for stage, usage in report["by_stage"].items():
+        print_row(stage, usage)
+    print()
+    for bullets, usage in report["by_bullets"].items():
+        print_row(f"{bullets} bullets", usage)
+    print()
+    print_row("total", report["total"])
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,8 @@ Configuration file for ACE SQL Agent
 """
 
 import os
+import json
 from pathlib import Path
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 # Project paths
 PROJECT_ROOT = Path(__file__).parent
@@ -15,9 +12,25 @@ DATA_DIR = PROJECT_ROOT / "data"
 RESULTS_DIR = PROJECT_ROOT / "results"
 SRC_DIR = PROJECT_ROOT / "src"
 
-# Ensure directories exist
-DATA_DIR.mkdir(exist_ok=True)
-RESULTS_DIR.mkdir(exist_ok=True)
+
+def _load_env_file():
+    """Load the nearest .env file (this directory or a parent), importing dotenv only if one exists"""
+    for directory in (PROJECT_ROOT, *PROJECT_ROOT.resolve().parents):
+        env_file = directory / ".env"
+        if env_file.is_file():
+            from dotenv import load_dotenv
+            load_dotenv(env_file)
+            return
+
+
+def ensure_directories():
+    """Create the data and results directories (call before writing outputs)"""
+    DATA_DIR.mkdir(exist_ok=True)
+    RESULTS_DIR.mkdir(exist_ok=True)
+
+
+# Load environment variables from .env file
+_load_env_file()
 
 # Training configuration
 TRAINING_CONFIG = {
@@ -26,6 +39,16 @@ TRAINING_CONFIG = {
     "test_ratio": 0.3,
     "sample_size": 10,
     "early_stopping": True,
+    "batch_size": 1,  # Examples per curation mini-batch (1 = update after every example)
+    "reflection_workers": 1,  # Processes analyzing each curation mini-batch (batch_size > 1)
+    "reflection_cache_size": 10000,  # Reflections memoized across epochs (0 = disabled)
+    "execution_eval": False,  # Also score test queries by executing them on in-memory SQLite
+    "execution_eval_rows": 20,  # Synthetic rows per table when an example has no table rows
+    "execution_eval_workers": 1,  # Processes used for execution evaluation
+    "budget_seconds": None,  # Wall-clock limit for training (None = unlimited)
+    "budget_requests": None,  # Generation requests training may issue (None = unlimited)
+    "budget_tokens": None,  # Input + output tokens over all LLM and embedding calls (None = unlimited)
+    "checkpoint_file": RESULTS_DIR / "checkpoint.json",  # Saved when a training budget is used up
 }
 
 # Model configuration
@@ -34,6 +57,54 @@ MODEL_CONFIG = {
     "llm_provider": "azure_openai",  # Options: "mock", "azure_openai", "anthropic", "openai"
     "temperature": 0.0,
     "max_tokens": 500,
+    "max_concurrency": 8,  # In-flight LLM requests during batched (async) generation
+    "prompt_batch_size": 1,  # Questions packed into one prompt during batched generation (1 = off)
+    "stream_responses": False,  # Stream completions and stop reading once the SQL statement is complete
+    "hedge_requests": False,  # Send a duplicate when a request outlives a latency percentile
+    "hedge_percentile": 95,  # Deadline percentile of recent request latencies
+    "hedge_max_ratio": 0.05,  # Most hedged requests, as a share of all requests
+    "cascade": False,  # Answer confidently handled questions with local rules, escalate the rest to the LLM
+    "cascade_threshold": 0.9,  # Minimum calibrated local accuracy (per question shape) for answering locally
+    "cascade_audit_rate": 0.05,  # Share of local answers also sent to the LLM to measure the accuracy delta
+    "response_cache": True,  # Persist LLM responses keyed by model, system message and prompt
+    "response_cache_file": DATA_DIR / "llm_cache.sqlite",
+    "response_cache_max_entries": 100000,  # LRU bound on cached responses
+    "response_cache_ttl_seconds": None,  # Expire cached responses after this age (None = never)
+}
+
+# Token and cost accounting (per call, aggregated per epoch, stage and bullet count)
+USAGE_CONFIG = {
+    # USD per 1k tokens per stage (gpt-4o / text-embedding-ada-002 list prices; batch jobs at half price).
+    # Adjust to your deployment and agreement; stages without prices are reported at cost 0.
+    "prices_per_1k_tokens": {
+        "generation": {"input": 0.0025, "cached_input": 0.00125, "output": 0.01},
+        "batch_generation": {"input": 0.00125, "cached_input": 0.000625, "output": 0.005},
+        "embedding": {"input": 0.0001},
+    },
+}
+
+# Provider rate limits, shared by the LLM and the embedding service
+RATE_LIMIT_CONFIG = {
+    "requests_per_minute": int(os.getenv("AZURE_OPENAI_REQUESTS_PER_MINUTE", "0")) or None,  # None = unlimited
+    "tokens_per_minute": int(os.getenv("AZURE_OPENAI_TOKENS_PER_MINUTE", "0")) or None,
+    "max_retries": 5,  # Retries on 429, 5xx, timeouts and connection errors
+    "base_delay": 0.5,  # Seconds; jittered exponential backoff
+    "max_delay": 30.0,
+    "min_concurrency": 1,  # AIMD bounds on in-flight async requests
+    "max_concurrency": 64,
+    "max_requeues": 1,  # Extra rounds for items that still failed; then they are skipped, not scored
+}
+
+# Pooled HTTP connections, shared by the LLM and the embedding service per endpoint
+HTTP_POOL_CONFIG = {
+    "max_connections": 100,  # Open connections per endpoint (per event loop for async requests)
+    "max_keepalive_connections": 20,  # Idle connections kept warm for reuse
+    "keepalive_expiry": 30.0,  # Seconds
+    "connect_timeout": 5.0,
+    "read_timeout": 60.0,
+    "write_timeout": 30.0,
+    "pool_timeout": 10.0,  # Seconds to wait for a free pooled connection
+    "http2": True,  # Used only when the optional h2 package is installed
 }
 
 # Azure OpenAI Configuration
@@ -45,6 +116,34 @@ AZURE_OPENAI_CONFIG = {
     "api_version": os.getenv("AZURE_OPENAI_API_MODEL_VERSION", "2025-01-01-preview"),
 }
 
+# Further deployments (other regions / quotas) to route chat requests across, as a
+# JSON list in AZURE_OPENAI_DEPLOYMENTS, e.g.
+#   [{"name": "westus", "endpoint": "https://...", "deployment_name": "gpt-4o-westus",
+#     "requests_per_minute": 300, "tokens_per_minute": 50000}]
+# Missing keys default to AZURE_OPENAI_CONFIG. Empty = the single deployment above.
+AZURE_OPENAI_DEPLOYMENTS = json.loads(os.getenv("AZURE_OPENAI_DEPLOYMENTS", "") or "[]")
+
+# Latency-aware routing across AZURE_OPENAI_CONFIG and AZURE_OPENAI_DEPLOYMENTS
+ROUTING_CONFIG = {
+    "ewma_alpha": 0.2,  # Weight of the newest latency sample
+    "failure_threshold": 3,  # Consecutive failed requests that drain a deployment
+    "drain_seconds": 10.0,  # First drain cooldown; doubles on each repeated drain
+    "max_drain_seconds": 300.0,
+    "explore_rate": 0.05,  # Share of requests sent to a random healthy deployment
+    "backend_max_retries": 1,  # Retries on one deployment before failing over to another
+}
+
+# Offline batch jobs for evaluation (cheaper, higher throughput, minutes to hours per job)
+BATCH_JOB_CONFIG = {
+    "enabled": False,  # Answer ACETrainer.evaluate with one batch job instead of interactive requests
+    "provider": "azure",  # "azure" (Azure OpenAI batch API) or "local" (offline stand-in runner)
+    "deployment_name": os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT_NAME", ""),  # Global-batch deployment
+    "work_dir": DATA_DIR / "batch_jobs",  # Job files, job ids and downloaded results (for resume)
+    "poll_interval": 30.0,  # Seconds between job status polls
+    "completion_window": "24h",
+    "min_batch_size": 20,  # Smaller evaluations are answered interactively
+}
+
 # Azure OpenAI Embeddings Configuration
 AZURE_OPENAI_EMBEDDING_CONFIG = {
     "endpoint": os.getenv("AZURE_OPENAI_API_ENDPOINT", ""),
@@ -71,9 +170,11 @@ PLAYBOOK_CONFIG = {
     ],
     "duplicate_threshold": 0.8,
     "max_bullets_per_section": 50,
+    "max_examples_per_bullet": 3,  # Reservoir size of (wrong, correct) pairs per templated insight
     "use_semantic_search": True,  # Use semantic search for retrieving relevant bullets
     "top_k_bullets": 5,  # Number of most relevant bullets to retrieve
     "similarity_threshold": 0.7,  # Minimum similarity score for bullet retrieval
+    "embedding_duplicate_threshold": 0.92,  # Cosine similarity treated as a duplicate insight
 }
 
 # Dataset configuration
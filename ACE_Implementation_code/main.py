@@ -20,11 +20,19 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from src import (
-    WikiSQLDataset,
     Generator,
+    Curator,
+    Reflector,
     ACETrainer,
     Playbook,
 )
+from src.components.cascade import CascadeRouter
+from src.models.batch_jobs import BatchJobLLM
+from src.models.cached_llm import CachedLLM, ResponseCache
+from src.models.rate_limiter import AIMDController, RateLimiter, RetryPolicy
+from src.models.usage_meter import UsageMeter
+from src.training.budget import TrainingBudget
+from src.training.execution_evaluator import ExecutionEvaluator
 from config import (
     TRAINING_CONFIG,
     MODEL_CONFIG,
@@ -33,6 +41,13 @@ from config import (
     AZURE_OPENAI_EMBEDDING_CONFIG,
     DATASET_CONFIG,
     PLAYBOOK_CONFIG,
+    RATE_LIMIT_CONFIG,
+    HTTP_POOL_CONFIG,
+    AZURE_OPENAI_DEPLOYMENTS,
+    ROUTING_CONFIG,
+    BATCH_JOB_CONFIG,
+    USAGE_CONFIG,
+    ensure_directories,
     get_config,
 )
 
@@ -66,6 +81,47 @@ def parse_args():
         default=TRAINING_CONFIG["test_ratio"],
         help="Ratio of data to use for testing",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=TRAINING_CONFIG["batch_size"],
+        help="Examples per curation mini-batch (1 = update after every example)",
+    )
+    parser.add_argument(
+        "--reflection-workers",
+        type=int,
+        default=TRAINING_CONFIG["reflection_workers"],
+        help="Processes analyzing each curation mini-batch (with --batch-size > 1)",
+    )
+    parser.add_argument(
+        "--execution-eval",
+        action="store_true",
+        default=TRAINING_CONFIG["execution_eval"],
+        help="Also report execution accuracy on in-memory SQLite tables",
+    )
+    parser.add_argument(
+        "--budget-seconds",
+        type=float,
+        default=TRAINING_CONFIG["budget_seconds"],
+        help="Wall-clock budget for training, in seconds",
+    )
+    parser.add_argument(
+        "--budget-requests",
+        type=int,
+        default=TRAINING_CONFIG["budget_requests"],
+        help="Generation requests training may issue",
+    )
+    parser.add_argument(
+        "--budget-tokens",
+        type=int,
+        default=TRAINING_CONFIG["budget_tokens"],
+        help="Input + output tokens training may spend (LLM and embeddings)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the checkpoint saved when a training budget ran out",
+    )
     parser.add_argument(
         "--use-real-llm",
         action="store_true",
@@ -97,6 +153,7 @@ def main():
     
     # Parse arguments
     args = parse_args()
+    ensure_directories()
     
     print("\n" + "="*60)
     print("ACE SQL QUERY GENERATOR - END-TO-END PROJECT")
@@ -111,12 +168,14 @@ def main():
     print(f"  Target Accuracy: {args.target_accuracy}%")
     print(f"  Sample Size: {args.sample_size}")
     print(f"  Test Ratio: {args.test_ratio}")
+    print(f"  Curation Batch Size: {args.batch_size}")
     print(f"  Dataset: {'Real WikiSQL' if use_real_data else 'Dummy Data'}")
     print(f"  LLM: {'Real' if args.use_real_llm else 'Mock'}")
     print()
     
     # Step 1: Load Data
     print("Step 1: Loading dataset...")
+    from src.data.dataset import WikiSQLDataset  # HuggingFace datasets loads only when needed
     dataset = WikiSQLDataset(sample_size=args.sample_size, use_real_data=use_real_data)
     train_data, test_data = dataset.get_train_test_split(test_ratio=args.test_ratio)
     print(f"  ✓ Training examples: {len(train_data)}")
@@ -129,10 +188,36 @@ def main():
     # Use real LLM if either flag is set or config says so
     use_real_llm = args.use_real_llm or not MODEL_CONFIG["use_mock_llm"]
     
+    # One rate limit and retry policy per provider, shared by the LLM and embeddings
+    rate_limiter = RateLimiter(
+        requests_per_minute=RATE_LIMIT_CONFIG["requests_per_minute"],
+        tokens_per_minute=RATE_LIMIT_CONFIG["tokens_per_minute"]
+    )
+    retry_policy = RetryPolicy(
+        max_retries=RATE_LIMIT_CONFIG["max_retries"],
+        base_delay=RATE_LIMIT_CONFIG["base_delay"],
+        max_delay=RATE_LIMIT_CONFIG["max_delay"]
+    )
+    # Tokens, wall time and cost of every LLM and embedding call
+    usage_meter = UsageMeter(prices=USAGE_CONFIG["prices_per_1k_tokens"])
+    from src.models.http_pool import HTTPClientFactory  # httpx loads only past argument parsing
+    http_clients = HTTPClientFactory(
+        max_connections=HTTP_POOL_CONFIG["max_connections"],
+        max_keepalive_connections=HTTP_POOL_CONFIG["max_keepalive_connections"],
+        keepalive_expiry=HTTP_POOL_CONFIG["keepalive_expiry"],
+        connect_timeout=HTTP_POOL_CONFIG["connect_timeout"],
+        read_timeout=HTTP_POOL_CONFIG["read_timeout"],
+        write_timeout=HTTP_POOL_CONFIG["write_timeout"],
+        pool_timeout=HTTP_POOL_CONFIG["pool_timeout"],
+        http2=HTTP_POOL_CONFIG["http2"]
+    )
+    
     if use_real_llm:
         # Use Azure OpenAI
         try:
             from src.models.azure_openai_llm import AzureOpenAILLM
+            from src.models.hedged_llm import HedgedLLM
+            from src.models.router_llm import Backend, RoutedLLM
             
             # Validate configuration
             if not AZURE_OPENAI_CONFIG["api_key"]:
@@ -141,21 +226,116 @@ def main():
                 generator = Generator(
                     use_mock_llm=True,
                     top_k_bullets=PLAYBOOK_CONFIG["top_k_bullets"],
-                    similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"]
+                    similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"],
+                    max_concurrency=MODEL_CONFIG["max_concurrency"],
+                    max_requeues=RATE_LIMIT_CONFIG["max_requeues"],
+                    prompt_batch_size=MODEL_CONFIG["prompt_batch_size"]
                 )
             else:
-                llm = AzureOpenAILLM(
-                    api_key=AZURE_OPENAI_CONFIG["api_key"],
-                    endpoint=AZURE_OPENAI_CONFIG["endpoint"],
-                    deployment_name=AZURE_OPENAI_CONFIG["deployment_name"],
-                    model_name=AZURE_OPENAI_CONFIG["model_name"],
-                    api_version=AZURE_OPENAI_CONFIG["api_version"],
-                )
+                # The primary deployment plus any extra ones to route across
+                deployments = [{"name": "primary", **AZURE_OPENAI_CONFIG}] + [
+                    {**AZURE_OPENAI_CONFIG, "name": f"deployment-{i}", **deployment}
+                    for i, deployment in enumerate(AZURE_OPENAI_DEPLOYMENTS, 1)
+                ]
+                routed = len(deployments) > 1
+                backends = []
+                for index, deployment in enumerate(deployments):
+                    # The primary shares its budget with embeddings; the others have their own
+                    backend_limiter = rate_limiter if index == 0 else RateLimiter(
+                        requests_per_minute=deployment.get("requests_per_minute"),
+                        tokens_per_minute=deployment.get("tokens_per_minute")
+                    )
+                    backend_llm = AzureOpenAILLM(
+                        api_key=deployment["api_key"],
+                        endpoint=deployment["endpoint"],
+                        deployment_name=deployment["deployment_name"],
+                        model_name=deployment["model_name"],
+                        api_version=deployment["api_version"],
+                        rate_limiter=backend_limiter,
+                        retry_policy=RetryPolicy(
+                            max_retries=ROUTING_CONFIG["backend_max_retries"],
+                            base_delay=RATE_LIMIT_CONFIG["base_delay"],
+                            max_delay=RATE_LIMIT_CONFIG["max_delay"]
+                        ) if routed else retry_policy,
+                        concurrency=AIMDController(
+                            initial=MODEL_CONFIG["max_concurrency"],
+                            minimum=RATE_LIMIT_CONFIG["min_concurrency"],
+                            maximum=RATE_LIMIT_CONFIG["max_concurrency"]
+                        ),
+                        stream=MODEL_CONFIG["stream_responses"],
+                        http_clients=http_clients,
+                        usage_meter=usage_meter,
+                    )
+                    backends.append(Backend(deployment["name"], backend_llm, backend_limiter))
+                if routed:
+                    llm = RoutedLLM(
+                        backends,
+                        ewma_alpha=ROUTING_CONFIG["ewma_alpha"],
+                        failure_threshold=ROUTING_CONFIG["failure_threshold"],
+                        drain_seconds=ROUTING_CONFIG["drain_seconds"],
+                        max_drain_seconds=ROUTING_CONFIG["max_drain_seconds"],
+                        explore_rate=ROUTING_CONFIG["explore_rate"]
+                    )
+                    print(f"  ✓ Routing across {len(backends)} deployments")
+                else:
+                    llm = backends[0].llm
+                if MODEL_CONFIG["hedge_requests"]:
+                    llm = HedgedLLM(
+                        llm,
+                        percentile=MODEL_CONFIG["hedge_percentile"],
+                        max_hedge_ratio=MODEL_CONFIG["hedge_max_ratio"]
+                    )
+                    print(f"  ✓ Hedging requests slower than p{MODEL_CONFIG['hedge_percentile']}")
+                if MODEL_CONFIG["response_cache"]:
+                    llm = CachedLLM(llm, ResponseCache(
+                        MODEL_CONFIG["response_cache_file"],
+                        max_entries=MODEL_CONFIG["response_cache_max_entries"],
+                        ttl_seconds=MODEL_CONFIG["response_cache_ttl_seconds"]
+                    ))
+                    print(f"  ✓ Response cache: {MODEL_CONFIG['response_cache_file']}")
+                if BATCH_JOB_CONFIG["enabled"]:
+                    from src.models.batch_jobs import AzureBatchClient
+                    if BATCH_JOB_CONFIG["provider"] == "local":
+                        from src.models.local_server import LocalBatchRunner
+                        batch_client = LocalBatchRunner(BATCH_JOB_CONFIG["work_dir"] / "local_runner")
+                    else:
+                        batch_client = AzureBatchClient(
+                            api_key=AZURE_OPENAI_CONFIG["api_key"],
+                            endpoint=AZURE_OPENAI_CONFIG["endpoint"],
+                            api_version=AZURE_OPENAI_CONFIG["api_version"],
+                            completion_window=BATCH_JOB_CONFIG["completion_window"]
+                        )
+                    llm = BatchJobLLM(
+                        llm,
+                        batch_client,
+                        work_dir=BATCH_JOB_CONFIG["work_dir"],
+                        deployment_name=BATCH_JOB_CONFIG["deployment_name"] or AZURE_OPENAI_CONFIG["deployment_name"],
+                        poll_interval=BATCH_JOB_CONFIG["poll_interval"],
+                        min_batch_size=BATCH_JOB_CONFIG["min_batch_size"],
+                        usage_meter=usage_meter
+                    )
+                    print(f"  ✓ Evaluation via {BATCH_JOB_CONFIG['provider']} batch jobs "
+                          f"({BATCH_JOB_CONFIG['work_dir']})")
+                cascade = None
+                if MODEL_CONFIG["cascade"]:
+                    # Calibrated on the training split only
+                    cascade = CascadeRouter(
+                        threshold=MODEL_CONFIG["cascade_threshold"],
+                        audit_rate=MODEL_CONFIG["cascade_audit_rate"]
+                    ).fit(train_data)
+                    confident = [key for key in cascade.calibration
+                                 if cascade.confidence(key) >= cascade.threshold]
+                    print(f"  ✓ Cascade: {len(confident)}/{len(cascade.calibration)} question shapes "
+                          f"answered locally (threshold {cascade.threshold:.0%})")
                 generator = Generator(
                     llm=llm,
                     use_mock_llm=False,
                     top_k_bullets=PLAYBOOK_CONFIG["top_k_bullets"],
-                    similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"]
+                    similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"],
+                    max_concurrency=MODEL_CONFIG["max_concurrency"],
+                    max_requeues=RATE_LIMIT_CONFIG["max_requeues"],
+                    prompt_batch_size=MODEL_CONFIG["prompt_batch_size"],
+                    cascade=cascade
                 )
         except ImportError as e:
             print(f"  ⚠️  Failed to import Azure OpenAI: {e}")
@@ -164,7 +344,10 @@ def main():
             generator = Generator(
                 use_mock_llm=True,
                 top_k_bullets=PLAYBOOK_CONFIG["top_k_bullets"],
-                similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"]
+                similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"],
+                max_concurrency=MODEL_CONFIG["max_concurrency"],
+                max_requeues=RATE_LIMIT_CONFIG["max_requeues"],
+                prompt_batch_size=MODEL_CONFIG["prompt_batch_size"]
             )
         except Exception as e:
             print(f"  ⚠️  Error initializing Azure OpenAI: {e}")
@@ -172,14 +355,20 @@ def main():
             generator = Generator(
                 use_mock_llm=True,
                 top_k_bullets=PLAYBOOK_CONFIG["top_k_bullets"],
-                similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"]
+                similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"],
+                max_concurrency=MODEL_CONFIG["max_concurrency"],
+                max_requeues=RATE_LIMIT_CONFIG["max_requeues"],
+                prompt_batch_size=MODEL_CONFIG["prompt_batch_size"]
             )
     else:
         print("  ℹ️  Using mock LLM (rule-based)")
         generator = Generator(
             use_mock_llm=True,
             top_k_bullets=PLAYBOOK_CONFIG["top_k_bullets"],
-            similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"]
+            similarity_threshold=PLAYBOOK_CONFIG["similarity_threshold"],
+            max_concurrency=MODEL_CONFIG["max_concurrency"],
+            max_requeues=RATE_LIMIT_CONFIG["max_requeues"],
+            prompt_batch_size=MODEL_CONFIG["prompt_batch_size"]
         )
     
     # Initialize embedding service for semantic search
@@ -196,6 +385,10 @@ def main():
                     deployment_name=AZURE_OPENAI_EMBEDDING_CONFIG["deployment_name"],
                     model_name=AZURE_OPENAI_EMBEDDING_CONFIG["model_name"],
                     api_version=AZURE_OPENAI_EMBEDDING_CONFIG["api_version"],
+                    rate_limiter=rate_limiter,
+                    retry_policy=retry_policy,
+                    http_clients=http_clients,
+                    usage_meter=usage_meter,
                 )
                 print("  ✓ Real embeddings initialized")
             else:
@@ -208,15 +401,43 @@ def main():
     # Initialize playbook with embedding service
     playbook = Playbook(
         embedding_service=embedding_service,
-        use_semantic_search=PLAYBOOK_CONFIG["use_semantic_search"]
+        use_semantic_search=PLAYBOOK_CONFIG["use_semantic_search"],
+        max_examples_per_bullet=PLAYBOOK_CONFIG["max_examples_per_bullet"]
     )
     
+    # Initialize curator (embedding-space dedup applies when semantic search is on)
+    curator = Curator(embedding_threshold=PLAYBOOK_CONFIG["embedding_duplicate_threshold"])
+    
+    # Initialize reflector with a cross-epoch reflection cache
+    reflector = Reflector(cache_size=TRAINING_CONFIG["reflection_cache_size"])
+    
+    # Initialize execution-accuracy evaluator (offline, in-memory SQLite)
+    execution_evaluator = None
+    if args.execution_eval:
+        execution_evaluator = ExecutionEvaluator(
+            num_rows=TRAINING_CONFIG["execution_eval_rows"],
+            workers=TRAINING_CONFIG["execution_eval_workers"]
+        )
+    
     # Initialize trainer with playbook and generator
     trainer = ACETrainer(
         dataset, 
         generator=generator,
         playbook=playbook,
-        embedding_service=embedding_service
+        embedding_service=embedding_service,
+        curator=curator,
+        reflector=reflector,
+        execution_evaluator=execution_evaluator,
+        usage_meter=usage_meter
+    )
+    
+    if args.resume:
+        trainer.load_checkpoint(TRAINING_CONFIG["checkpoint_file"])
+    budget = TrainingBudget(
+        max_seconds=args.budget_seconds,
+        max_requests=args.budget_requests,
+        max_tokens=args.budget_tokens,
+        usage_meter=usage_meter
     )
     
     print("  ✓ Generator initialized")
@@ -229,7 +450,11 @@ def main():
     trained_playbook = trainer.train_offline(
         train_data,
         num_epochs=args.epochs,
-        target_accuracy=args.target_accuracy
+        target_accuracy=args.target_accuracy,
+        batch_size=args.batch_size,
+        reflection_workers=args.reflection_workers,
+        budget=budget,
+        checkpoint_path=TRAINING_CONFIG["checkpoint_file"]
     )
     
     # Step 4: Evaluate
@@ -248,6 +473,66 @@ def main():
     
     print(f"\nAverage Helpfulness: {stats['avg_helpfulness']:.2f}")
     
+    llm_cache_stats = None
+    # A batch-job LLM wraps the cached one
+    cached_llm = generator.llm.llm if isinstance(generator.llm, BatchJobLLM) else generator.llm
+    if isinstance(cached_llm, CachedLLM):
+        llm_cache_stats = cached_llm.cache.stats()
+        print(f"LLM Response Cache: {llm_cache_stats['hits']} hits / {llm_cache_stats['misses']} misses "
+              f"({llm_cache_stats['entries']} entries)")
+    
+    llm_usage = generator.llm.usage_stats() if not generator.use_mock_llm else None
+    if llm_usage:
+        print(f"Prompt Tokens: {llm_usage['prompt_tokens']} "
+              f"({llm_usage['cached_prompt_ratio']:.0%} served from the provider prefix cache)")
+        if llm_usage.get("streamed_requests"):
+            print(f"Streaming: {llm_usage['avg_time_to_first_token']:.2f}s to first token, "
+                  f"{llm_usage['avg_time_to_sql']:.2f}s to SQL "
+                  f"({llm_usage['early_stops']}/{llm_usage['streamed_requests']} streams closed early)")
+        if llm_usage.get("hedging"):
+            hedging = llm_usage["hedging"]
+            print(f"Hedging: {hedging['hedged']}/{hedging['requests']} requests hedged "
+                  f"({hedging['hedge_wins']} won by the duplicate)")
+            for label, key in (("before (primary)", "primary"), ("after (winner)", "winner")):
+                latency = hedging[key]
+                print(f"  Latency {label}: p50 {latency['p50'] or 0:.2f}s, "
+                      f"p95 {latency['p95'] or 0:.2f}s, p99 {latency['p99'] or 0:.2f}s")
+        if llm_usage.get("batch_jobs"):
+            batch_jobs = llm_usage["batch_jobs"]
+            print(f"Batch Jobs: {batch_jobs['jobs_submitted']} submitted, {batch_jobs['jobs_resumed']} resumed; "
+                  f"{batch_jobs['results_streamed']} results streamed, {batch_jobs['results_from_disk']} "
+                  f"read from disk, {batch_jobs['failed_requests']} failed")
+        if llm_usage.get("routing"):
+            routing = llm_usage["routing"]
+            print(f"Routing: {routing['requests']} requests, {routing['failovers']} failovers")
+            for name, backend in routing["backends"].items():
+                latency = backend["latency_ewma"]
+                print(f"  {name}: {backend['share']:.0%} of traffic, "
+                      f"{'n/a' if latency is None else f'{latency:.2f}s'} EWMA latency, "
+                      f"{backend['drains']} drains, {backend['state']}")
+    
+    usage = usage_meter.report()
+    if usage["total"]["calls"]:
+        total = usage["total"]
+        print(f"Model Calls: {total['calls']}, {total['input_tokens']} input / {total['output_tokens']} output "
+              f"tokens, {total['seconds']:.1f}s, ${total['cost']:.4f}")
+        for stage, stage_usage in usage["by_stage"].items():
+            print(f"  {stage}: {stage_usage['calls']} calls, {stage_usage['avg_input_tokens']:.0f} input "
+                  f"tokens/call, {stage_usage['avg_seconds']:.2f}s/call, ${stage_usage['cost']:.4f}")
+        for bullets, bullet_usage in usage["by_bullets"].items():
+            print(f"  {bullets} bullets in prompt: {bullet_usage['calls']} calls, "
+                  f"{bullet_usage['avg_input_tokens']:.0f} input tokens/call, {bullet_usage['avg_seconds']:.2f}s/call")
+    
+    cascade_stats = generator.cascade.stats() if generator.cascade else None
+    if cascade_stats:
+        local_accuracy = cascade_stats["local_accuracy"]
+        print(f"Cascade: {cascade_stats['local_answers']}/{cascade_stats['routed']} answered locally, "
+              f"~{cascade_stats['estimated_latency_saved']:.1f}s of LLM latency saved, local accuracy "
+              f"{'n/a' if local_accuracy is None else f'{local_accuracy:.1%}'}")
+        if cascade_stats["audit_accuracy_delta"] is not None:
+            print(f"  Audit: local vs LLM accuracy delta {cascade_stats['audit_accuracy_delta']:+.1%} "
+                  f"over {cascade_stats['audited']} audited questions")
+    
     # Display some playbook content
     if stats['total_bullets'] > 0:
         print(f"\n{'='*60}")
@@ -266,14 +551,24 @@ def main():
             "test_ratio": args.test_ratio,
         },
         "test_accuracy": test_results["accuracy"],
+        "test_execution_accuracy": test_results.get("execution_accuracy"),
         "playbook_stats": stats,
+        "llm_cache": llm_cache_stats,
+        "llm_usage": llm_usage,
+        "cascade": cascade_stats,
+        "embedding_usage": embedding_service.usage_stats() if embedding_service else None,
+        "usage": usage,
         "training_history": {
             "accuracy": trainer.metrics["accuracy_history"],
-            "playbook_size": trainer.metrics["playbook_size_history"]
+            "playbook_size": trainer.metrics["playbook_size_history"],
+            "usage": trainer.metrics["usage_history"],
+            "accuracy_gain_per_1k_tokens": trainer.metrics["accuracy_gain_per_1k_tokens"]
         },
+        "training_budget": trainer.metrics.get("budget"),
         "test_results": {
             "correct": test_results["correct"],
             "total": test_results["total"],
+            "skipped": test_results["skipped"],
         }
     }
     
@@ -5,20 +5,30 @@ ACE SQL Agent - Agentic Context Engineering for SQL Query Generation
 __version__ = "1.0.0"
 __author__ = "Arpit"
 
-from src.components.playbook import Playbook, Bullet
-from src.components.generator import Generator
-from src.components.reflector import Reflector
-from src.components.curator import Curator
-from src.training.trainer import ACETrainer
-from src.data.dataset import WikiSQLDataset
-
-__all__ = [
-    "Playbook",
-    "Bullet",
-    "Generator",
-    "Reflector",
-    "Curator",
-    "ACETrainer",
-    "WikiSQLDataset",
-]
+import importlib
 
+# Public names and the modules defining them; imported on first access so that
+# `import src` (and short invocations like `main.py --help`) stay fast
+_EXPORTS = {
+    "Playbook": "src.components.playbook",
+    "Bullet": "src.components.playbook",
+    "Generator": "src.components.generator",
+    "Reflector": "src.components.reflector",
+    "Curator": "src.components.curator",
+    "ACETrainer": "src.training.trainer",
+    "WikiSQLDataset": "src.data.dataset",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
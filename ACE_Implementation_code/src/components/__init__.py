@@ -6,6 +6,7 @@ from src.components.playbook import Playbook, Bullet
 from src.components.generator import Generator
 from src.components.reflector import Reflector
 from src.components.curator import Curator
+from src.components.cascade import CascadeRouter
 
-__all__ = ["Playbook", "Bullet", "Generator", "Reflector", "Curator"]
+__all__ = ["Playbook", "Bullet", "Generator", "Reflector", "Curator", "CascadeRouter"]
 
@@ -0,0 +1,272 @@
+"""
+Cascade - Answer confidently-handled questions locally, escalate the rest
+
+LocalSQLGenerator is a CPU-only rule generator: the intent table of the mock
+rules plus schema linking (columns named in the question, "by <column>"
+grouping, "top N" ordering, quoted filter values). Every answer carries a
+shape key such as "sum:grouped" or "count:filtered".
+
+CascadeRouter keeps a calibrated confidence per shape key, the posterior mean
+accuracy of the local answers on labeled examples (Beta prior), and sends a
+question to the LLM only when that confidence is below the threshold. A
+sample of local answers can be audited against the LLM to measure the
+accuracy delta. LLM calls avoided, estimated latency saved and accuracy per
+route are reported by stats().
+"""
+
+import random
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from src.utils.mock_sql import question_intent
+from src.utils.sql_canonical import sql_equal
+
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_QUOTED_RE = re.compile(r"'([^']*)'")
+_TOP_RE = re.compile(r"\btop (\d+)\b")
+_GROUP_CUE_RE = re.compile(r"\b(?:by|per|in each|for each)\b")
+_ORDER_CUE_RE = re.compile(r"\b(?:sorted|ordered|order|sort)\s+by\b")
+# Words that suggest a filter or ordering the rules cannot parse
+_UNPARSED_CUE_RE = re.compile(
+    r"\d|\b(?:where|with|whose|in|from|after|before|on|under|over|between|recent|latest|"
+    r"cheapest|highest|lowest|most|least|alphabetically)\b"
+)
+
+_AGGREGATES = {"sum": "SUM", "average": "AVG", "max": "MAX", "min": "MIN"}
+_COMPARISONS = {"greater": ">", "less": "<"}
+_MAX_TRACKED = 10000
+
+
+class LocalSQLGenerator:
+    """Schema-linked rule generator returning (sql, shape key)"""
+
+    def generate(self, question: str, schema: Dict) -> Tuple[str, str]:
+        """SQL for a question and the shape key its confidence is calibrated under"""
+        question_lower = question.lower()
+        table = (schema.get("tables") or ["table"])[0]
+        columns = schema.get("columns") or []
+        intent = question_intent(question)
+        if intent == "select" and "minimum" in question_lower:
+            intent = "min"
+        mentions = _mentioned_columns(question_lower, columns)
+        order_col = _cued_column(question_lower, mentions, _ORDER_CUE_RE)
+        group_col = None if order_col else _cued_column(question_lower, mentions, _GROUP_CUE_RE)
+        quoted = _QUOTED_RE.search(question)
+
+        if intent == "count":
+            if group_col:
+                return (f"SELECT {group_col}, COUNT(*) FROM {table} GROUP BY {group_col}",
+                        "count:grouped")
+            filter_col = _column_before(question_lower, mentions, quoted.start()) if quoted else None
+            if filter_col:
+                return f"SELECT COUNT(*) FROM {table} WHERE {filter_col} = '{quoted.group(1)}'", "count:filtered"
+            if _UNPARSED_CUE_RE.search(question_lower):
+                return f"SELECT COUNT(*) FROM {table}", "count:unlinked"
+            return f"SELECT COUNT(*) FROM {table}", "count:plain"
+
+        if intent in _AGGREGATES or (intent == "group" and group_col):
+            function = _AGGREGATES.get(intent, "SUM")
+            if group_col:
+                # "total sales by product category": only columns before the cue are measures
+                cue_start = list(_GROUP_CUE_RE.finditer(question_lower))[-1].start()
+                targets = [column for position, column in _mention_positions(question_lower, mentions)
+                           if position < cue_start]
+            else:
+                targets = mentions
+            if not targets:
+                return f"SELECT {function}({columns[0] if columns else '*'}) FROM {table}", f"{intent}:unlinked"
+            if group_col:
+                return (f"SELECT {group_col}, {function}({targets[0]}) FROM {table} GROUP BY {group_col}",
+                        f"{intent}:grouped")
+            return f"SELECT {function}({targets[0]}) FROM {table}", f"{intent}:linked"
+
+        if intent in _COMPARISONS:
+            number = _NUMBER_RE.search(question)
+            if mentions and number:
+                return f"SELECT * FROM {table} WHERE {mentions[0]} {_COMPARISONS[intent]} {number.group()}", \
+                    f"{intent}:linked"
+            return f"SELECT * FROM {table}", f"{intent}:unlinked"
+
+        top = _TOP_RE.search(question_lower)
+        if top and mentions:
+            direction = "ASC" if any(word in question_lower for word in ("lowest", "least", "smallest")) else "DESC"
+            return (f"SELECT * FROM {table} ORDER BY {mentions[-1]} {direction} LIMIT {top.group(1)}",
+                    "select:top")
+        if order_col:
+            direction = "DESC" if "desc" in question_lower else "ASC"
+            return f"SELECT * FROM {table} ORDER BY {order_col} {direction}", "select:ordered"
+        if quoted:
+            filter_col = _column_before(question_lower, mentions, quoted.start())
+            if filter_col:
+                return f"SELECT * FROM {table} WHERE {filter_col} = '{quoted.group(1)}'", "select:filtered"
+            return f"SELECT * FROM {table}", "select:unlinked"
+        if _UNPARSED_CUE_RE.search(question_lower):
+            return f"SELECT * FROM {table}", "select:unlinked"
+        if mentions:
+            return f"SELECT {', '.join(mentions)} FROM {table}", "select:projected"
+        return f"SELECT * FROM {table}", "select:plain"
+
+
+def _column_pattern(column: str) -> "re.Pattern":
+    name = column.lower().replace("_", " ")
+    if name.endswith("y"):
+        forms = re.escape(name[:-1]) + r"(?:y|ies)"
+    else:
+        forms = re.escape(name[:-1] if name.endswith("s") else name) + r"(?:s|es)?"
+    return re.compile(r"\b" + forms + r"\b")
+
+
+def _mention_positions(question_lower: str, columns: Sequence[str]) -> List[Tuple[int, str]]:
+    found = []
+    for column in columns:
+        match = _column_pattern(column).search(question_lower)
+        if match:
+            found.append((match.start(), column))
+    return sorted(found)
+
+
+def _mentioned_columns(question_lower: str, columns: Sequence[str]) -> List[str]:
+    """Schema columns named in the question, in order of first mention"""
+    return [column for _, column in _mention_positions(question_lower, columns)]
+
+
+def _cued_column(question_lower: str, mentions: List[str], cue: "re.Pattern") -> Optional[str]:
+    """Last mentioned column after the last cue such as "by" or "sorted by" ("by product category" -> category)"""
+    cues = list(cue.finditer(question_lower))
+    if not cues:
+        return None
+    after = [column for position, column in _mention_positions(question_lower, mentions)
+             if position >= cues[-1].end()]
+    return after[-1] if after else None
+
+
+def _column_before(question_lower: str, mentions: List[str], position: int) -> Optional[str]:
+    """Last mentioned column before a position (e.g. before a quoted value)"""
+    before = [column for start, column in _mention_positions(question_lower, mentions) if start < position]
+    return before[-1] if before else None
+
+
+class CascadeDecision:
+    """Routing decision for one question"""
+
+    __slots__ = ("sql", "key", "confidence", "escalate", "audit")
+
+    def __init__(self, sql: str, key: str, confidence: float, escalate: bool, audit: bool):
+        self.sql = sql
+        self.key = key
+        self.confidence = confidence
+        self.escalate = escalate
+        self.audit = audit
+
+
+class CascadeRouter:
+    """Calibrated local-first routing between LocalSQLGenerator and an LLM"""
+
+    def __init__(self, threshold: float = 0.9, prior_correct: float = 1.0, prior_wrong: float = 1.0,
+                 audit_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            threshold: Minimum calibrated confidence for answering locally
+            prior_correct: Beta prior pseudo-count of correct local answers per shape key
+            prior_wrong: Beta prior pseudo-count of wrong local answers per shape key
+            audit_rate: Share of local answers also sent to the LLM to measure the accuracy delta
+            seed: Seed for audit sampling
+        """
+        self.threshold = threshold
+        self.prior_correct = prior_correct
+        self.prior_wrong = prior_wrong
+        self.audit_rate = audit_rate
+        self.local = LocalSQLGenerator()
+        # shape key -> [correct, observed] on labeled examples
+        self.calibration: Dict[str, List[int]] = {}
+        self.counts = {"local": 0, "escalated": 0, "audited": 0, "audit_failures": 0}
+        # route -> [correct, scored]
+        self.outcomes = {"local": [0, 0], "llm": [0, 0]}
+        # audited questions -> [local correct, llm correct, scored]
+        self.audit_outcomes = [0, 0, 0]
+        self.llm_seconds = 0.0
+        self.llm_calls = 0
+        self._rng = random.Random(seed)
+        self._routes: "OrderedDict[str, str]" = OrderedDict()
+        self._audits: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+    def fit(self, examples: Sequence[Dict]) -> "CascadeRouter":
+        """Calibrate shape-key confidences on labeled examples ("question", "schema", "sql")"""
+        for example in examples:
+            sql, key = self.local.generate(example["question"], example["schema"])
+            stats = self.calibration.setdefault(key, [0, 0])
+            stats[0] += sql_equal(sql, example["sql"])
+            stats[1] += 1
+        return self
+
+    def confidence(self, key: str) -> float:
+        """Posterior mean accuracy of local answers with this shape key"""
+        correct, observed = self.calibration.get(key, (0, 0))
+        return (correct + self.prior_correct) / (observed + self.prior_correct + self.prior_wrong)
+
+    def route(self, question: str, schema: Dict) -> CascadeDecision:
+        """Local answer and whether to escalate it (counted in stats)"""
+        sql, key = self.local.generate(question, schema)
+        confidence = self.confidence(key)
+        escalate = confidence < self.threshold
+        audit = not escalate and self.audit_rate > 0 and self._rng.random() < self.audit_rate
+        self.counts["escalated" if escalate else "local"] += 1
+        _remember(self._routes, question, "llm" if escalate else "local")
+        return CascadeDecision(sql, key, confidence, escalate, audit)
+
+    def record_llm_latency(self, seconds: float):
+        self.llm_seconds += seconds
+        self.llm_calls += 1
+
+    def record_audit(self, question: str, local_sql: str, llm_sql: Optional[str]):
+        """Keep the LLM's answer to an audited local question until its outcome is known"""
+        if llm_sql is None:
+            self.counts["audit_failures"] += 1
+            return
+        self.counts["audited"] += 1
+        _remember(self._audits, question, (local_sql, llm_sql))
+
+    def observe(self, question: str, correct_sql: str, correct: bool):
+        """Outcome of a routed question (does not change calibration)"""
+        route = self._routes.pop(question, None)
+        if route:
+            self.outcomes[route][0] += correct
+            self.outcomes[route][1] += 1
+        audit = self._audits.pop(question, None)
+        if audit:
+            local_sql, llm_sql = audit
+            self.audit_outcomes[0] += sql_equal(local_sql, correct_sql)
+            self.audit_outcomes[1] += sql_equal(llm_sql, correct_sql)
+            self.audit_outcomes[2] += 1
+
+    def stats(self) -> Dict:
+        """LLM calls avoided, estimated latency saved, accuracy per route and audit delta"""
+        routed = self.counts["local"] + self.counts["escalated"]
+        avg_llm_latency = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+        local_correct, local_scored = self.outcomes["local"]
+        llm_correct, llm_scored = self.outcomes["llm"]
+        audit_local, audit_llm, audited = self.audit_outcomes
+        return {
+            "threshold": self.threshold,
+            "routed": routed,
+            "local_answers": self.counts["local"],
+            "escalated": self.counts["escalated"],
+            "llm_calls_avoided_ratio": self.counts["local"] / routed if routed else 0.0,
+            "avg_llm_latency": avg_llm_latency,
+            "estimated_latency_saved": self.counts["local"] * avg_llm_latency,
+            "local_accuracy": local_correct / local_scored if local_scored else None,
+            "escalated_accuracy": llm_correct / llm_scored if llm_scored else None,
+            "audited": audited,
+            "audit_accuracy_delta": (audit_local - audit_llm) / audited if audited else None,
+            "calibration": {
+                key: {"confidence": round(self.confidence(key), 4), "observed": observed}
+                for key, (_, observed) in sorted(self.calibration.items())
+            },
+        }
+
+
+def _remember(store: OrderedDict, key: str, value):
+    store[key] = value
+    store.move_to_end(key)
+    if len(store) > _MAX_TRACKED:
+        store.popitem(last=False)
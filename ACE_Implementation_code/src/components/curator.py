@@ -2,46 +2,191 @@
 Curator - Creates structured playbook updates from reflections
 """
 
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import numpy as np
 from src.components.playbook import Playbook
+from src.components.dedup_index import MinHashLSHIndex
+from src.utils.sql_canonical import canonicalize_sql
+
+# Insights that reinforce a success rather than teach something new
+SKIP_PHRASES = [
+    "Successful pattern that should be reinforced",
+]
 
 
 class Curator:
     """Creates structured playbook updates from reflections"""
     
+    def __init__(self, embedding_threshold: float = 0.92):
+        """
+        Initialize curator
+        
+        Args:
+            embedding_threshold: Cosine similarity at or above which an insight is a
+                duplicate of an existing bullet (used when semantic search is on)
+        """
+        self.embedding_threshold = embedding_threshold
+    
     def generate_updates(self, reflection: Dict, current_playbook: Playbook) -> List[Dict]:
         """
         Generate delta updates based on reflection
         
+        Templated insights are keyed by (template_id, params): a known pattern only
+        contributes its example pair, so the playbook grows with distinct error
+        patterns rather than with failed examples.
+        
         Returns:
-            List of operations: [{"type": "ADD", "section": "...", "content": "..."}]
+            List of operations:
+            [{"type": "ADD", "section": "...", "content": "...", "embedding": [...] or None,
+              "template_id": ..., "params": (...), "examples": [(wrong, correct)]}]
+            or [{"type": "EXAMPLE", "bullet_id": "...", "example": (wrong, correct)}]
         """
         operations = []
         
         # Extract key insight and create bullet
-        key_insight = reflection.get("key_insight", "")
-        
-        # Skip only if no insight or if it's a success
-        skip_phrases = [
-            "Successful pattern that should be reinforced",
-        ]
-        
-        if not key_insight or any(phrase in key_insight for phrase in skip_phrases):
+        key_insight = self._extract_insight(reflection)
+        if not key_insight:
             return operations
         
+        # Known error pattern: only feed its example reservoir
+        template_id = reflection.get("template_id")
+        if template_id:
+            bullet = current_playbook.find_template_bullet(template_id, reflection.get("params", ()))
+            if bullet is not None and reflection.get("cached"):
+                # Already curated once: its pattern and example are in the playbook
+                return operations
+            if bullet is not None:
+                if reflection.get("example") and not self._has_example(bullet, reflection["example"]):
+                    operations.append({
+                        "type": "EXAMPLE",
+                        "bullet_id": bullet.id,
+                        "example": reflection["example"]
+                    })
+                return operations
+        
         # Determine which section this belongs to
         section = self._determine_section(key_insight, reflection)
         
-        # Check if similar bullet already exists
-        if not self._is_duplicate(key_insight, current_playbook):
-            operations.append({
-                "type": "ADD",
-                "section": section,
-                "content": key_insight
-            })
+        # Check if similar bullet already exists (templates are identified by their key)
+        if not template_id and self._is_duplicate(key_insight, current_playbook):
+            return operations
+        
+        # Embed the insight once: used for the duplicate check and reused on insert
+        embedding = self._embed(key_insight, current_playbook)
+        if (not template_id and embedding is not None
+                and self._is_semantic_duplicate(embedding, current_playbook)):
+            return operations
+        
+        operations.append(self._add_operation(section, key_insight, embedding, reflection))
+        
+        return operations
+    
+    def generate_updates_batch(self, reflections: List[Dict], current_playbook: Playbook) -> List[Dict]:
+        """
+        Generate one consolidated delta for a mini-batch of reflections
+        
+        Templated insights are grouped by (template_id, params): known patterns
+        become EXAMPLE operations and each new pattern one ADD carrying all of its
+        batch examples. Other candidates are deduplicated against each other and
+        against the playbook: word-set Jaccard through LSH first, then (with
+        semantic search on) a single batched embedding call and one similarity
+        matrix product.
+        
+        Returns:
+            List of operations, in reflection order
+        """
+        operations = []
+        new_templates: Dict[Tuple, Dict] = {}
+        
+        # Word-level dedup against the playbook and earlier candidates in the batch
+        batch_index = MinHashLSHIndex()
+        candidates = []  # (operation, subject to semantic dedup)
+        for reflection in reflections:
+            key_insight = self._extract_insight(reflection)
+            if not key_insight:
+                continue
+            
+            template_id = reflection.get("template_id")
+            example = reflection.get("example")
+            if template_id:
+                key = (template_id, tuple(reflection.get("params", ())))
+                bullet = current_playbook.find_template_bullet(*key)
+                if bullet is not None and reflection.get("cached"):
+                    continue
+                if bullet is not None:
+                    if example and not self._has_example(bullet, example):
+                        operations.append({"type": "EXAMPLE", "bullet_id": bullet.id, "example": example})
+                elif key in new_templates:
+                    if example and not any(
+                        self._same_example(example, seen) for seen in new_templates[key]["examples"]
+                    ):
+                        new_templates[key]["examples"].append(example)
+                else:
+                    section = self._determine_section(key_insight, reflection)
+                    new_templates[key] = self._add_operation(section, key_insight, None, reflection)
+                    candidates.append((new_templates[key], False))
+                continue
+            
+            if self._is_duplicate(key_insight, current_playbook):
+                continue
+            if batch_index.find_duplicate(key_insight) is not None:
+                continue
+            
+            batch_index.add(str(len(candidates)), key_insight)
+            section = self._determine_section(key_insight, reflection)
+            candidates.append((self._add_operation(section, key_insight, None, reflection), True))
+        
+        if not candidates:
+            return operations
+        
+        embeddings = self._embed_batch([op["content"] for op, _ in candidates], current_playbook)
+        for (operation, _), embedding in zip(candidates, embeddings):
+            operation["embedding"] = embedding
+        
+        # Embedding-space dedup applies to free-text insights only
+        free_text = [i for i, (_, dedup) in enumerate(candidates) if dedup]
+        keep = self._semantic_keep_mask([embeddings[i] for i in free_text], current_playbook)
+        dropped = {i for i, kept in zip(free_text, keep) if not kept}
         
+        operations.extend(op for i, (op, _) in enumerate(candidates) if i not in dropped)
         return operations
     
+    @staticmethod
+    def _same_example(example1, example2) -> bool:
+        """Compare (generated, correct) pairs by canonical SQL"""
+        return all(
+            canonicalize_sql(sql1) == canonicalize_sql(sql2)
+            for sql1, sql2 in zip(example1, example2)
+        )
+    
+    def _has_example(self, bullet, example) -> bool:
+        """Check whether a bullet's reservoir already holds an equivalent example pair"""
+        return any(self._same_example(example, existing) for existing in bullet.examples)
+    
+    @staticmethod
+    def _add_operation(section: str, insight: str, embedding, reflection: Dict) -> Dict:
+        """Build an ADD operation, carrying template fields when present"""
+        operation = {
+            "type": "ADD",
+            "section": section,
+            "content": insight,
+            "embedding": embedding
+        }
+        if reflection.get("template_id"):
+            operation["template_id"] = reflection["template_id"]
+            operation["params"] = tuple(reflection.get("params", ()))
+            operation["examples"] = [reflection["example"]] if reflection.get("example") else []
+        return operation
+    
+    def _extract_insight(self, reflection: Dict) -> str:
+        """Return the reflection's key insight, or "" if there is nothing to add"""
+        key_insight = reflection.get("key_insight", "")
+        
+        # Skip only if no insight or if it's a success
+        if not key_insight or any(phrase in key_insight for phrase in SKIP_PHRASES):
+            return ""
+        return key_insight
+    
     def _determine_section(self, insight: str, reflection: Dict) -> str:
         """Determine which playbook section this insight belongs to"""
         insight_lower = insight.lower()
@@ -68,30 +213,78 @@ class Curator:
             return "sql_patterns"
     
     def _is_duplicate(self, new_insight: str, playbook: Playbook, threshold: float = 0.85) -> bool:
-        """Check if similar insight already exists (simple word overlap)"""
-        new_words = set(new_insight.lower().split())
+        """Check if similar insight already exists (word-set Jaccard via the playbook's LSH index)"""
+        match = playbook.dedup_index.find_duplicate(new_insight, threshold)
+        if match is None:
+            return False
+
+        _, similarity = match
+        if similarity < 1.0:
+            print(f"    [Duplicate detected: {similarity:.2f} similarity]")
+        return True
+    
+    def _embed(self, insight: str, playbook: Playbook):
+        """Embed an insight with the playbook's embedding service, if semantic search is on"""
+        if not (playbook.use_semantic_search and playbook.embedding_service):
+            return None
+        try:
+            return playbook.embedding_service.embed_text(insight)
+        except Exception as e:
+            print(f"⚠ Failed to generate embedding for insight: {e}")
+            return None
+    
+    def _is_semantic_duplicate(self, embedding, playbook: Playbook) -> bool:
+        """Check if an existing bullet is a near neighbour in embedding space"""
+        match = playbook.nearest_bullet(embedding)
+        if match is None:
+            return False
         
-        # Check for exact match first
-        for bullet in playbook.bullets:
-            if bullet.content.lower() == new_insight.lower():
-                return True
+        bullet, similarity = match
+        if similarity >= self.embedding_threshold:
+            print(f"    [Semantic duplicate of {bullet.id}: {similarity:.2f} cosine]")
+            return True
+        return False
+    
+    def _embed_batch(self, insights: List[str], playbook: Playbook) -> List[Optional[List[float]]]:
+        """Embed a batch of insights in one call, if semantic search is on"""
+        if not (playbook.use_semantic_search and playbook.embedding_service):
+            return [None] * len(insights)
+        try:
+            return playbook.embedding_service.embed_texts(insights)
+        except Exception as e:
+            print(f"⚠ Failed to generate embeddings for insights: {e}")
+            return [None] * len(insights)
+    
+    def _semantic_keep_mask(self, embeddings: List[Optional[List[float]]],
+                            playbook: Playbook) -> List[bool]:
+        """
+        Decide which embedded candidates survive embedding-space dedup
         
-        # Then check for high similarity
-        for bullet in playbook.bullets:
-            existing_words = set(bullet.content.lower().split())
-            
-            # Calculate Jaccard similarity
-            intersection = len(new_words & existing_words)
-            union = len(new_words | existing_words)
-            
-            if union == 0:
-                continue
-                
-            similarity = intersection / union
-            
-            if similarity > threshold:
-                print(f"    [Duplicate detected: {similarity:.2f} similarity]")
-                return True
+        A candidate is dropped if it is within `embedding_threshold` of a playbook
+        bullet or of an earlier kept candidate. Candidates without embeddings are kept.
+        """
+        keep = [True] * len(embeddings)
+        rows = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        if not rows:
+            return keep
         
-        return False
-
+        matrix = np.asarray([embeddings[i] for i in rows], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        
+        playbook_scores = playbook.max_similarities(matrix)
+        pairwise = matrix @ matrix.T
+        
+        kept_rows = []
+        for position, i in enumerate(rows):
+            if playbook_scores[position] >= self.embedding_threshold:
+                keep[i] = False
+            elif kept_rows and pairwise[position, kept_rows].max() >= self.embedding_threshold:
+                keep[i] = False
+            else:
+                kept_rows.append(position)
+        
+        dropped = len(rows) - len(kept_rows)
+        if dropped:
+            print(f"    [Semantic dedup dropped {dropped}/{len(rows)} batch insights]")
+        return keep
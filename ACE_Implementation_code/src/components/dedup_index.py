@@ -0,0 +1,117 @@
+"""
+Dedup Index - MinHash/LSH index for near-duplicate playbook bullets
+"""
+
+import zlib
+from typing import Dict, FrozenSet, List, Optional, Tuple
+import numpy as np
+
+# Mersenne prime 2^31 - 1: keeps a * h + b below 2^63 so uint64 never overflows
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+class MinHashLSHIndex:
+    """
+    Near-duplicate index over bullet word sets
+
+    Each bullet gets a MinHash signature of its lowercase word set, split into
+    `num_bands` bands of `num_perm / num_bands` rows. Two texts become
+    candidates when any band matches, and candidates are verified with the
+    exact Jaccard similarity, so the only approximation is a missed candidate.
+    For a pair with Jaccard similarity s that happens with probability
+    (1 - s^rows)^bands, see `false_negative_probability`.
+    """
+
+    def __init__(self, num_perm: int = 128, num_bands: int = 16, seed: int = 42):
+        """
+        Initialize the index
+
+        Args:
+            num_perm: Number of hash permutations in each signature
+            num_bands: Number of LSH bands (must divide num_perm)
+            seed: Seed for the permutation coefficients
+        """
+        if num_perm % num_bands != 0:
+            raise ValueError(f"num_bands ({num_bands}) must divide num_perm ({num_perm})")
+
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.rows_per_band = num_perm // num_bands
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(_MERSENNE_PRIME), size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, int(_MERSENNE_PRIME), size=(num_perm, 1)).astype(np.uint64)
+
+        self._exact: Dict[str, str] = {}  # lowercase content -> bullet id
+        self._word_sets: Dict[str, FrozenSet[str]] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(num_bands)]
+
+    def __len__(self) -> int:
+        return len(self._word_sets)
+
+    @staticmethod
+    def _words(text: str) -> FrozenSet[str]:
+        return frozenset(text.lower().split())
+
+    def signature(self, words: FrozenSet[str]) -> np.ndarray:
+        """Compute the MinHash signature of a word set"""
+        if not words:
+            return np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+
+        hashes = np.fromiter(
+            (zlib.crc32(word.encode("utf-8")) for word in words),
+            dtype=np.uint64,
+            count=len(words),
+        ) % _MERSENNE_PRIME
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        rows = self.rows_per_band
+        return [signature[i * rows:(i + 1) * rows].tobytes() for i in range(self.num_bands)]
+
+    def add(self, bullet_id: str, text: str):
+        """Index a bullet's content"""
+        words = self._words(text)
+        self._exact.setdefault(text.lower(), bullet_id)
+        self._word_sets[bullet_id] = words
+
+        for band, key in zip(self._buckets, self._band_keys(self.signature(words))):
+            band.setdefault(key, []).append(bullet_id)
+
+    def find_duplicate(self, text: str, threshold: float = 0.85) -> Optional[Tuple[str, float]]:
+        """
+        Find an indexed bullet that duplicates `text`
+
+        Args:
+            text: Candidate bullet content
+            threshold: Jaccard similarity above which texts are duplicates
+
+        Returns:
+            (bullet_id, similarity) of the first duplicate found, or None
+        """
+        exact_id = self._exact.get(text.lower())
+        if exact_id is not None:
+            return exact_id, 1.0
+
+        words = self._words(text)
+        seen = set()
+        for band, key in zip(self._buckets, self._band_keys(self.signature(words))):
+            for bullet_id in band.get(key, ()):
+                if bullet_id in seen:
+                    continue
+                seen.add(bullet_id)
+
+                existing_words = self._word_sets[bullet_id]
+                union = len(words | existing_words)
+                if union == 0:
+                    continue
+
+                similarity = len(words & existing_words) / union
+                if similarity > threshold:
+                    return bullet_id, similarity
+
+        return None
+
+    def false_negative_probability(self, similarity: float) -> float:
+        """Probability that a pair with the given Jaccard similarity is never a candidate"""
+        return (1.0 - similarity ** self.rows_per_band) ** self.num_bands
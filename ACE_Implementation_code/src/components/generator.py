@@ -2,18 +2,23 @@
 Generator - Generates SQL queries using current playbook
 """
 
-import re
-from typing import List, Dict, Tuple
+import time
+import asyncio
+from typing import Iterator, List, Dict, Optional, Sequence, Tuple
+from src.components.cascade import CascadeDecision, CascadeRouter
 from src.components.playbook import Playbook, Bullet
-from src.models.base_llm import BaseLLM
+from src.models.base_llm import BaseLLM, LLMRequestError
 from src.models.mock_llm import MockLLM
+from src.utils.mock_sql import generate_batch as mock_generate_batch, rule_sql
 
 
 class Generator:
     """Generates SQL queries using current playbook"""
     
     def __init__(self, llm: BaseLLM = None, use_mock_llm: bool = True, 
-                 top_k_bullets: int = 5, similarity_threshold: float = 0.7):
+                 top_k_bullets: int = 5, similarity_threshold: float = 0.7,
+                 max_concurrency: int = 8, max_requeues: int = 1,
+                 prompt_batch_size: int = 1, cascade: Optional[CascadeRouter] = None):
         """
         Initialize generator
         
@@ -22,80 +27,318 @@ class Generator:
             use_mock_llm: If True, use rule-based mock. If False, use provided LLM.
             top_k_bullets: Number of most relevant bullets to retrieve
             similarity_threshold: Minimum similarity for semantic search
+            max_concurrency: Maximum in-flight LLM requests in generate_batch
+            max_requeues: Extra rounds for items whose request failed after retries
+            prompt_batch_size: Questions packed into one prompt by generate_batch
+                (1 = one question per request)
+            cascade: Answer questions locally when its calibrated confidence
+                reaches the threshold; only the rest go to the LLM
         """
         self.use_mock_llm = use_mock_llm
         self.llm = llm if llm else MockLLM()
-        self.used_bullets = []
         self.top_k_bullets = top_k_bullets
         self.similarity_threshold = similarity_threshold
+        self.max_concurrency = max_concurrency
+        self.max_requeues = max_requeues
+        self.prompt_batch_size = prompt_batch_size
+        self.cascade = cascade
     
-    def generate_sql(self, question: str, schema: Dict, playbook: Playbook) -> Tuple[str, List[str]]:
+    def generate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                     use_cascade: bool = True) -> Tuple[str, List[str]]:
         """
         Generate SQL query from natural language question
         
+        Args:
+            use_cascade: Let the cascade answer confident questions locally
+                (training turns this off, so every answer comes from the LLM
+                with the playbook in the prompt)
+        
         Returns:
-            (sql_query, list_of_bullet_ids_used)
+            (sql_query, list_of_bullet_ids_used); no bullet ids for answers
+            the cascade gave locally, as the playbook played no part in them
         """
-        self.used_bullets = []
-        
-        # Get relevant playbook knowledge using semantic search
-        relevant_bullets = playbook.get_relevant_bullets(
-            question, 
-            top_k=self.top_k_bullets,
-            similarity_threshold=self.similarity_threshold
-        )
-        self.used_bullets = [b.id for b in relevant_bullets]
+        relevant_bullets = self._relevant_bullets(question, playbook)
         
         if self.use_mock_llm:
             # Mock LLM with rule-based generation
             sql = self._mock_generate(question, schema, relevant_bullets)
+        elif self.cascade and use_cascade:
+            sql, relevant_bullets = self._cascade_generate(question, schema, playbook, relevant_bullets)
         else:
             # Real LLM generation
             sql = self.llm.generate_sql(question, schema, playbook, relevant_bullets)
         
-        return sql, self.used_bullets
+        return sql, [b.id for b in relevant_bullets]
+    
+    async def agenerate_sql(self, question: str, schema: Dict, playbook: Playbook) -> Tuple[str, List[str]]:
+        """
+        Asynchronous generate_sql; safe to run concurrently
+        
+        Returns:
+            (sql_query, list_of_bullet_ids_used); no bullet ids for local cascade answers
+        """
+        # Retrieval may embed the question with a blocking request: keep it off the loop
+        loop = asyncio.get_running_loop()
+        relevant_bullets = await loop.run_in_executor(None, self._relevant_bullets, question, playbook)
+        sql, used_bullets = await self._agenerate(question, schema, playbook, relevant_bullets)
+        return sql, [b.id for b in used_bullets]
+    
+    async def _agenerate(self, question: str, schema: Dict, playbook: Playbook,
+                         relevant_bullets: List[Bullet]) -> Tuple[str, List[Bullet]]:
+        if self.use_mock_llm:
+            return self._mock_generate(question, schema, relevant_bullets), relevant_bullets
+        if self.cascade:
+            decision = self.cascade.route(question, schema)
+            if decision.audit:
+                await self._aaudit(question, schema, playbook, relevant_bullets, decision)
+            if not decision.escalate:
+                return decision.sql, []
+        return await self._acall_llm(question, schema, playbook, relevant_bullets), relevant_bullets
+    
+    async def _acall_llm(self, question: str, schema: Dict, playbook: Playbook,
+                         relevant_bullets: List[Bullet]) -> str:
+        start = time.perf_counter()
+        sql = await self.llm.agenerate_sql(question, schema, playbook, relevant_bullets)
+        if self.cascade:
+            self.cascade.record_llm_latency(time.perf_counter() - start)
+        return sql
+    
+    def _cascade_generate(self, question: str, schema: Dict, playbook: Playbook,
+                          relevant_bullets: List[Bullet]) -> Tuple[str, List[Bullet]]:
+        """(sql, bullets used): the LLM's answer with its bullets, or the local answer with none"""
+        decision = self.cascade.route(question, schema)
+        if decision.escalate or decision.audit:
+            start = time.perf_counter()
+            try:
+                sql = self.llm.generate_sql(question, schema, playbook, relevant_bullets)
+            except LLMRequestError:
+                if decision.escalate:
+                    raise
+                sql = None
+            if decision.escalate:
+                self.cascade.record_llm_latency(time.perf_counter() - start)
+                return sql, relevant_bullets
+            self.cascade.record_audit(question, decision.sql, sql)
+        return decision.sql, []
+    
+    async def _aaudit(self, question: str, schema: Dict, playbook: Playbook,
+                      relevant_bullets: List[Bullet], decision: CascadeDecision):
+        """Also ask the LLM for a locally answered question, to measure the accuracy delta"""
+        try:
+            sql = await self.llm.agenerate_sql(question, schema, playbook, relevant_bullets)
+        except LLMRequestError:
+            sql = None
+        self.cascade.record_audit(question, decision.sql, sql)
+    
+    def record_outcome(self, question: str, correct_sql: str, correct: bool):
+        """Report whether the answer to a question was correct (feeds cascade stats)"""
+        if self.cascade:
+            self.cascade.observe(question, correct_sql, correct)
+    
+    def generate_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                       playbook: Playbook) -> List[Tuple[Optional[str], List[str]]]:
+        """
+        Generate SQL for many questions with up to max_concurrency requests in flight
+        
+        The playbook is read, not modified, so bullet feedback for the batch
+        should be applied by the caller afterwards. With prompt_batch_size > 1,
+        questions that retrieve the same bullets are packed into shared
+        prompts first; items a packed response does not answer fall back to
+        single requests. Items whose request fails are re-queued for up to
+        max_requeues more rounds. With a cascade, confidently handled
+        questions are answered locally (with no bullet ids) and only the rest
+        reach the LLM. Must be called from synchronous code (it runs its own event loop).
+        
+        Args:
+            questions: Natural language questions
+            schemas: Schema per question
+            playbook: Current playbook knowledge
+            
+        Returns:
+            (sql_query, list_of_bullet_ids_used) per question, in order;
+            (None, []) for items that could not be generated
+        """
+        if self.use_mock_llm:
+            # Rule-based answers need no event loop
+            bullets = self._relevant_bullets_batch(questions, playbook)
+            return [
+                (sql, [b.id for b in item_bullets])
+                for sql, item_bullets in zip(mock_generate_batch(questions, schemas), bullets)
+            ]
+        return asyncio.run(self._agenerate_batch(questions, schemas, playbook))
+    
+    def iter_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                   playbook: Playbook) -> Iterator[Tuple[int, Optional[str], List[str]]]:
+        """
+        Generate SQL for many questions, yielding answers as they become available
+        
+        With a BatchJobLLM and at least its min_batch_size questions, the
+        questions go to one offline batch job (resumed if it was submitted
+        before) and answers stream back in arrival order; questions the job
+        did not answer are retried interactively at the end. A cascade still
+        answers confident questions locally, and its audits ride along in
+        the job. Otherwise this yields the generate_batch results in order.
+        
+        Yields:
+            (question_index, sql_query or None, list_of_bullet_ids_used)
+        """
+        from src.models.batch_jobs import BatchJobLLM  # batch_jobs imports src.components
+        
+        if self.use_mock_llm or not isinstance(self.llm, BatchJobLLM) or \
+                len(questions) < self.llm.min_batch_size:
+            for index, (sql, bullet_ids) in enumerate(self.generate_batch(questions, schemas, playbook)):
+                yield index, sql, bullet_ids
+            return
+        
+        bullets = self._relevant_bullets_batch(questions, playbook)
+        pending = list(range(len(questions)))
+        audits: Dict[int, CascadeDecision] = {}
+        if self.cascade:
+            pending = []
+            for index, (question, schema) in enumerate(zip(questions, schemas)):
+                decision = self.cascade.route(question, schema)
+                if decision.escalate:
+                    pending.append(index)
+                    continue
+                yield index, decision.sql, []
+                if decision.audit:
+                    audits[index] = decision
+        
+        job_items = pending + sorted(audits)
+        unanswered = set(pending)
+        for position, sql in self.llm.run_job([questions[i] for i in job_items], [schemas[i] for i in job_items],
+                                              playbook, [bullets[i] for i in job_items]):
+            index = job_items[position]
+            if index in audits:
+                self.cascade.record_audit(questions[index], audits[index].sql, sql)
+            elif sql is not None and index in unanswered:
+                unanswered.discard(index)
+                yield index, sql, [b.id for b in bullets[index]]
+        
+        if unanswered:
+            print(f"  ↻ Answering {len(unanswered)} questions the batch job did not answer interactively")
+            retry = sorted(unanswered)
+            answers = self.generate_batch([questions[i] for i in retry], [schemas[i] for i in retry], playbook)
+            for index, (sql, bullet_ids) in zip(retry, answers):
+                yield index, sql, bullet_ids
+    
+    async def _agenerate_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                               playbook: Playbook) -> List[Tuple[Optional[str], List[str]]]:
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        # All questions are embedded in one batched request, off the event loop
+        loop = asyncio.get_running_loop()
+        bullets = await loop.run_in_executor(None, self._relevant_bullets_batch, questions, playbook)
+        results: List[Tuple[Optional[str], List[str]]] = [(None, [])] * len(questions)
+        
+        async def generate_one(index: int) -> bool:
+            async with semaphore:
+                try:
+                    sql = await self._acall_llm(questions[index], schemas[index], playbook, bullets[index])
+                except LLMRequestError as e:
+                    print(f"  ⚠️  {e}")
+                    return False
+            results[index] = (sql, [b.id for b in bullets[index]])
+            return True
+        
+        async def audit_one(index: int, decision: CascadeDecision):
+            async with semaphore:
+                await self._aaudit(questions[index], schemas[index], playbook, bullets[index], decision)
+        
+        try:
+            pending = list(range(len(questions)))
+            audits = []
+            if self.cascade:
+                pending = []
+                for index, (question, schema) in enumerate(zip(questions, schemas)):
+                    decision = self.cascade.route(question, schema)
+                    if decision.escalate:
+                        pending.append(index)
+                        continue
+                    results[index] = (decision.sql, [])
+                    if decision.audit:
+                        audits.append((index, decision))
+            
+            if pending and self.prompt_batch_size > 1 and not self.use_mock_llm:
+                pending = await self._agenerate_packed(questions, schemas, playbook, bullets, results, semaphore,
+                                                       pending)
+            
+            for round_number in range(self.max_requeues + 1):
+                if not pending:
+                    break
+                if round_number:
+                    print(f"  ↻ Re-queuing {len(pending)} failed requests")
+                succeeded = await asyncio.gather(*(generate_one(index) for index in pending))
+                pending = [index for index, ok in zip(pending, succeeded) if not ok]
+            
+            if audits:
+                await asyncio.gather(*(audit_one(index, decision) for index, decision in audits))
+        finally:
+            # This loop closes when generate_batch returns
+            await self.llm.arelease_loop()
+        
+        return results
+    
+    async def _agenerate_packed(self, questions: Sequence[str], schemas: Sequence[Dict],
+                                playbook: Playbook, bullets: List[List[Bullet]],
+                                results: List, semaphore: asyncio.Semaphore,
+                                indices: Sequence[int]) -> List[int]:
+        """
+        Answer questions sharing a bullet set with multi-question prompts
+        
+        Returns:
+            Indices still needing a single request, in order
+        """
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for index in indices:
+            groups.setdefault(tuple(b.id for b in bullets[index]), []).append(index)
+        
+        chunks = []
+        unanswered = []
+        for group in groups.values():
+            for start in range(0, len(group), self.prompt_batch_size):
+                chunk = group[start:start + self.prompt_batch_size]
+                (chunks if len(chunk) > 1 else unanswered).append(chunk)
+        
+        async def generate_chunk(chunk: List[int]) -> List[int]:
+            async with semaphore:
+                try:
+                    answers = await self.llm.agenerate_sql_batch(
+                        [questions[i] for i in chunk], [schemas[i] for i in chunk],
+                        playbook, bullets[chunk[0]]
+                    )
+                except LLMRequestError as e:
+                    print(f"  ⚠️  {e}")
+                    return chunk
+            for index, sql in zip(chunk, answers):
+                if sql is not None:
+                    results[index] = (sql, [b.id for b in bullets[index]])
+            return [index for index, sql in zip(chunk, answers) if sql is None]
+        
+        for leftover in await asyncio.gather(*(generate_chunk(chunk) for chunk in chunks)):
+            unanswered.append(leftover)
+        
+        pending = sorted(index for chunk in unanswered for index in chunk)
+        packed = sum(len(chunk) for chunk in chunks)
+        print(f"  Packed {packed} questions into {len(chunks)} prompts "
+              f"({len(pending)} sent individually)")
+        return pending
+    
+    def _relevant_bullets(self, question: str, playbook: Playbook) -> List[Bullet]:
+        """Get relevant playbook knowledge using semantic search"""
+        return playbook.get_relevant_bullets(
+            question, 
+            top_k=self.top_k_bullets,
+            similarity_threshold=self.similarity_threshold
+        )
+    
+    def _relevant_bullets_batch(self, questions: Sequence[str], playbook: Playbook) -> List[List[Bullet]]:
+        """_relevant_bullets for many questions with one batched embedding request"""
+        return playbook.get_relevant_bullets_batch(
+            list(questions),
+            top_k=self.top_k_bullets,
+            similarity_threshold=self.similarity_threshold
+        )
     
     def _mock_generate(self, question: str, schema: Dict, bullets: List[Bullet]) -> str:
         """Mock SQL generation using simple rules"""
-        question_lower = question.lower()
-        tables = schema.get("tables", ["table"])
-        columns = schema.get("columns", ["*"])
-        
-        # Simple pattern matching
-        if "count" in question_lower or "how many" in question_lower:
-            return f"SELECT COUNT(*) FROM {tables[0]}"
-        
-        elif "sum" in question_lower or "total" in question_lower:
-            # Find numeric column
-            col = columns[0] if columns else "amount"
-            return f"SELECT SUM({col}) FROM {tables[0]}"
-        
-        elif "average" in question_lower or "avg" in question_lower:
-            col = columns[0] if columns else "price"
-            return f"SELECT AVG({col}) FROM {tables[0]}"
-        
-        elif "maximum" in question_lower or "max" in question_lower:
-            col = columns[0] if columns else "value"
-            return f"SELECT MAX({col}) FROM {tables[0]}"
-        
-        elif "greater than" in question_lower or "more than" in question_lower:
-            # Extract number
-            numbers = re.findall(r'\d+', question)
-            value = numbers[0] if numbers else "100"
-            col = columns[0] if columns else "value"
-            return f"SELECT * FROM {tables[0]} WHERE {col} > {value}"
-        
-        elif "less than" in question_lower:
-            numbers = re.findall(r'\d+', question)
-            value = numbers[0] if numbers else "100"
-            col = columns[0] if columns else "price"
-            return f"SELECT * FROM {tables[0]} WHERE {col} < {value}"
-        
-        elif "group by" in question_lower or "by" in question_lower:
-            col1 = columns[0] if len(columns) > 0 else "category"
-            col2 = columns[1] if len(columns) > 1 else "amount"
-            return f"SELECT {col1}, SUM({col2}) FROM {tables[0]} GROUP BY {col1}"
-        
-        else:
-            return f"SELECT * FROM {tables[0]}"
-
+        return rule_sql(question, schema)
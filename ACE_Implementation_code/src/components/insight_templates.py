@@ -0,0 +1,132 @@
+"""
+Insight Templates - Canonical playbook insights keyed by error pattern
+
+A reflection names a template id plus a compact parameter tuple instead of
+baking the offending SQL into the insight text. The playbook keeps one bullet
+per (template_id, params) and a bounded reservoir of (wrong, correct) example
+pairs, rendered into the prompt only when the bullet is used.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+# (generated_sql, correct_sql)
+ExamplePair = Tuple[str, str]
+
+INSIGHT_TEMPLATES: Dict[str, str] = {
+    "count_missing": """COUNT Aggregation Pattern:
+LOGIC: When question contains 'how many', 'count', 'number of' → use COUNT(*)
+ERROR: Missing COUNT(*) aggregation for counting query
+EXAMPLE: "How many orders?" → SELECT COUNT(*) FROM orders
+TIP: COUNT(*) counts all rows, use it for total counts""",
+
+    "count_star": """COUNT(*) vs COUNT(column):
+LOGIC: Always use COUNT(*) to count rows, not COUNT(column_name)
+ERROR: Used COUNT(column) instead of COUNT(*)
+WHY: COUNT(*) is standard SQL convention for counting all rows
+REMEMBER: Training data format uses COUNT(*) exclusively""",
+
+    "sum_missing": """SUM Aggregation for Totals:
+LOGIC: When question asks 'total', 'sum', 'overall amount' → use SUM(column)
+ERROR: Missing SUM() aggregation
+EXAMPLE: "What is total revenue?" → SELECT SUM(revenue) FROM sales
+NOTE: SUM requires numeric column as parameter""",
+
+    "where_missing": """WHERE Clause for Filtering:
+LOGIC: When question has conditions like 'greater than', 'equal to', 'from X' → add WHERE
+ERROR: Missing WHERE clause to filter results
+PATTERN: SELECT ... FROM table WHERE condition
+EXAMPLE: "employees with salary > 50000" → WHERE salary > 50000""",
+
+    "group_by_missing": """GROUP BY for Aggregation by Category:
+LOGIC: When question asks 'by department', 'per category', 'for each' → use GROUP BY
+ERROR: Missing GROUP BY clause
+PATTERN: SELECT category, AGG_FUNC() FROM table GROUP BY category
+EXAMPLE: "Count orders by customer" → GROUP BY customer
+RULE: Column in SELECT (non-aggregated) must be in GROUP BY""",
+
+    "avg_missing": """AVG Aggregation for Averages:
+LOGIC: When question contains 'average', 'mean', 'avg' → use AVG(column)
+ERROR: Missing AVG() function
+EXAMPLE: "Find average price" → SELECT AVG(price) FROM products
+NOTE: AVG calculates mean value of numeric column""",
+
+    "order_by_missing": """ORDER BY for Sorting Results:
+LOGIC: When question asks 'highest', 'lowest', 'most recent', 'top', 'bottom' → use ORDER BY
+ERROR: Missing ORDER BY clause
+PATTERN: SELECT ... FROM table ORDER BY column DESC/ASC
+EXAMPLE: "Top 5 salaries" → ORDER BY salary DESC
+DESC = descending (high to low), ASC = ascending (low to high)""",
+
+    "limit_missing": """LIMIT for Restricting Result Count:
+LOGIC: When question specifies 'top N', 'first N', 'N most' → use LIMIT N
+ERROR: Missing LIMIT clause
+PATTERN: SELECT ... FROM table ORDER BY col DESC LIMIT N
+EXAMPLE: "Top 3 orders" → ORDER BY amount DESC LIMIT 3
+NOTE: LIMIT comes at the end, usually after ORDER BY""",
+
+    "alias_extra": """Column Aliases (AS keyword):
+LOGIC: Do NOT add aliases unless training data explicitly shows them
+ERROR: Added unnecessary column aliases with AS keyword
+EXAMPLE WRONG: SELECT name AS employee_name FROM employees
+EXAMPLE RIGHT: SELECT name FROM employees
+RULE: Match training data format exactly - no AS unless shown""",
+
+    "alias_missing": """Column Aliases Required:
+LOGIC: Add aliases when training data explicitly uses them
+ERROR: Missing AS keyword for column aliases
+PATTERN: SELECT column AS alias_name FROM table
+REMEMBER: Include aliases exactly as shown in training examples""",
+
+    "column_selection": """Column Selection Mismatch (SELECT * vs specific columns):
+LOGIC: Match EXACT columns from training data - either SELECT * or SELECT col1, col2
+ERROR: Using wrong column selection pattern
+RULE 1: Use SELECT * when question says 'all', 'everything', 'show table'
+RULE 2: Use SELECT col1, col2 when question specifies particular fields
+EXAMPLE: "Show all employees" → SELECT * FROM employees
+EXAMPLE: "Get names and salaries" → SELECT name, salary FROM employees""",
+
+    "missing_components": """Missing Query Components: {components}
+LOGIC: Query structure requires {components}
+ERROR: Incomplete SQL - missing {components}
+STRUCTURE: SELECT ... FROM ... WHERE ... GROUP BY ... ORDER BY ... LIMIT ...
+NOTE: Include all clauses that appear in training data for similar queries""",
+
+    "formatting": """SQL Formatting and Style:
+LOGIC: Match EXACT formatting style from training data (whitespace, spacing, operators)
+ERROR: Formatting differences (spaces around operators, line breaks, etc.)
+FORMAT RULES:
+- Single-line SQL with single spaces between clauses
+- Space around operators: salary > 50000 not salary>50000
+- Space after commas: col1, col2 not col1,col2
+- Consistent quote style: 'value' throughout""",
+
+    "structure": """Major SQL Structure Error:
+LOGIC: Review SQL fundamentals and query structure
+ERROR: Significant structural difference from expected query
+BASIC PATTERN: SELECT columns FROM table [WHERE conditions] [GROUP BY cols] [ORDER BY cols]
+STEPS: 1) Identify what to SELECT, 2) Which table (FROM), 3) Filters (WHERE), 4) Grouping, 5) Sorting
+REVIEW: SQL clause order and syntax""",
+}
+
+
+def render_insight(template_id: str, params: Sequence[str] = ()) -> str:
+    """
+    Render a template's rule text
+
+    Args:
+        template_id: Key into INSIGHT_TEMPLATES
+        params: Template parameters (currently only the missing components)
+
+    Returns:
+        Insight text without any example SQL
+    """
+    return INSIGHT_TEMPLATES[template_id].format(components=", ".join(params))
+
+
+def render_examples(examples: List[ExamplePair]) -> str:
+    """Render (wrong, correct) example pairs for a prompt"""
+    lines = []
+    for generated_sql, correct_sql in examples:
+        lines.append(f"CORRECT: {correct_sql}")
+        lines.append(f"WRONG: {generated_sql}")
+    return "\n".join(lines)
@@ -2,9 +2,13 @@
 Playbook - Manages the growing knowledge base
 """
 
-from typing import List, Dict, Optional
+import random
+from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass, field
 from collections import defaultdict
+import numpy as np
+from src.components.dedup_index import MinHashLSHIndex
+from src.components.insight_templates import ExamplePair, render_examples
 
 
 @dataclass
@@ -16,9 +20,33 @@ class Bullet:
     helpful_count: int = 0
     harmful_count: int = 0
     embedding: Optional[List[float]] = field(default=None, repr=False)
+    # Templated insights: content is the rendered rule, examples a bounded reservoir
+    template_id: Optional[str] = None
+    params: Tuple[str, ...] = ()
+    examples: List[ExamplePair] = field(default_factory=list, repr=False)
+    examples_seen: int = 0
+    
+    def add_example(self, example: ExamplePair, capacity: int, rng: random.Random):
+        """Offer an example pair to the reservoir (reservoir sampling, Algorithm R)"""
+        if example in self.examples:
+            return
+        
+        self.examples_seen += 1
+        if len(self.examples) < capacity:
+            self.examples.append(example)
+        else:
+            slot = rng.randrange(self.examples_seen)
+            if slot < capacity:
+                self.examples[slot] = example
+    
+    def render(self) -> str:
+        """Render the bullet for a prompt, including sampled examples"""
+        if not self.examples:
+            return self.content
+        return f"{self.content}\n{render_examples(self.examples)}"
     
     def to_dict(self):
-        return {
+        data = {
             "id": self.id,
             "section": self.section,
             "content": self.content,
@@ -26,18 +54,26 @@ class Bullet:
             "harmful": self.harmful_count,
             # Don't serialize embedding to save space
         }
+        if self.template_id:
+            data["template_id"] = self.template_id
+            data["params"] = list(self.params)
+            data["examples"] = [list(example) for example in self.examples]
+            data["examples_seen"] = self.examples_seen
+        return data
 
 
 class Playbook:
     """Manages the growing knowledge base with semantic search support"""
     
-    def __init__(self, embedding_service=None, use_semantic_search: bool = False):
+    def __init__(self, embedding_service=None, use_semantic_search: bool = False,
+                 max_examples_per_bullet: int = 3):
         """
         Initialize playbook
         
         Args:
             embedding_service: Service for generating embeddings (optional)
             use_semantic_search: Whether to use semantic search for retrieval
+            max_examples_per_bullet: Reservoir size of example pairs kept per templated bullet
         """
         self.bullets: List[Bullet] = []
         self.bullet_counter = 0
@@ -50,15 +86,37 @@ class Playbook:
         }
         self.embedding_service = embedding_service
         self.use_semantic_search = use_semantic_search and embedding_service is not None
+        self.dedup_index = MinHashLSHIndex()
+        self.max_examples_per_bullet = max_examples_per_bullet
+        self._rng = random.Random(42)
+        self._bullets_by_id: Dict[str, Bullet] = {}
+        self._template_bullets: Dict[Tuple[str, Tuple[str, ...]], Bullet] = {}
+        
+        # Embedding store: unit-normalized rows in insertion order, grown by doubling
+        self._embedding_matrix: Optional[np.ndarray] = None
+        self._embedding_bullets: List[Bullet] = []
     
-    def add_bullet(self, section: str, content: str) -> Bullet:
-        """Add a new bullet to the playbook with embedding generation"""
+    def add_bullet(self, section: str, content: str,
+                   embedding: Optional[List[float]] = None,
+                   template_id: Optional[str] = None,
+                   params: Tuple[str, ...] = (),
+                   examples: List[ExamplePair] = ()) -> Bullet:
+        """
+        Add a new bullet to the playbook with embedding generation
+        
+        Args:
+            section: Playbook section
+            content: Bullet content
+            embedding: Precomputed embedding of `content` (computed here if omitted)
+            template_id: Insight template the content was rendered from (optional)
+            params: Template parameters
+            examples: Example pairs offered to the bullet's reservoir
+        """
         bullet_id = f"sql-{self.bullet_counter:05d}"
         self.bullet_counter += 1
         
         # Generate embedding if semantic search is enabled
-        embedding = None
-        if self.use_semantic_search and self.embedding_service:
+        if embedding is None and self.use_semantic_search and self.embedding_service:
             try:
                 embedding = self.embedding_service.embed_text(content)
             except Exception as e:
@@ -68,22 +126,151 @@ class Playbook:
             id=bullet_id,
             section=section,
             content=content,
-            embedding=embedding
+            embedding=embedding,
+            template_id=template_id,
+            params=tuple(params)
         )
+        for example in examples:
+            bullet.add_example(tuple(example), self.max_examples_per_bullet, self._rng)
         
         self.bullets.append(bullet)
         self.sections[section].append(bullet)
+        self._bullets_by_id[bullet_id] = bullet
+        if template_id:
+            self._template_bullets[(template_id, bullet.params)] = bullet
+        self.dedup_index.add(bullet_id, content)
+        if embedding is not None:
+            self._store_embedding(bullet)
         return bullet
     
+    def find_template_bullet(self, template_id: str, params: Tuple[str, ...] = ()) -> Optional[Bullet]:
+        """Return the bullet holding an insight template, if any"""
+        return self._template_bullets.get((template_id, tuple(params)))
+    
+    def add_example(self, bullet_id: str, example: ExamplePair):
+        """Offer an example pair to a templated bullet's reservoir"""
+        bullet = self._bullets_by_id.get(bullet_id)
+        if bullet is not None:
+            bullet.add_example(tuple(example), self.max_examples_per_bullet, self._rng)
+    
+    def restore(self, bullet_dicts: List[Dict]):
+        """Re-add bullets saved with Bullet.to_dict (e.g. from a checkpoint), with their feedback counts"""
+        for data in bullet_dicts:
+            bullet = self.add_bullet(
+                data["section"], data["content"],
+                template_id=data.get("template_id"),
+                params=tuple(data.get("params", ())),
+                examples=[tuple(example) for example in data.get("examples", [])]
+            )
+            bullet.helpful_count = data.get("helpful", 0)
+            bullet.harmful_count = data.get("harmful", 0)
+            bullet.examples_seen = max(bullet.examples_seen, data.get("examples_seen", 0))
+
+    def _store_embedding(self, bullet: Bullet):
+        """Append a bullet's normalized embedding to the embedding store"""
+        vector = np.asarray(bullet.embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        
+        count = len(self._embedding_bullets)
+        if self._embedding_matrix is None:
+            self._embedding_matrix = np.empty((16, vector.shape[0]), dtype=np.float32)
+        elif count == self._embedding_matrix.shape[0]:
+            grown = np.empty((count * 2, self._embedding_matrix.shape[1]), dtype=np.float32)
+            grown[:count] = self._embedding_matrix
+            self._embedding_matrix = grown
+        
+        self._embedding_matrix[count] = vector / norm
+        self._embedding_bullets.append(bullet)
+    
+    def nearest_bullet(self, embedding: List[float]) -> Optional[Tuple[Bullet, float]]:
+        """
+        Find the stored bullet closest to an embedding
+        
+        Args:
+            embedding: Query embedding
+            
+        Returns:
+            (bullet, cosine_similarity) of the nearest bullet, or None if the store is empty
+        """
+        if not self._embedding_bullets:
+            return None
+        
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        
+        scores = self._embedding_matrix[:len(self._embedding_bullets)] @ (query / norm)
+        best = int(np.argmax(scores))
+        return self._embedding_bullets[best], float(scores[best])
+    
+    def max_similarities(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Highest cosine similarity to any stored bullet, for each row of a matrix
+        
+        Args:
+            embeddings: (n, dim) matrix of unit-normalized query embeddings
+            
+        Returns:
+            Array of n scores (-1 where the store is empty)
+        """
+        if not self._embedding_bullets:
+            return np.full(len(embeddings), -1.0, dtype=np.float32)
+        
+        stored = self._embedding_matrix[:len(self._embedding_bullets)]
+        return (embeddings @ stored.T).max(axis=1)
+    
+    def apply_updates(self, updates: List[Dict]) -> List[Bullet]:
+        """
+        Apply a delta of curator operations
+        
+        ADD operations without a precomputed embedding are embedded together in a
+        single batched call before insertion. EXAMPLE operations feed an existing
+        templated bullet's example reservoir.
+        
+        Args:
+            updates: Operations produced by the Curator
+            
+        Returns:
+            Newly added bullets
+        """
+        adds = [update for update in updates if update["type"] == "ADD"]
+        
+        missing = [update for update in adds if update.get("embedding") is None]
+        if missing and self.use_semantic_search and self.embedding_service:
+            try:
+                embeddings = self.embedding_service.embed_texts([u["content"] for u in missing])
+                for update, embedding in zip(missing, embeddings):
+                    update["embedding"] = embedding
+            except Exception as e:
+                print(f"⚠ Failed to generate embeddings for bullets: {e}")
+        
+        for update in updates:
+            if update["type"] == "EXAMPLE":
+                self.add_example(update["bullet_id"], update["example"])
+        
+        return [
+            self.add_bullet(
+                update["section"],
+                update["content"],
+                embedding=update.get("embedding"),
+                template_id=update.get("template_id"),
+                params=update.get("params", ()),
+                examples=update.get("examples", ())
+            )
+            for update in adds
+        ]
+    
     def update_bullet_feedback(self, bullet_id: str, is_helpful: bool):
         """Update helpful/harmful counters"""
-        for bullet in self.bullets:
-            if bullet.id == bullet_id:
-                if is_helpful:
-                    bullet.helpful_count += 1
-                else:
-                    bullet.harmful_count += 1
-                break
+        bullet = self._bullets_by_id.get(bullet_id)
+        if bullet is not None:
+            if is_helpful:
+                bullet.helpful_count += 1
+            else:
+                bullet.harmful_count += 1
     
     def get_relevant_bullets(self, query: str, top_k: int = 5, 
                             similarity_threshold: float = 0.7) -> List[Bullet]:
@@ -106,12 +293,36 @@ class Playbook:
         else:
             return self._get_relevant_bullets_keyword(query, top_k)
     
-    def _get_relevant_bullets_semantic(self, query: str, top_k: int, 
-                                      similarity_threshold: float) -> List[Bullet]:
-        """Retrieve bullets using semantic similarity"""
+    def get_relevant_bullets_batch(self, queries: List[str], top_k: int = 5,
+                                   similarity_threshold: float = 0.7) -> List[List[Bullet]]:
+        """
+        get_relevant_bullets for many queries, embedding them in one batched request
+        
+        Returns:
+            Relevant bullets per query, in order
+        """
+        if not self.bullets:
+            return [[] for _ in queries]
+        if not (self.use_semantic_search and self.embedding_service):
+            return [self._get_relevant_bullets_keyword(query, top_k) for query in queries]
+        
+        try:
+            embeddings = self.embedding_service.embed_texts(list(queries))
+        except Exception as e:
+            print(f"⚠ Error embedding queries: {e}, falling back to keyword search")
+            embeddings = [None] * len(queries)
+        return [
+            self._get_relevant_bullets_semantic(query, top_k, similarity_threshold, embedding)
+            for query, embedding in zip(queries, embeddings)
+        ]
+    
+    def _get_relevant_bullets_semantic(self, query: str, top_k: int, similarity_threshold: float,
+                                      query_embedding: Optional[List[float]] = None) -> List[Bullet]:
+        """Retrieve bullets using semantic similarity (embedding the query unless given)"""
         try:
             # Generate query embedding
-            query_embedding = self.embedding_service.embed_text(query)
+            if query_embedding is None:
+                query_embedding = self.embedding_service.embed_text(query)
             if query_embedding is None:
                 print("⚠ Failed to generate query embedding, falling back to keyword search")
                 return self._get_relevant_bullets_keyword(query, top_k)
@@ -154,8 +365,14 @@ class Playbook:
         relevant.sort(key=lambda x: x[1], reverse=True)
         return [bullet for bullet, _ in relevant[:top_k]]
     
-    def format_for_prompt(self, bullets: List[Bullet] = None) -> str:
-        """Format playbook for LLM prompt"""
+    def format_for_prompt(self, bullets: List[Bullet] = None, include_feedback: bool = True) -> str:
+        """
+        Format playbook for LLM prompt
+        
+        Sections appear in playbook order. Without feedback counts the text
+        depends only on the bullets themselves, so it stays byte-identical
+        across calls (useful for provider prompt prefix caching).
+        """
         if bullets is None:
             bullets = self.bullets
         
@@ -169,11 +386,17 @@ class Playbook:
         for bullet in bullets:
             by_section[bullet.section].append(bullet)
         
-        for section, section_bullets in by_section.items():
+        ordered_sections = [section for section in self.sections if section in by_section]
+        ordered_sections += [section for section in by_section if section not in self.sections]
+        
+        for section in ordered_sections:
             formatted += f"\n## {section.upper().replace('_', ' ')}\n"
-            for bullet in section_bullets:
-                formatted += f"[{bullet.id}] (helpful={bullet.helpful_count}, harmful={bullet.harmful_count})\n"
-                formatted += f"{bullet.content}\n\n"
+            for bullet in by_section[section]:
+                if include_feedback:
+                    formatted += f"[{bullet.id}] (helpful={bullet.helpful_count}, harmful={bullet.harmful_count})\n"
+                else:
+                    formatted += f"[{bullet.id}]\n"
+                formatted += f"{bullet.render()}\n\n"
         
         return formatted
     
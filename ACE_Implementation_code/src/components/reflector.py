@@ -2,283 +2,394 @@
 Reflector - Analyzes what went wrong/right and extracts lessons
 """
 
-from typing import Dict
+import math
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from src.components.insight_templates import render_insight
+from src.utils.sql_canonical import canonical_sql_text, sql_equal
+
+# Substrings tested on the lowercased raw SQL. Alternatives sharing a prefix are
+# ordered longest first; shorter needles contained in a match are implied by it.
+RAW_NEEDLES = (
+    "select count(*)", "count(*)", "count(", "count", "sum(", "sum",
+    "avg(", "avg", "where", "group by", "order by", "limit", " as ",
+)
+# Substrings tested on the lowercased canonical SQL
+NORM_NEEDLES = ("select", "from", "where", "group by", "group", "order by", "order")
+
+_SELECT_LIST_RE = re.compile(r'select\s+(.+?)\s+from')
+
+
+def _compile_needles(prefix: str, needles: Tuple[str, ...]):
+    """Build an overlapping-match scanner and substring-closure table for needles"""
+    names = [f"{prefix}:{needle}" for needle in needles]
+    pattern = re.compile("(?=(" + "|".join(re.escape(needle) for needle in needles) + "))")
+    implied = {
+        needle: [f"{prefix}:{other}" for other in needles if other in needle]
+        for needle in needles
+    }
+    return names, pattern, implied
+
+
+_RAW_NAMES, _RAW_PATTERN, _RAW_IMPLIED = _compile_needles("raw", RAW_NEEDLES)
+_NORM_NAMES, _NORM_PATTERN, _NORM_IMPLIED = _compile_needles("norm", NORM_NEEDLES)
+
+# One bit per feature of a single query
+FEATURE_BITS = {
+    name: 1 << bit
+    for bit, name in enumerate(_RAW_NAMES + _NORM_NAMES + ["select_list", "select_star"])
+}
+
+
+def _scan(text: str, pattern, implied) -> int:
+    mask = 0
+    for match in pattern.finditer(text):
+        for name in implied[match.group(1)]:
+            mask |= FEATURE_BITS[name]
+    return mask
+
+
+@lru_cache(maxsize=65536)
+def sql_features(sql: str) -> int:
+    """
+    Feature bitmask of a query, computed once per distinct SQL string
+
+    Combines substring needles on the raw lowercased SQL, needles on the
+    canonical text and the shape of the select list.
+    """
+    normalized = canonical_sql_text(sql).lower()
+    mask = _scan(sql.lower(), _RAW_PATTERN, _RAW_IMPLIED) | _scan(normalized, _NORM_PATTERN, _NORM_IMPLIED)
+
+    select = _SELECT_LIST_RE.search(normalized)
+    if select:
+        mask |= FEATURE_BITS["select_list"]
+        if select.group(1).strip() == "*":
+            mask |= FEATURE_BITS["select_star"]
+    return mask
+
+
+def _missing_components(gen: int, correct: int) -> Tuple[str, ...]:
+    """Clauses present in the correct query but absent from the generated one"""
+    components = []
+    for required, present, label in (
+        ("norm:where", "norm:where", "WHERE clause"),
+        ("norm:group by", "norm:group", "GROUP BY"),
+        ("norm:order by", "norm:order", "ORDER BY"),
+    ):
+        if correct & FEATURE_BITS[required] and not gen & FEATURE_BITS[present]:
+            components.append(label)
+    return tuple(components)
+
+
+class Rule(NamedTuple):
+    """
+    One row of the reflection rule table
+    
+    `correct` and `generated` map a feature name to whether it must be present
+    (True) or absent (False) in that query. `params` derives template parameters
+    from both feature masks; a rule whose params come back empty does not fire.
+    """
+    template_id: str
+    error_identification: str
+    root_cause: str
+    correct_approach: str
+    correct: Dict[str, bool] = {}
+    generated: Dict[str, bool] = {}
+    params: Optional[Callable[[int, int], Tuple[str, ...]]] = None
+
+
+# Evaluated in order; the first matching rule wins
+RULES = (
+    Rule("count_missing", "Failed to use COUNT aggregation",
+         "Did not recognize counting query pattern",
+         "Use COUNT(*) for 'how many' or 'count' questions",
+         correct={"raw:select count(*)": True}, generated={"raw:count": False}),
+    Rule("count_star", "Used COUNT(column) instead of COUNT(*)",
+         "Training data uses COUNT(*) not COUNT(specific_column)",
+         "Use COUNT(*) to match training: {correct_sql}",
+         correct={"raw:count(*)": True}, generated={"raw:count(*)": False, "raw:count(": True}),
+    Rule("sum_missing", "Failed to use SUM aggregation",
+         "Did not recognize summation pattern",
+         "Use SUM(column) for 'total' or 'sum' questions",
+         correct={"raw:sum(": True}, generated={"raw:sum": False}),
+    Rule("where_missing", "Missing WHERE clause for filtering",
+         "Did not identify filtering condition",
+         "Add WHERE clause: {correct_sql}",
+         correct={"raw:where": True}, generated={"raw:where": False}),
+    Rule("group_by_missing", "Missing GROUP BY clause",
+         "Did not recognize aggregation by category",
+         "Use GROUP BY when aggregating by category",
+         correct={"raw:group by": True}, generated={"raw:group by": False}),
+    Rule("avg_missing", "Failed to use AVG aggregation",
+         "Did not recognize average calculation",
+         "Use AVG(column) for average questions",
+         correct={"raw:avg(": True}, generated={"raw:avg": False}),
+    Rule("order_by_missing", "Missing ORDER BY clause",
+         "Did not recognize sorting requirement",
+         "Use ORDER BY for 'most recent', 'highest', 'lowest' queries",
+         correct={"raw:order by": True}, generated={"raw:order by": False}),
+    Rule("limit_missing", "Missing LIMIT clause",
+         "Did not recognize result limiting",
+         "Use LIMIT to restrict number of results",
+         correct={"raw:limit": True}, generated={"raw:limit": False}),
+    # Remaining rules: generated query has all components but a different style
+    Rule("alias_extra", "Added unnecessary aliases",
+         "Training data does not use aliases",
+         "Remove aliases to match: {correct_sql}",
+         correct={"raw: as ": False},
+         generated={"norm:select": True, "norm:from": True, "raw: as ": True}),
+    Rule("alias_missing", "Missing aliases",
+         "Training data requires aliases",
+         "Add aliases to match: {correct_sql}",
+         correct={"raw: as ": True},
+         generated={"norm:select": True, "norm:from": True, "raw: as ": False}),
+    Rule("column_selection", "Column selection mismatch",
+         "Using SELECT * instead of specific columns or vice versa",
+         "Match exact format: {correct_sql}",
+         correct={"select_list": True, "select_star": False},
+         generated={"norm:select": True, "norm:from": True, "select_list": True, "select_star": True}),
+    Rule("column_selection", "Column selection mismatch",
+         "Using SELECT * instead of specific columns or vice versa",
+         "Match exact format: {correct_sql}",
+         correct={"select_list": True, "select_star": True},
+         generated={"norm:select": True, "norm:from": True, "select_list": True, "select_star": False}),
+    Rule("missing_components", "Missing: {components}",
+         "Query structure incomplete",
+         "Add {components} to the query",
+         generated={"norm:select": True, "norm:from": True},
+         params=_missing_components),
+    Rule("formatting", "Formatting mismatch",
+         "Query format differs from training data",
+         "Match exact format: {correct_sql}",
+         generated={"norm:select": True, "norm:from": True}),
+    Rule("structure", "Generated SQL structure significantly differs",
+         "Major query structure mismatch",
+         "Expected pattern: {correct_sql}"),
+)
+
+
+def _compile_side(conditions: Dict[str, bool]) -> Tuple[int, int]:
+    """(care mask, expected bits) for one query's conditions"""
+    care = expected = 0
+    for name, present in conditions.items():
+        care |= FEATURE_BITS[name]
+        if present:
+            expected |= FEATURE_BITS[name]
+    return care, expected
+
+
+# (correct care, correct expected, generated care, generated expected, rule)
+_COMPILED_RULES = tuple(
+    _compile_side(rule.correct) + _compile_side(rule.generated) + (rule,)
+    for rule in RULES
+)
+
+
+# Process-pool tuning for analyze_batch: each task carries at least
+# MIN_ITEMS_PER_WORKER analyses so IPC stays small next to the work, and each
+# worker gets about CHUNKS_PER_WORKER chunks to even out load.
+MIN_ITEMS_PER_WORKER = 256
+CHUNKS_PER_WORKER = 4
+
+
+def _analyze_item(item: Tuple[str, str, bool]) -> Dict:
+    """Worker entry point: analyze one (generated_sql, correct_sql, success) attempt"""
+    return _WORKER_REFLECTOR._analyze(*item)
 
 
 class Reflector:
     """Analyzes what went wrong/right and extracts lessons"""
     
+    def __init__(self, cache_size: int = 10000):
+        """
+        Initialize reflector
+        
+        Args:
+            cache_size: Maximum number of reflections memoized by
+                (question, generated SQL, correct SQL, success);
+                least recently used entries are evicted first. 0 disables the cache.
+        """
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_workers = 0
+    
     def analyze(self, question: str, generated_sql: str, correct_sql: str, 
                 execution_success: bool, error_message: str = None) -> Dict:
         """
         Analyze the generation attempt
         
+        Both queries are reduced to cached feature bitmasks and matched against
+        the compiled rule table (RULES) in order. Repeated attempts are served
+        from the reflection cache and marked with "cached": True.
+        
         Returns:
             Dictionary with reflection analysis
         """
+        if self.cache_size <= 0 or error_message:
+            return self._analyze(generated_sql, correct_sql, execution_success)
+        
+        key = self._cache_key(question, generated_sql, correct_sql, execution_success)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        reflection = self._analyze(generated_sql, correct_sql, execution_success)
+        self._cache_put(key, reflection)
+        return _copy_reflection(reflection)
+    
+    def analyze_batch(self, items: List[Tuple[str, str, str, bool]], workers: int = 1) -> List[Dict]:
+        """
+        Analyze many attempts, fanning cache misses out over a process pool
+        
+        Args:
+            items: (question, generated_sql, correct_sql, execution_success) tuples
+            workers: Number of worker processes (1 = analyze in this process)
+            
+        Returns:
+            Reflections in the same order as `items`
+        """
+        results: List[Optional[Dict]] = [None] * len(items)
+        misses = []  # (index, cache key)
+        for index, (question, generated_sql, correct_sql, success) in enumerate(items):
+            if self.cache_size <= 0:
+                misses.append((index, None))
+                continue
+            key = self._cache_key(question, generated_sql, correct_sql, success)
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[index] = cached
+            else:
+                misses.append((index, key))
+        
+        # Identical misses within the batch are analyzed once
+        unique = {}
+        for index, key in misses:
+            unique.setdefault(key if key is not None else index, index)
+        work = [items[index][1:] for index in unique.values()]
+        
+        if workers > 1 and len(work) >= workers * MIN_ITEMS_PER_WORKER:
+            pool = self._get_pool(workers)
+            chunksize = max(MIN_ITEMS_PER_WORKER, math.ceil(len(work) / (workers * CHUNKS_PER_WORKER)))
+            analyzed = list(pool.map(_analyze_item, work, chunksize=chunksize))
+        else:
+            analyzed = [_analyze_item(item) for item in work]
+        
+        by_key = dict(zip(unique.keys(), analyzed))
+        for index, key in misses:
+            reflection = by_key[key if key is not None else index]
+            if key is not None and key not in self._cache:
+                self._cache_put(key, reflection)
+            results[index] = _copy_reflection(reflection)
+        return results
+    
+    def close(self):
+        """Shut down the worker pool, if one was started"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_workers = 0
+    
+    def _get_pool(self, workers: int) -> ProcessPoolExecutor:
+        if self._pool is None or self._pool_workers != workers:
+            self.close()
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+            self._pool_workers = workers
+        return self._pool
+    
+    @staticmethod
+    def _cache_key(question: str, generated_sql: str, correct_sql: str, execution_success: bool) -> Tuple:
+        # Raw SQL, not the canonical form: features are read from the raw text and
+        # the reflection quotes both queries
+        return (question.strip(), generated_sql, correct_sql, bool(execution_success))
+    
+    def _cache_get(self, key: Tuple) -> Optional[Dict]:
+        cached = self._cache.get(key)
+        if cached is None:
+            self.cache_misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.cache_hits += 1
+        reflection = _copy_reflection(cached)
+        reflection["cached"] = True
+        return reflection
+    
+    def _cache_put(self, key: Tuple, reflection: Dict):
+        self._cache[key] = reflection
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    
+    def cache_stats(self) -> Dict:
+        """Reflection cache statistics"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "size": len(self._cache),
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+        }
+    
+    def _analyze(self, generated_sql: str, correct_sql: str, execution_success: bool) -> Dict:
+        """Run the rule table on one attempt"""
         reflection = {
             "error_identification": "",
             "root_cause": "",
             "correct_approach": "",
             "key_insight": "",
+            "template_id": None,  # Insight template (see insight_templates.py)
+            "params": (),
+            "example": None,  # (generated_sql, correct_sql)
             "bullet_tags": []  # List of (bullet_id, is_helpful) tuples
         }
         
-        # Normalize SQL for comparison (remove whitespace, newlines, case)
-        def normalize_sql(sql: str) -> str:
-            """Normalize SQL for comparison - preserves structure"""
-            import re
-            # Remove extra whitespace and newlines, but keep single spaces
-            sql = re.sub(r'\s+', ' ', sql.strip())
-            # Remove aliases (AS xxx) but keep the rest
-            sql = re.sub(r'\s+AS\s+\w+', '', sql, flags=re.IGNORECASE)
-            return sql.lower()
-        
-        def are_semantically_equal(gen_sql: str, correct_sql: str) -> bool:
-            """Check if SQLs are semantically equivalent"""
-            import re
-            
-            # Normalize both
-            gen_norm = normalize_sql(gen_sql)
-            correct_norm = normalize_sql(correct_sql)
-            
-            # Exact match after normalization
-            if gen_norm == correct_norm:
-                return True
-            
-            # Check if only difference is whitespace/newlines
-            gen_compact = re.sub(r'\s+', '', gen_norm)
-            correct_compact = re.sub(r'\s+', '', correct_norm)
-            
-            if gen_compact == correct_compact:
-                return True
-            
-            return False
-        
-        gen_normalized = normalize_sql(generated_sql)
-        correct_normalized = normalize_sql(correct_sql)
-        
-        # Check for EXACT match (strict comparison)
-        if execution_success and generated_sql.strip() == correct_sql.strip():
+        # Check for match on the canonical form
+        if execution_success and sql_equal(generated_sql, correct_sql):
             # Perfect match!
             reflection["error_identification"] = "Query generated correctly"
             reflection["key_insight"] = "Successful pattern that should be reinforced"
             return reflection
         
-        # Analyze what went wrong
-        gen_lower = generated_sql.lower()
-        correct_lower = correct_sql.lower()
-        
-        # Check for common mistakes
-        if "select count(*)" in correct_lower and "count" not in gen_lower:
-            reflection["error_identification"] = "Failed to use COUNT aggregation"
-            reflection["root_cause"] = "Did not recognize counting query pattern"
-            reflection["correct_approach"] = "Use COUNT(*) for 'how many' or 'count' questions"
-            reflection["key_insight"] = f"""COUNT Aggregation Pattern:
-LOGIC: When question contains 'how many', 'count', 'number of' → use COUNT(*)
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Missing COUNT(*) aggregation for counting query
-EXAMPLE: "How many orders?" → SELECT COUNT(*) FROM orders
-TIP: COUNT(*) counts all rows, use it for total counts"""
-        
-        elif "count(*)" in correct_lower and "count(*)" not in gen_lower and "count(" in gen_lower:
-            reflection["error_identification"] = "Used COUNT(column) instead of COUNT(*)"
-            reflection["root_cause"] = "Training data uses COUNT(*) not COUNT(specific_column)"
-            reflection["correct_approach"] = f"Use COUNT(*) to match training: {correct_sql}"
-            reflection["key_insight"] = f"""COUNT(*) vs COUNT(column):
-LOGIC: Always use COUNT(*) to count rows, not COUNT(column_name)
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Used COUNT(column) instead of COUNT(*)
-WHY: COUNT(*) is standard SQL convention for counting all rows
-REMEMBER: Training data format uses COUNT(*) exclusively"""
-        
-        elif "sum(" in correct_lower and "sum" not in gen_lower:
-            reflection["error_identification"] = "Failed to use SUM aggregation"
-            reflection["root_cause"] = "Did not recognize summation pattern"
-            reflection["correct_approach"] = "Use SUM(column) for 'total' or 'sum' questions"
-            reflection["key_insight"] = f"""SUM Aggregation for Totals:
-LOGIC: When question asks 'total', 'sum', 'overall amount' → use SUM(column)
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Missing SUM() aggregation
-EXAMPLE: "What is total revenue?" → SELECT SUM(revenue) FROM sales
-NOTE: SUM requires numeric column as parameter"""
-        
-        elif "where" in correct_lower and "where" not in gen_lower:
-            reflection["error_identification"] = "Missing WHERE clause for filtering"
-            reflection["root_cause"] = "Did not identify filtering condition"
-            reflection["correct_approach"] = f"Add WHERE clause: {correct_sql}"
-            reflection["key_insight"] = f"""WHERE Clause for Filtering:
-LOGIC: When question has conditions like 'greater than', 'equal to', 'from X' → add WHERE
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Missing WHERE clause to filter results
-PATTERN: SELECT ... FROM table WHERE condition
-EXAMPLE: "employees with salary > 50000" → WHERE salary > 50000"""
+        gen = sql_features(generated_sql)
+        correct = sql_features(correct_sql)
         
-        elif "group by" in correct_lower and "group by" not in gen_lower:
-            reflection["error_identification"] = "Missing GROUP BY clause"
-            reflection["root_cause"] = "Did not recognize aggregation by category"
-            reflection["correct_approach"] = "Use GROUP BY when aggregating by category"
-            reflection["key_insight"] = f"""GROUP BY for Aggregation by Category:
-LOGIC: When question asks 'by department', 'per category', 'for each' → use GROUP BY
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Missing GROUP BY clause
-PATTERN: SELECT category, AGG_FUNC() FROM table GROUP BY category
-EXAMPLE: "Count orders by customer" → GROUP BY customer
-RULE: Column in SELECT (non-aggregated) must be in GROUP BY"""
-        
-        elif "avg(" in correct_lower and "avg" not in gen_lower:
-            reflection["error_identification"] = "Failed to use AVG aggregation"
-            reflection["root_cause"] = "Did not recognize average calculation"
-            reflection["correct_approach"] = "Use AVG(column) for average questions"
-            reflection["key_insight"] = f"""AVG Aggregation for Averages:
-LOGIC: When question contains 'average', 'mean', 'avg' → use AVG(column)
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Missing AVG() function
-EXAMPLE: "Find average price" → SELECT AVG(price) FROM products
-NOTE: AVG calculates mean value of numeric column"""
-        
-        elif "order by" in correct_lower and "order by" not in gen_lower:
-            reflection["error_identification"] = "Missing ORDER BY clause"
-            reflection["root_cause"] = "Did not recognize sorting requirement"
-            reflection["correct_approach"] = "Use ORDER BY for 'most recent', 'highest', 'lowest' queries"
-            reflection["key_insight"] = f"""ORDER BY for Sorting Results:
-LOGIC: When question asks 'highest', 'lowest', 'most recent', 'top', 'bottom' → use ORDER BY
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Missing ORDER BY clause
-PATTERN: SELECT ... FROM table ORDER BY column DESC/ASC
-EXAMPLE: "Top 5 salaries" → ORDER BY salary DESC
-DESC = descending (high to low), ASC = ascending (low to high)"""
-        
-        elif "limit" in correct_lower and "limit" not in gen_lower:
-            reflection["error_identification"] = "Missing LIMIT clause"
-            reflection["root_cause"] = "Did not recognize result limiting"
-            reflection["correct_approach"] = "Use LIMIT to restrict number of results"
-            reflection["key_insight"] = f"""LIMIT for Restricting Result Count:
-LOGIC: When question specifies 'top N', 'first N', 'N most' → use LIMIT N
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Missing LIMIT clause
-PATTERN: SELECT ... FROM table ORDER BY col DESC LIMIT N
-EXAMPLE: "Top 3 orders" → ORDER BY amount DESC LIMIT 3
-NOTE: LIMIT comes at the end, usually after ORDER BY"""
-        
-        # Check if just formatting differences (has all components but different style)
-        elif all(keyword in gen_normalized for keyword in ["select", "from"]):
-            # Check for alias differences FIRST (most specific)
-            # Check on ORIGINAL strings, not normalized (since normalize removes aliases)
-            has_alias_in_gen = ' as ' in gen_lower or ' AS ' in generated_sql
-            has_alias_in_correct = ' as ' in correct_lower or ' AS ' in correct_sql
-            
-            if has_alias_in_gen and not has_alias_in_correct:
-                reflection["error_identification"] = "Added unnecessary aliases"
-                reflection["root_cause"] = "Training data does not use aliases"
-                reflection["correct_approach"] = f"Remove aliases to match: {correct_sql}"
-                reflection["key_insight"] = f"""Column Aliases (AS keyword):
-LOGIC: Do NOT add aliases unless training data explicitly shows them
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Added unnecessary column aliases with AS keyword
-EXAMPLE WRONG: SELECT name AS employee_name FROM employees
-EXAMPLE RIGHT: SELECT name FROM employees
-RULE: Match training data format exactly - no AS unless shown"""
-                return reflection
-            elif not has_alias_in_gen and has_alias_in_correct:
-                reflection["error_identification"] = "Missing aliases"
-                reflection["root_cause"] = "Training data requires aliases"
-                reflection["correct_approach"] = f"Add aliases to match: {correct_sql}"
-                reflection["key_insight"] = f"""Column Aliases Required:
-LOGIC: Add aliases when training data explicitly uses them
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Missing AS keyword for column aliases
-PATTERN: SELECT column AS alias_name FROM table
-REMEMBER: Include aliases exactly as shown in training examples"""
-                return reflection
+        for correct_care, correct_expected, gen_care, gen_expected, rule in _COMPILED_RULES:
+            if correct & correct_care != correct_expected or gen & gen_care != gen_expected:
+                continue
             
-            # Extract key components to give specific feedback
-            missing_components = []
-            column_mismatch = False
+            params = rule.params(gen, correct) if rule.params else ()
+            if rule.params and not params:
+                continue
             
-            # Check for missing clauses
-            if "where" in correct_normalized and "where" not in gen_normalized:
-                missing_components.append("WHERE clause")
-            if "group by" in correct_normalized and "group" not in gen_normalized:
-                missing_components.append("GROUP BY")
-            if "order by" in correct_normalized and "order" not in gen_normalized:
-                missing_components.append("ORDER BY")
-            
-            # Check for column selection differences (SELECT * vs SELECT col1, col2)
-            import re
-            gen_select = re.search(r'select\s+(.+?)\s+from', gen_normalized)
-            correct_select = re.search(r'select\s+(.+?)\s+from', correct_normalized)
-            
-            if gen_select and correct_select:
-                gen_cols = gen_select.group(1).strip()
-                correct_cols = correct_select.group(1).strip()
-                
-                # If one uses * and other uses specific columns, that's an issue
-                if (gen_cols == '*' and correct_cols != '*') or (gen_cols != '*' and correct_cols == '*'):
-                    column_mismatch = True
-            
-            if column_mismatch:
-                reflection["error_identification"] = "Column selection mismatch"
-                reflection["root_cause"] = "Using SELECT * instead of specific columns or vice versa"
-                reflection["correct_approach"] = f"Match exact format: {correct_sql}"
-                reflection["key_insight"] = f"""Column Selection Mismatch (SELECT * vs specific columns):
-LOGIC: Match EXACT columns from training data - either SELECT * or SELECT col1, col2
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Using wrong column selection pattern
-RULE 1: Use SELECT * when question says 'all', 'everything', 'show table'
-RULE 2: Use SELECT col1, col2 when question specifies particular fields
-EXAMPLE: "Show all employees" → SELECT * FROM employees
-EXAMPLE: "Get names and salaries" → SELECT name, salary FROM employees"""
-            elif missing_components:
-                reflection["error_identification"] = f"Missing: {', '.join(missing_components)}"
-                reflection["root_cause"] = "Query structure incomplete"
-                reflection["correct_approach"] = f"Add {', '.join(missing_components)} to the query"
-                reflection["key_insight"] = f"""Missing Query Components: {', '.join(missing_components)}
-LOGIC: Query structure requires {', '.join(missing_components)}
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Incomplete SQL - missing {', '.join(missing_components)}
-STRUCTURE: SELECT ... FROM ... WHERE ... GROUP BY ... ORDER BY ... LIMIT ...
-NOTE: Include all clauses that appear in training data for similar queries"""
-            else:
-                # Other formatting differences (whitespace, newlines, etc.)
-                reflection["error_identification"] = "Formatting mismatch"
-                reflection["root_cause"] = "Query format differs from training data"
-                reflection["correct_approach"] = f"Match exact format: {correct_sql}"
-                reflection["key_insight"] = f"""SQL Formatting and Style:
-LOGIC: Match EXACT formatting style from training data (whitespace, spacing, operators)
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Formatting differences (spaces around operators, line breaks, etc.)
-FORMAT RULES:
-- Single-line SQL with single spaces between clauses
-- Space around operators: salary > 50000 not salary>50000
-- Space after commas: col1, col2 not col1,col2
-- Consistent quote style: 'value' throughout"""
-        
-        else:
-            reflection["error_identification"] = "Generated SQL structure significantly differs"
-            reflection["root_cause"] = "Major query structure mismatch"
-            reflection["correct_approach"] = f"Expected pattern: {correct_sql}"
-            reflection["key_insight"] = f"""Major SQL Structure Error:
-LOGIC: Review SQL fundamentals and query structure
-CORRECT: {correct_sql}
-WRONG: {generated_sql}
-ERROR: Significant structural difference from expected query
-BASIC PATTERN: SELECT columns FROM table [WHERE conditions] [GROUP BY cols] [ORDER BY cols]
-STEPS: 1) Identify what to SELECT, 2) Which table (FROM), 3) Filters (WHERE), 4) Grouping, 5) Sorting
-REVIEW: SQL clause order and syntax"""
+            components = ", ".join(params)
+            reflection["error_identification"] = rule.error_identification.format(components=components)
+            reflection["root_cause"] = rule.root_cause
+            reflection["correct_approach"] = rule.correct_approach.format(
+                components=components, correct_sql=correct_sql
+            )
+            self._set_insight(reflection, rule.template_id, params, generated_sql, correct_sql)
+            break
         
         return reflection
+    
+    @staticmethod
+    def _set_insight(reflection: Dict, template_id: str, params: Tuple[str, ...],
+                     generated_sql: str, correct_sql: str):
+        """Record the insight as a template reference plus its example pair"""
+        reflection["template_id"] = template_id
+        reflection["params"] = params
+        reflection["example"] = (generated_sql, correct_sql)
+        reflection["key_insight"] = render_insight(template_id, params)
+
+
+def _copy_reflection(reflection: Dict) -> Dict:
+    """Copy whose mutable fields are not shared with the cached entry"""
+    return dict(reflection, bullet_tags=list(reflection["bullet_tags"]))
+
 
+# Uncached reflector used by analyze_batch workers (and serial batch analysis)
+_WORKER_REFLECTOR = Reflector(cache_size=0)
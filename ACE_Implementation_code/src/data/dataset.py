@@ -427,7 +427,8 @@ class WikiSQLDataset:
         - question: natural language question
         - sql: SQL query string
         - schema: dict with 'tables' and 'columns'
-        - expected_result: empty list (we don't execute queries)
+        - table_rows: the table's rows, used for execution-accuracy evaluation
+        - expected_result: empty list (WikiSQL doesn't provide expected results)
         """
         question = example.get("question", "")
         table = example.get("table", {})
@@ -454,6 +455,7 @@ class WikiSQLDataset:
                 "tables": [table_name],
                 "columns": columns
             },
+            "table_rows": table.get("rows", []),
             "expected_result": []  # WikiSQL doesn't provide expected results
         }
     
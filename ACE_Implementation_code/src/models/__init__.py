@@ -2,13 +2,34 @@
 LLM Models - Interfaces for different LLM providers
 """
 
-from src.models.base_llm import BaseLLM
-from src.models.mock_llm import MockLLM
-from src.models.embedding_service import EmbeddingService, MockEmbeddingService
+import importlib
+import importlib.util
 
-try:
-    from src.models.azure_openai_llm import AzureOpenAILLM
-    __all__ = ["BaseLLM", "MockLLM", "AzureOpenAILLM", "EmbeddingService", "MockEmbeddingService"]
-except ImportError:
-    __all__ = ["BaseLLM", "MockLLM", "EmbeddingService", "MockEmbeddingService"]
+# Public names and the modules defining them; imported on first access, so
+# langchain/openai load only when a real provider is actually used
+_EXPORTS = {
+    "BaseLLM": "src.models.base_llm",
+    "MockLLM": "src.models.mock_llm",
+    "AzureOpenAILLM": "src.models.azure_openai_llm",
+    "CachedLLM": "src.models.cached_llm",
+    "ResponseCache": "src.models.cached_llm",
+    "EmbeddingService": "src.models.embedding_service",
+    "MockEmbeddingService": "src.models.embedding_service",
+}
 
+if importlib.util.find_spec("langchain_openai") is None:
+    del _EXPORTS["AzureOpenAILLM"]
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
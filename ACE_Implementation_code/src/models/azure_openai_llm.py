@@ -2,17 +2,54 @@
 Azure OpenAI LLM - Implementation for Azure OpenAI API
 """
 
-from typing import Dict, List
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+from langchain_core.messages import AIMessageChunk, HumanMessage, SystemMessage
 from langchain_openai import AzureChatOpenAI
-from src.models.base_llm import BaseLLM
+from src.models.base_llm import BaseLLM, LLMRequestError, clean_response, parse_batch_response
+from src.models.http_pool import HTTPClientFactory, shared_client_factory
+from src.models.rate_limiter import (
+    AIMDController, RateLimiter, RetryPolicy, acall_with_retry, call_with_retry,
+)
+from src.models.sql_stream import SQLStreamParser
+from src.models.usage_meter import UsageMeter
 from src.components.playbook import Playbook, Bullet
 
+# Strong system message sent with every request
+SYSTEM_MESSAGE = """You are a precise SQL query generator. You MUST follow formatting rules EXACTLY.
+CRITICAL: 
+- Output ONLY the SQL query with NO extra text
+- Use single-line format with NO newlines
+- Do NOT add column aliases (AS keyword)
+- Follow playbook rules strictly"""
+
+# System message for multi-question prompts (structured output instead of bare SQL)
+BATCH_SYSTEM_MESSAGE = """You are a precise SQL query generator. You MUST follow formatting rules EXACTLY.
+CRITICAL: 
+- Output ONLY a JSON array with one {"id": <question number>, "sql": "<query>"} object per question
+- Each query is single-line with NO newlines
+- Do NOT add column aliases (AS keyword)
+- Follow playbook rules strictly"""
+
 
 class AzureOpenAILLM(BaseLLM):
     """Azure OpenAI LLM implementation using LangChain"""
     
+    system_message = SYSTEM_MESSAGE
+    batch_system_message = BATCH_SYSTEM_MESSAGE
+    
+    # Completion tokens reserved per request before the real usage is known
+    EXPECTED_OUTPUT_TOKENS = 64
+    
     def __init__(self, api_key: str, endpoint: str, deployment_name: str,
-                 model_name: str, api_version: str):
+                 model_name: str, api_version: str,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 concurrency: Optional[AIMDController] = None,
+                 stream: bool = False,
+                 http_clients: Optional[HTTPClientFactory] = None,
+                 usage_meter: Optional[UsageMeter] = None):
         """
         Initialize Azure OpenAI LLM
         
@@ -22,7 +59,15 @@ class AzureOpenAILLM(BaseLLM):
             deployment_name: Azure deployment name
             model_name: Model name (e.g., gpt-4o)
             api_version: API version
+            rate_limiter: Requests/tokens per minute budget, shared with embeddings (optional)
+            retry_policy: Backoff for 429/5xx and connection errors
+            concurrency: AIMD limit on in-flight async requests
+            stream: Stream single-question completions and stop reading once
+                a complete SQL statement has arrived
+            http_clients: Pooled HTTP clients, shared with embeddings (default: process-wide factory)
+            usage_meter: Receives tokens and wall time of every request (optional)
         """
+        self.http_clients = http_clients if http_clients else shared_client_factory()
         self.llm = AzureChatOpenAI(
             model=model_name,
             azure_deployment=deployment_name,
@@ -32,9 +77,23 @@ class AzureOpenAILLM(BaseLLM):
             temperature=0.0,  # Deterministic for SQL generation
             model_kwargs={
                 "top_p": 0.1,  # Very low top_p for more deterministic output
-            }
+            },
+            max_retries=0,  # Retries are handled by retry_policy
+            http_client=self.http_clients.client(endpoint),
+            http_async_client=self.http_clients.async_client(endpoint),
         )
         self.model_name = model_name
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.concurrency = concurrency if concurrency else AIMDController()
+        self.stream = stream
+        self.usage_meter = usage_meter
+        self.usage = {"requests": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0,
+                      "request_seconds": 0.0}
+        self.stream_stats = {"streamed_requests": 0, "early_stops": 0,
+                             "time_to_first_token": 0.0, "time_to_sql": 0.0}
+        # Requests finish on worker threads as well as the event loop
+        self._lock = threading.Lock()
         print(f"  ✓ Azure OpenAI initialized: {model_name} (deployment: {deployment_name})")
     
     def generate_sql(self, question: str, schema: Dict, playbook: Playbook, 
@@ -50,49 +109,204 @@ class AzureOpenAILLM(BaseLLM):
             
         Returns:
             Generated SQL query string
+            
+        Raises:
+            LLMRequestError: The request still failed after retries
         """
         # Build prompt using base class method
         prompt = self._build_prompt(question, schema, playbook, relevant_bullets)
+        messages = self._messages(prompt)
+        estimated = self._estimate_tokens(prompt)
+        
+        if self.stream:
+            request = lambda: self._stream_completion(messages, estimated)
+        else:
+            request = lambda: self.llm.invoke(messages)
         
+        start = time.monotonic()
         try:
-            # Build strong system message
-            system_message = """You are a precise SQL query generator. You MUST follow formatting rules EXACTLY.
-CRITICAL: 
-- Output ONLY the SQL query with NO extra text
-- Use single-line format with NO newlines
-- Do NOT add column aliases (AS keyword)
-- Follow playbook rules strictly"""
-            
-            # Call Azure OpenAI via LangChain with system message
-            from langchain_core.messages import HumanMessage, SystemMessage
-            messages = [
-                SystemMessage(content=system_message),
-                HumanMessage(content=prompt)
-            ]
-            response = self.llm.invoke(messages)
-            
-            # Extract SQL from response
-            sql_query = response.content.strip()
-            
-            # Clean up response (remove markdown code blocks if present)
-            if "```sql" in sql_query:
-                sql_query = sql_query.split("```sql")[1].split("```")[0].strip()
-            elif "```" in sql_query:
-                sql_query = sql_query.split("```")[1].split("```")[0].strip()
-            
-            # Remove trailing semicolon if present
-            if sql_query.endswith(';'):
-                sql_query = sql_query[:-1].strip()
-            
-            # Force single-line format (remove extra newlines and spaces)
-            import re
-            sql_query = re.sub(r'\s+', ' ', sql_query)
-            
-            return sql_query
-            
+            response = call_with_retry(
+                request,
+                limiter=self.rate_limiter, policy=self.retry_policy,
+                controller=self.concurrency, tokens=estimated
+            )
         except Exception as e:
-            print(f"  ⚠️  Error calling Azure OpenAI API: {e}")
-            # Fallback to simple query
-            tables = schema.get('tables', ['table'])
-            return f"SELECT * FROM {tables[0]}"
-
+            raise LLMRequestError(f"Azure OpenAI request failed: {e}") from e
+        
+        self._record_usage(estimated, response, time.monotonic() - start, len(relevant_bullets))
+        return self._clean_response(response.content)
+    
+    async def agenerate_sql(self, question: str, schema: Dict, playbook: Playbook, 
+                            relevant_bullets: List[Bullet]) -> str:
+        """Generate SQL query using Azure OpenAI's async client"""
+        prompt = self._build_prompt(question, schema, playbook, relevant_bullets)
+        messages = self._messages(prompt)
+        estimated = self._estimate_tokens(prompt)
+        
+        if self.stream:
+            request = lambda: self._astream_completion(messages, estimated)
+        else:
+            request = lambda: self.llm.ainvoke(messages)
+        
+        start = time.monotonic()
+        try:
+            response = await acall_with_retry(
+                request,
+                limiter=self.rate_limiter, policy=self.retry_policy,
+                controller=self.concurrency, tokens=estimated
+            )
+        except Exception as e:
+            raise LLMRequestError(f"Azure OpenAI request failed: {e}") from e
+        
+        self._record_usage(estimated, response, time.monotonic() - start, len(relevant_bullets))
+        return self._clean_response(response.content)
+    
+    async def agenerate_sql_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                                  playbook: Playbook, relevant_bullets: List[Bullet]) -> List[Optional[str]]:
+        """Generate SQL for several questions in one request (unparseable items come back as None)"""
+        prompt = self._build_batch_prompt(questions, schemas, playbook, relevant_bullets)
+        messages = [
+            SystemMessage(content=self.batch_system_message),
+            HumanMessage(content=prompt)
+        ]
+        estimated = (len(self.batch_system_message) + len(prompt)) // 4 + self.EXPECTED_OUTPUT_TOKENS * len(questions)
+        
+        start = time.monotonic()
+        try:
+            response = await acall_with_retry(
+                lambda: self.llm.ainvoke(messages),
+                limiter=self.rate_limiter, policy=self.retry_policy,
+                controller=self.concurrency, tokens=estimated
+            )
+        except Exception as e:
+            raise LLMRequestError(f"Azure OpenAI batch request failed: {e}") from e
+        
+        self._record_usage(estimated, response, time.monotonic() - start, len(relevant_bullets))
+        return parse_batch_response(response.content, len(questions))
+    
+    async def arelease_loop(self):
+        """Close this event loop's pooled connections"""
+        await self.http_clients.arelease_loop()
+    
+    def _stream_completion(self, messages: List, estimated: int) -> AIMessageChunk:
+        """Stream a completion, closing the stream as soon as the SQL statement is complete"""
+        parser = SQLStreamParser()
+        message = None
+        first_token = None
+        start = time.monotonic()
+        stream = self.llm.stream(messages, stream_usage=True)
+        try:
+            for chunk in stream:
+                message = chunk if message is None else message + chunk
+                if first_token is None and chunk.content:
+                    first_token = time.monotonic() - start
+                if parser.feed(chunk.content):
+                    break
+        finally:
+            stream.close()
+        return self._finish_stream(message, parser, estimated, start, first_token)
+    
+    async def _astream_completion(self, messages: List, estimated: int) -> AIMessageChunk:
+        """Asynchronous _stream_completion"""
+        parser = SQLStreamParser()
+        message = None
+        first_token = None
+        start = time.monotonic()
+        stream = self.llm.astream(messages, stream_usage=True)
+        try:
+            async for chunk in stream:
+                message = chunk if message is None else message + chunk
+                if first_token is None and chunk.content:
+                    first_token = time.monotonic() - start
+                if parser.feed(chunk.content):
+                    break
+        finally:
+            await stream.aclose()
+        return self._finish_stream(message, parser, estimated, start, first_token)
+    
+    def _finish_stream(self, message: Optional[AIMessageChunk], parser: SQLStreamParser,
+                       estimated: int, start: float, first_token: Optional[float]) -> AIMessageChunk:
+        """Message holding the SQL part of a stream, with its timings recorded"""
+        elapsed = time.monotonic() - start
+        message = message if message is not None else AIMessageChunk(content="")
+        if not message.usage_metadata:
+            # Closed before the provider's final usage chunk: fall back to estimates
+            input_tokens = estimated - self.EXPECTED_OUTPUT_TOKENS
+            output_tokens = max(1, len(parser.text) // 4)
+            message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                      "total_tokens": input_tokens + output_tokens}
+        message.content = parser.result()
+        
+        with self._lock:
+            self.stream_stats["streamed_requests"] += 1
+            self.stream_stats["early_stops"] += parser.complete
+            self.stream_stats["time_to_first_token"] += first_token if first_token is not None else elapsed
+            self.stream_stats["time_to_sql"] += elapsed
+        return message
+    
+    def _estimate_tokens(self, prompt: str) -> int:
+        """Rough request cost (about 4 characters per token) for the token budget"""
+        return (len(self.system_message) + len(prompt)) // 4 + self.EXPECTED_OUTPUT_TOKENS
+    
+    def _record_usage(self, estimated: int, response, seconds: float, bullets: int):
+        """Accumulate reported usage (including cached prompt tokens) and settle the token reservation"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        cached = self._cached_tokens(response, usage)
+        with self._lock:
+            self.usage["requests"] += 1
+            self.usage["prompt_tokens"] += usage.get("input_tokens", 0)
+            self.usage["completion_tokens"] += usage.get("output_tokens", 0)
+            self.usage["cached_prompt_tokens"] += cached
+            self.usage["request_seconds"] += seconds
+        if self.usage_meter:
+            self.usage_meter.record("generation", usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+                                    cached, seconds, bullets)
+        
+        if self.rate_limiter:
+            self.rate_limiter.record_usage(estimated, usage.get("total_tokens"))
+    
+    @staticmethod
+    def _cached_tokens(response, usage: Dict) -> int:
+        """Prompt tokens served from the provider's prefix cache"""
+        cached = (usage.get("input_token_details") or {}).get("cache_read")
+        if cached is None:
+            token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+            cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        return cached or 0
+    
+    def usage_stats(self) -> Dict:
+        """
+        Token usage and request wall time (retries included) so far, with the
+        share of prompt tokens served from the prefix cache and, in streaming
+        mode, average time to first token and to a complete SQL statement
+        (early_stops counts streams closed as soon as the statement was complete)
+        """
+        with self._lock:
+            usage = dict(self.usage)
+            stream_stats = dict(self.stream_stats)
+        prompt_tokens = usage["prompt_tokens"]
+        stats = {
+            **usage,
+            "cached_prompt_ratio": usage["cached_prompt_tokens"] / prompt_tokens if prompt_tokens else 0.0,
+        }
+        streamed = stream_stats["streamed_requests"]
+        if streamed:
+            stats.update(
+                streamed_requests=streamed,
+                early_stops=stream_stats["early_stops"],
+                avg_time_to_first_token=stream_stats["time_to_first_token"] / streamed,
+                avg_time_to_sql=stream_stats["time_to_sql"] / streamed,
+            )
+        return stats
+    
+    def _messages(self, prompt: str) -> List:
+        """System and user messages for a prompt"""
+        return [
+            SystemMessage(content=self.system_message),
+            HumanMessage(content=prompt)
+        ]
+    
+    @staticmethod
+    def _clean_response(content: str) -> str:
+        """Extract single-line SQL from a model response"""
+        return clean_response(content)
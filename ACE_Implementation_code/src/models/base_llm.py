@@ -2,10 +2,39 @@
 Base LLM - Abstract base class for LLM providers
 """
 
+import asyncio
+import json
+import re
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from functools import partial
+from typing import Dict, List, Optional, Sequence
 from src.components.playbook import Playbook, Bullet
 
+# Static instructions that open every single-question prompt
+PROMPT_RULES = """You are a SQL query generator. You MUST follow these rules EXACTLY:
+
+CRITICAL RULES - FOLLOW THESE STRICTLY:
+1. Generate SQL queries in SINGLE-LINE format with NO extra newlines or whitespace
+2. Do NOT add column aliases (AS keyword) unless explicitly shown in examples
+3. Match the EXACT format shown in the playbook rules below
+4. Use the EXACT column names and table names from the schema
+5. ONLY output the SQL query - NO explanations, NO markdown, NO extra text
+
+IMPORTANT FORMATTING RULES:
+- Write SQL in a SINGLE line with single spaces between keywords
+- Do NOT use "AS" for column aliases
+- Do NOT add extra newlines or formatting
+- Do NOT add comments
+- Use COUNT(*) instead of COUNT(column_name)
+- Use SELECT * when training data shows it, use specific columns when shown
+- Match training data format EXACTLY"""
+
+_NUMBERED_LINE_RE = re.compile(r"^\s*(?:Q|#)?(\d+)\s*[.):\]-]\s*(.+?)\s*$", re.IGNORECASE)
+
+
+class LLMRequestError(RuntimeError):
+    """A provider request failed after retries; the item should be re-queued, not scored"""
+
 
 class BaseLLM(ABC):
     """Abstract base class for LLM providers"""
@@ -24,43 +53,207 @@ class BaseLLM(ABC):
             
         Returns:
             Generated SQL query string
+            
+        Raises:
+            LLMRequestError: The provider could not answer (after its retries)
         """
         pass
     
+    async def agenerate_sql(self, question: str, schema: Dict, playbook: Playbook, 
+                            relevant_bullets: List[Bullet]) -> str:
+        """
+        Asynchronous generate_sql
+        
+        Providers with a native async client should override this; the default
+        runs generate_sql in the event loop's thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, partial(self.generate_sql, question, schema, playbook, relevant_bullets)
+        )
+    
+    async def agenerate_sql_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                                  playbook: Playbook, relevant_bullets: List[Bullet]) -> List[Optional[str]]:
+        """
+        Generate SQL for several questions sharing one bullet set in a single request
+        
+        Providers that support multi-question prompts override this (see
+        _build_batch_prompt and parse_batch_response). Items the response does
+        not answer parseably come back as None and should be sent individually;
+        the default answers none of them.
+        
+        Returns:
+            SQL or None per question, in order
+        """
+        return [None] * len(questions)
+    
+    def usage_stats(self) -> Dict:
+        """Provider-reported token usage so far (empty if the provider reports none)"""
+        return {}
+    
+    async def arelease_loop(self):
+        """Release connections bound to the running event loop (called before it closes)"""
+    
+    def _playbook_block(self, playbook: Playbook, bullets: List[Bullet]) -> str:
+        """
+        Playbook text for a prompt, identical for identical bullet sets
+        
+        Bullets are ordered by id (creation order) rather than by relevance
+        rank, and feedback counts are left out, so the same bullets always
+        produce the same bytes and the provider can reuse the cached prefix.
+        """
+        if not bullets:
+            return "No playbook rules yet."
+        return playbook.format_for_prompt(sorted(bullets, key=lambda b: b.id), include_feedback=False)
+    
     def _build_prompt(self, question: str, schema: Dict, playbook: Playbook, 
                       bullets: List[Bullet]) -> str:
-        """Build prompt for LLM with strict formatting rules"""
+        """
+        Build prompt for LLM with strict formatting rules
         
-        # Format playbook rules
-        playbook_text = playbook.format_for_prompt(bullets) if bullets else "No playbook rules yet."
+        Content runs from most static to most dynamic (rules, playbook,
+        schema, question) so requests share the longest possible prefix for
+        provider-side prompt caching.
+        """
+        playbook_text = self._playbook_block(playbook, bullets)
         
-        prompt = f"""You are a SQL query generator. You MUST follow these rules EXACTLY:
+        prompt = f"""{PROMPT_RULES}
 
-CRITICAL RULES - FOLLOW THESE STRICTLY:
-1. Generate SQL queries in SINGLE-LINE format with NO extra newlines or whitespace
-2. Do NOT add column aliases (AS keyword) unless explicitly shown in examples
-3. Match the EXACT format shown in the playbook rules below
-4. Use the EXACT column names and table names from the schema
-5. ONLY output the SQL query - NO explanations, NO markdown, NO extra text
-
-Question: {question}
+PLAYBOOK RULES (FOLLOW THESE EXACTLY):
+{playbook_text}
 
 Database Schema:
 Tables: {schema.get('tables', [])}
 Columns: {schema.get('columns', [])}
 
-PLAYBOOK RULES (FOLLOW THESE EXACTLY):
-{playbook_text}
+Question: {question}
+
+Generate ONLY the SQL query following ALL rules above:"""
+        return prompt
+    
+    def _build_batch_prompt(self, questions: Sequence[str], schemas: Sequence[Dict],
+                            playbook: Playbook, bullets: List[Bullet]) -> str:
+        """Build one prompt asking for a JSON array with one SQL query per numbered question"""
+        playbook_text = self._playbook_block(playbook, bullets)
+        
+        # Each distinct schema is listed once and referenced by its label
+        schema_labels = {}
+        schema_lines = []
+        question_lines = []
+        for number, (question, schema) in enumerate(zip(questions, schemas), 1):
+            key = (tuple(schema.get('tables', [])), tuple(schema.get('columns', [])))
+            if key not in schema_labels:
+                schema_labels[key] = f"S{len(schema_labels) + 1}"
+                schema_lines.append(f"{schema_labels[key]}: Tables: {list(key[0])} Columns: {list(key[1])}")
+            question_lines.append(f"{number}. [{schema_labels[key]}] {question}")
+        
+        schema_text = "\n".join(schema_lines)
+        question_text = "\n".join(question_lines)
+        
+        return f"""You are a SQL query generator. You MUST follow these rules EXACTLY:
+
+CRITICAL RULES - FOLLOW THESE STRICTLY:
+1. Generate each SQL query in SINGLE-LINE format with NO extra newlines or whitespace
+2. Do NOT add column aliases (AS keyword) unless explicitly shown in examples
+3. Match the EXACT format shown in the playbook rules below
+4. Use the EXACT column names and table names from the question's schema
+5. Answer EVERY numbered question, in order
 
 IMPORTANT FORMATTING RULES:
 - Write SQL in a SINGLE line with single spaces between keywords
 - Do NOT use "AS" for column aliases
-- Do NOT add extra newlines or formatting
 - Do NOT add comments
 - Use COUNT(*) instead of COUNT(column_name)
 - Use SELECT * when training data shows it, use specific columns when shown
 - Match training data format EXACTLY
 
-Generate ONLY the SQL query following ALL rules above:"""
-        return prompt
+PLAYBOOK RULES (FOLLOW THESE EXACTLY):
+{playbook_text}
+
+Database Schemas:
+{schema_text}
+
+Questions:
+{question_text}
+
+Output ONLY a JSON array with one object per question, e.g. [{{"id": 1, "sql": "SELECT ..."}}] - NO markdown, NO extra text:"""
+
+
+def clean_response(content: str) -> str:
+    """Extract single-line SQL from a single-question model response"""
+    sql_query = content.strip()
+    
+    # Clean up response (remove markdown code blocks if present)
+    if "```sql" in sql_query:
+        sql_query = sql_query.split("```sql")[1].split("```")[0].strip()
+    elif "```" in sql_query:
+        sql_query = sql_query.split("```")[1].split("```")[0].strip()
+    
+    # Remove trailing semicolon if present
+    if sql_query.endswith(';'):
+        sql_query = sql_query[:-1].strip()
+    
+    # Force single-line format (remove extra newlines and spaces)
+    return re.sub(r'\s+', ' ', sql_query)
 
+
+def _clean_sql(sql) -> Optional[str]:
+    """Single-line SQL without a trailing semicolon, or None if it is not a SELECT"""
+    if not isinstance(sql, str):
+        return None
+    sql = re.sub(r'\s+', ' ', sql).strip().strip('`').strip()
+    if sql.endswith(';'):
+        sql = sql[:-1].strip()
+    return sql if sql[:6].upper() == "SELECT" else None
+
+
+def parse_batch_response(text: str, count: int) -> List[Optional[str]]:
+    """
+    Parse a multi-question response into one SQL query per question
+    
+    Accepts a JSON array (of {"id", "sql"} objects or of strings, optionally
+    wrapped in a markdown fence or surrounded by text) and falls back to
+    numbered lines ("1. SELECT ..."). Items that are missing, duplicated,
+    out of range or not a SELECT are None.
+    
+    Args:
+        text: Raw model response
+        count: Number of questions in the prompt
+        
+    Returns:
+        SQL or None per question, in order
+    """
+    results: List[Optional[str]] = [None] * count
+    seen = set()
+    
+    def assign(number, sql):
+        if isinstance(number, int) and 1 <= number <= count and number not in seen:
+            seen.add(number)
+            results[number - 1] = _clean_sql(sql)
+    
+    start, end = text.find("["), text.rfind("]")
+    items = None
+    if start != -1 and end > start:
+        try:
+            items = json.loads(text[start:end + 1])
+        except ValueError:
+            items = None
+    
+    if isinstance(items, list):
+        for position, item in enumerate(items, 1):
+            if isinstance(item, dict):
+                number = item.get("id", position)
+                try:
+                    number = int(number)
+                except (TypeError, ValueError):
+                    continue
+                assign(number, item.get("sql"))
+            else:
+                assign(position, item)
+        return results
+    
+    for line in text.splitlines():
+        match = _NUMBERED_LINE_RE.match(line)
+        if match:
+            assign(int(match.group(1)), match.group(2))
+    return results
@@ -0,0 +1,267 @@
+"""
+Batch Jobs - Offline batch-job provider mode for bulk evaluation
+
+Providers answer JSONL job files at a lower price and higher throughput than
+interactive requests, within a completion window instead of seconds.
+BatchJobLLM writes all prompts of an evaluation to one job file (OpenAI /
+Azure OpenAI batch format), submits it, polls, and streams the results back
+as they become readable. Interactive calls (training) go to the wrapped LLM.
+
+Every job lives in work_dir/<hash of its requests>/ with the request file,
+the job id and the results downloaded so far. Running the same evaluation
+again - for instance after a crash or restart - resumes the submitted job
+instead of paying for a new one, and results already on disk are not
+downloaded again. A job that ended failed, expired or cancelled before all
+results arrived is not resumed: the requests still missing are submitted
+as a new job (right away when resuming it, otherwise on the next run).
+
+Job runners:
+- AzureBatchClient: Azure OpenAI batch API (needs a batch deployment)
+- LocalBatchRunner (src.models.local_server): offline stand-in
+"""
+
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from src.components.playbook import Playbook, Bullet
+from src.models.base_llm import BaseLLM, clean_response
+from src.models.usage_meter import UsageMeter
+
+# Job states after which no further results arrive
+TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchJobClient(ABC):
+    """Submits JSONL job files and reads back their result lines"""
+
+    @abstractmethod
+    def submit(self, input_path: Path) -> str:
+        """Submit a job file; returns the job id"""
+
+    @abstractmethod
+    def poll(self, job_id: str) -> Dict:
+        """{"status": ..., "completed": requests done, "total": requests} for a job"""
+
+    @abstractmethod
+    def iter_results(self, job_id: str, skip: int = 0) -> Iterator[str]:
+        """Result lines readable so far, after the first `skip`"""
+
+
+class AzureBatchClient(BatchJobClient):
+    """Azure OpenAI batch API (files + batches endpoints of the openai SDK)"""
+
+    def __init__(self, api_key: str, endpoint: str, api_version: str, completion_window: str = "24h"):
+        """
+        Args:
+            api_key: Azure OpenAI API key
+            endpoint: Azure OpenAI endpoint URL
+            api_version: API version with batch support
+            completion_window: Time the provider has to finish a job
+        """
+        from openai import AzureOpenAI  # only needed in batch-job mode
+
+        self.client = AzureOpenAI(api_key=api_key, azure_endpoint=endpoint, api_version=api_version)
+        self.completion_window = completion_window
+        self._output_files: Dict[str, List[str]] = {}
+
+    def submit(self, input_path: Path) -> str:
+        with open(input_path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id, endpoint="/chat/completions", completion_window=self.completion_window
+        )
+        return batch.id
+
+    def poll(self, job_id: str) -> Dict:
+        batch = self.client.batches.retrieve(job_id)
+        counts = batch.request_counts
+        if batch.status in TERMINAL_STATES:
+            self._output_files[job_id] = [file_id for file_id in (batch.output_file_id, batch.error_file_id)
+                                          if file_id]
+        return {
+            "status": batch.status,
+            "completed": (counts.completed + counts.failed) if counts else 0,
+            "total": counts.total if counts else 0,
+        }
+
+    def iter_results(self, job_id: str, skip: int = 0) -> Iterator[str]:
+        # The provider publishes output (and per-request errors) only once the job has ended
+        lines = []
+        for file_id in self._output_files.get(job_id, []):
+            lines.extend(line for line in self.client.files.content(file_id).text.splitlines() if line.strip())
+        yield from lines[skip:]
+
+
+class BatchJobLLM(BaseLLM):
+    """BaseLLM that answers whole evaluations with offline batch jobs"""
+
+    def __init__(self, llm: BaseLLM, client: BatchJobClient, work_dir: Union[str, Path],
+                 deployment_name: str, poll_interval: float = 30.0, min_batch_size: int = 20,
+                 max_tokens: int = 500, usage_meter: Optional[UsageMeter] = None):
+        """
+        Args:
+            llm: Interactive LLM for single requests and questions a job did not answer
+            client: Job runner
+            work_dir: Directory holding job files, job ids and downloaded results
+            deployment_name: Model / deployment named in each request line
+            poll_interval: Seconds between status polls
+            min_batch_size: Smaller batches are answered interactively
+            max_tokens: Completion limit per request
+            usage_meter: Receives the tokens of every job request ("batch_generation";
+                wall time is per job, not per request, and is not recorded)
+        """
+        self.llm = llm
+        self.client = client
+        self.work_dir = Path(work_dir)
+        self.deployment_name = deployment_name
+        self.poll_interval = poll_interval
+        self.min_batch_size = min_batch_size
+        self.max_tokens = max_tokens
+        self.usage_meter = usage_meter
+        self.model_name = getattr(llm, "model_name", type(llm).__name__)
+        self.system_message = getattr(llm, "system_message", "")
+        self.stats = {"jobs_submitted": 0, "jobs_resumed": 0, "results_streamed": 0, "results_from_disk": 0,
+                      "failed_requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def generate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                     relevant_bullets: List[Bullet]) -> str:
+        return self.llm.generate_sql(question, schema, playbook, relevant_bullets)
+
+    async def agenerate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                            relevant_bullets: List[Bullet]) -> str:
+        return await self.llm.agenerate_sql(question, schema, playbook, relevant_bullets)
+
+    async def agenerate_sql_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                                  playbook: Playbook, relevant_bullets: List[Bullet]) -> List[Optional[str]]:
+        return await self.llm.agenerate_sql_batch(questions, schemas, playbook, relevant_bullets)
+
+    async def arelease_loop(self):
+        await self.llm.arelease_loop()
+
+    def run_job(self, questions: Sequence[str], schemas: Sequence[Dict], playbook: Playbook,
+                bullets: Sequence[List[Bullet]]) -> Iterator[Tuple[int, Optional[str]]]:
+        """
+        Answer questions with one batch job, resuming an earlier identical job if there is one
+
+        Yields:
+            (question index, SQL or None if that request failed) as results arrive,
+            results saved by an earlier run first
+        """
+        lines = [
+            json.dumps(self._request_line(index, self._build_prompt(question, schema, playbook, item_bullets)),
+                       sort_keys=True)
+            for index, (question, schema, item_bullets) in enumerate(zip(questions, schemas, bullets))
+        ]
+        bullet_counts = [len(item_bullets) for item_bullets in bullets]
+        job_dir = self.work_dir / hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()[:16]
+        job_dir.mkdir(parents=True, exist_ok=True)
+        state_path = job_dir / "state.json"
+        results_path = job_dir / "results.jsonl"
+        state = json.loads(state_path.read_text()) if state_path.exists() else {}
+
+        saved = results_path.read_text() if results_path.exists() else ""
+        # A line cut off by a crash is downloaded again
+        saved = saved[:saved.rfind("\n") + 1]
+        results_path.write_text(saved)
+        downloaded = 0
+        answered = set()
+        for line in saved.splitlines():
+            downloaded += 1
+            self.stats["results_from_disk"] += 1
+            index, sql = self._parse_result(line, count_usage=False)
+            answered.add(index)
+            yield index, sql
+        if len(answered) >= len(lines):
+            return
+
+        submitted = False
+        while True:
+            if state.get("job_id"):
+                self.stats["jobs_resumed"] += 1
+                print(f"  ↻ Resuming batch job {state['job_id']} ({len(answered)}/{len(lines)} results on disk)")
+            else:
+                # Only requests without a result line; custom ids keep their original index
+                missing = [line for index, line in enumerate(lines) if index not in answered]
+                input_path = job_dir / "input.jsonl"
+                input_path.write_text("\n".join(missing) + "\n")
+                state = {**state, "job_id": self.client.submit(input_path), "total": len(missing),
+                         "offset": downloaded, "submitted_at": time.time()}
+                state_path.write_text(json.dumps(state))
+                submitted = True
+                self.stats["jobs_submitted"] += 1
+                print(f"  ✓ Submitted batch job {state['job_id']} ({len(missing)} requests)")
+
+            with open(results_path, "a") as results_file:
+                while True:
+                    # Status first, so a terminal status means every result is readable below
+                    status = self.client.poll(state["job_id"])
+                    skip = downloaded - state.get("offset", 0)
+                    for line in self.client.iter_results(state["job_id"], skip=skip):
+                        results_file.write(line + "\n")
+                        results_file.flush()
+                        downloaded += 1
+                        self.stats["results_streamed"] += 1
+                        index, sql = self._parse_result(line, bullet_counts=bullet_counts)
+                        answered.add(index)
+                        yield index, sql
+                    if len(answered) >= len(lines) or status["status"] in TERMINAL_STATES:
+                        break
+                    print(f"  … Batch job {state['job_id']}: {status['status']}, "
+                          f"{len(answered)}/{len(lines)} results")
+                    time.sleep(self.poll_interval)
+
+            if len(answered) >= len(lines) or status["status"] == "completed":
+                return
+            # The job ended without all results: forget it, so the missing requests are resubmitted
+            print(f"  ⚠️  Batch job {state['job_id']} ended {status['status']} with "
+                  f"{len(answered)}/{len(lines)} results")
+            state = {key: value for key, value in state.items() if key != "job_id"}
+            state_path.write_text(json.dumps(state))
+            if submitted:
+                # Submitted by this run: the caller answers the rest interactively; a later run resubmits
+                return
+
+    def _request_line(self, index: int, prompt: str) -> Dict:
+        return {
+            "custom_id": f"q-{index}",
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": {
+                "model": self.deployment_name,
+                "messages": [
+                    {"role": "system", "content": self.system_message},
+                    {"role": "user", "content": prompt},
+                ],
+                "temperature": 0.0,
+                "top_p": 0.1,
+                "max_tokens": self.max_tokens,
+            },
+        }
+
+    def _parse_result(self, line: str, count_usage: bool = True,
+                      bullet_counts: Sequence[int] = ()) -> Tuple[int, Optional[str]]:
+        """(question index, SQL) from one result line; SQL is None for failed requests"""
+        record = json.loads(line)
+        index = int(record["custom_id"].split("-", 1)[1])
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        if record.get("error") or response.get("status_code") != 200 or not body.get("choices"):
+            self.stats["failed_requests"] += 1
+            return index, None
+        if count_usage:
+            usage = body.get("usage") or {}
+            self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self.stats["completion_tokens"] += usage.get("completion_tokens", 0)
+            if self.usage_meter:
+                cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+                self.usage_meter.record("batch_generation", usage.get("prompt_tokens", 0),
+                                        usage.get("completion_tokens", 0), cached,
+                                        bullets=bullet_counts[index] if index < len(bullet_counts) else None)
+        return index, clean_response(body["choices"][0]["message"]["content"] or "")
+
+    def usage_stats(self) -> Dict:
+        """Usage of the interactive LLM, with batch-job usage under "batch_jobs" """
+        return {**self.llm.usage_stats(), "batch_jobs": dict(self.stats)}
@@ -0,0 +1,234 @@
+"""
+Cached LLM - Persistent response cache around any BaseLLM
+
+Generation runs at temperature 0, so a prompt sent before can be answered from
+disk. Responses are keyed by a hash of model, system message and prompt and
+stored in a local SQLite file with LRU eviction, an optional TTL and hit/miss
+statistics, so reruns of an unchanged experiment make no API calls.
+Only answers are stored: a failed request raises LLMRequestError and is
+never cached, and neither is an empty response.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+from src.models.base_llm import BaseLLM
+from src.components.playbook import Playbook, Bullet
+
+
+class ResponseCache:
+    """Size-bounded LRU key/value store in a SQLite file"""
+
+    def __init__(self, path: Union[str, Path], max_entries: int = 100000,
+                 ttl_seconds: Optional[float] = None):
+        """
+        Open (or create) a response cache
+
+        Args:
+            path: SQLite file (":memory:" for a process-local cache)
+            max_entries: Entries kept before least-recently-used ones are evicted
+            ttl_seconds: Age after which an entry is ignored (None = never expires)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Shared by the event loop's worker threads; all access goes through the lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._size = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Stable hash of the parts that determine a response"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str, count: bool = True) -> Optional[str]:
+        """
+        Cached response for a key, or None (expired entries count as misses)
+
+        Args:
+            key: Key from make_key
+            count: Add the lookup to the hit/miss statistics (callers that
+                resolve several lookups into one outcome pass False and
+                report it with record_lookups)
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= 1
+                row = None
+            if row is None:
+                if count:
+                    self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            if count:
+                self.hits += 1
+            return row[0]
+
+    def record_lookups(self, hits: int = 0, misses: int = 0):
+        """Add lookups resolved outside get() to the statistics"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def put(self, key: str, response: str):
+        """Store a response, evicting the least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            if cursor.rowcount == 0:
+                self._connection.execute(
+                    "UPDATE responses SET response = ?, created = ?, last_used = ? WHERE key = ?",
+                    (response, now, now, key),
+                )
+                return
+
+            self._size += 1
+            excess = self._size - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self._size -= excess
+                self.evictions += excess
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._size = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss statistics and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": self._size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CachedLLM(BaseLLM):
+    """BaseLLM wrapper that answers repeated prompts from a ResponseCache"""
+
+    def __init__(self, llm: BaseLLM, cache: ResponseCache):
+        """
+        Wrap an LLM
+
+        Args:
+            llm: LLM that answers cache misses
+            cache: Response store
+        """
+        self.llm = llm
+        self.cache = cache
+        self.model_name = getattr(llm, "model_name", type(llm).__name__)
+        self.system_message = getattr(llm, "system_message", "")
+        self.batch_system_message = getattr(llm, "batch_system_message", self.system_message)
+
+    def generate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                     relevant_bullets: List[Bullet]) -> str:
+        """Generate SQL, reusing the cached response for an identical prompt"""
+        key = self._key(question, schema, playbook, relevant_bullets)
+        sql = self.cache.get(key)
+        if sql is None:
+            sql = self.llm.generate_sql(question, schema, playbook, relevant_bullets)
+            if sql:
+                self.cache.put(key, sql)
+        return sql
+
+    async def agenerate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                            relevant_bullets: List[Bullet]) -> str:
+        """Asynchronous generate_sql with the same cache"""
+        key = self._key(question, schema, playbook, relevant_bullets)
+        sql = self.cache.get(key)
+        if sql is None:
+            sql = await self.llm.agenerate_sql(question, schema, playbook, relevant_bullets)
+            if sql:
+                self.cache.put(key, sql)
+        return sql
+
+    async def agenerate_sql_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                                  playbook: Playbook, relevant_bullets: List[Bullet]) -> List[Optional[str]]:
+        """
+        Answer cached questions from disk and pack only the misses into one request
+
+        Packed answers are stored together under the hash of the packed
+        prompt, not under the single-question keys: they answer a different
+        prompt, so generate_sql must not serve them. Each question counts as
+        one cache lookup: a hit if its own entry or the packed entry answers
+        it, a miss if the wrapped LLM does. Questions returned as None are
+        left uncounted, since the caller's generate_sql fallback looks them up.
+        """
+        keys = [self._key(question, schema, playbook, relevant_bullets)
+                for question, schema in zip(questions, schemas)]
+        results = [self.cache.get(key, count=False) for key in keys]
+        misses = [i for i, sql in enumerate(results) if sql is None]
+        hits = len(results) - len(misses)
+        fetched = 0
+        if len(misses) > 1:
+            miss_questions = [questions[i] for i in misses]
+            miss_schemas = [schemas[i] for i in misses]
+            packed_prompt = self.llm._build_batch_prompt(miss_questions, miss_schemas, playbook, relevant_bullets)
+            batch_key = ResponseCache.make_key("batch", self.model_name, self.batch_system_message, packed_prompt)
+            cached = self.cache.get(batch_key, count=False)
+            if cached is not None:
+                answers = json.loads(cached)
+                hits += sum(1 for sql in answers if sql)
+            else:
+                answers = await self.llm.agenerate_sql_batch(miss_questions, miss_schemas, playbook,
+                                                             relevant_bullets)
+                answers = [sql or None for sql in answers]
+                fetched = sum(1 for sql in answers if sql)
+                if fetched:
+                    self.cache.put(batch_key, json.dumps(answers))
+            for i, sql in zip(misses, answers):
+                results[i] = sql
+        self.cache.record_lookups(hits=hits, misses=fetched)
+        return results
+
+    def usage_stats(self) -> Dict:
+        """Usage of the wrapped LLM (cache hits cost nothing)"""
+        return self.llm.usage_stats()
+
+    async def arelease_loop(self):
+        await self.llm.arelease_loop()
+
+    def _key(self, question: str, schema: Dict, playbook: Playbook,
+             relevant_bullets: List[Bullet]) -> str:
+        prompt = self.llm._build_prompt(question, schema, playbook, relevant_bullets)
+        return ResponseCache.make_key(self.model_name, self.system_message, prompt)
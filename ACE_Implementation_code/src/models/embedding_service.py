@@ -2,16 +2,42 @@
 Embedding Service - Generate embeddings using Azure OpenAI
 """
 
-from typing import List, Optional
+import threading
+import time
+from typing import Dict, List, Optional
 import numpy as np
+from src.models.http_pool import HTTPClientFactory, shared_client_factory
+from src.models.rate_limiter import RateLimiter, RetryPolicy, call_with_retry
+from src.models.usage_meter import UsageMeter
+
+
+def _cosine_similarity(embedding1: List[float], embedding2: List[float]) -> float:
+    """Cosine similarity of two vectors (0.0 for a zero vector or mismatched lengths)"""
+    try:
+        emb1 = np.asarray(embedding1, dtype=float)
+        emb2 = np.asarray(embedding2, dtype=float)
+        norms = np.linalg.norm(emb1) * np.linalg.norm(emb2)
+        if norms == 0:
+            return 0.0
+        return float(np.dot(emb1, emb2) / norms)
+    except Exception as e:
+        print(f"⚠ Error calculating similarity: {e}")
+        return 0.0
 
 
 class EmbeddingService:
     """Service for generating text embeddings"""
     
+    # Azure OpenAI accepts at most 2048 inputs per embeddings request
+    MAX_INPUTS_PER_REQUEST = 2048
+    
     def __init__(self, api_key: str, endpoint: str, deployment_name: str, 
                  model_name: str = "text-embedding-ada-002",
-                 api_version: str = "2025-01-01-preview"):
+                 api_version: str = "2025-01-01-preview",
+                 rate_limiter: Optional[RateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 http_clients: Optional[HTTPClientFactory] = None,
+                 usage_meter: Optional[UsageMeter] = None):
         """
         Initialize the embedding service
         
@@ -21,12 +47,23 @@ class EmbeddingService:
             deployment_name: Embedding model deployment name
             model_name: Embedding model name
             api_version: API version
+            rate_limiter: Requests/tokens per minute budget, shared with the LLM (optional)
+            retry_policy: Backoff for 429/5xx and connection errors
+            http_clients: Pooled HTTP clients, shared with the LLM (default: process-wide factory)
+            usage_meter: Receives tokens and wall time of every request (optional)
         """
         self.api_key = api_key
         self.endpoint = endpoint
         self.deployment_name = deployment_name
         self.model_name = model_name
         self.api_version = api_version
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy()
+        self.http_clients = http_clients if http_clients else shared_client_factory()
+        self.usage_meter = usage_meter
+        self.usage = {"requests": 0, "texts": 0, "prompt_tokens": 0, "request_seconds": 0.0}
+        # Retrieval embeds on executor threads
+        self._lock = threading.Lock()
         self.client = None
         
         # Initialize client
@@ -40,7 +77,9 @@ class EmbeddingService:
             self.client = AzureOpenAI(
                 api_key=self.api_key,
                 azure_endpoint=self.endpoint,
-                api_version=self.api_version
+                api_version=self.api_version,
+                max_retries=0,  # Retries are handled by retry_policy
+                http_client=self.http_clients.client(self.endpoint)
             )
             
         except ImportError:
@@ -69,10 +108,7 @@ class EmbeddingService:
             text = text.strip().replace("\n", " ")
             
             # Generate embedding
-            response = self.client.embeddings.create(
-                input=text,
-                model=self.deployment_name
-            )
+            response = self._create_embeddings(text, len(text) // 4 + 1)
             
             # Extract embedding vector
             embedding = response.data[0].embedding
@@ -86,18 +122,60 @@ class EmbeddingService:
         """
         Generate embeddings for multiple texts
         
+        Non-empty texts are sent together, in as few requests as the API's
+        per-request input limit allows.
+        
         Args:
             texts: List of texts to embed
             
         Returns:
-            List of embedding vectors
+            List of embedding vectors (None for empty or failed texts)
         """
-        embeddings = []
-        for text in texts:
-            embedding = self.embed_text(text)
-            embeddings.append(embedding)
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        indexed = [
+            (i, text.strip().replace("\n", " "))
+            for i, text in enumerate(texts)
+            if text and text.strip()
+        ]
+        
+        for start in range(0, len(indexed), self.MAX_INPUTS_PER_REQUEST):
+            chunk = indexed[start:start + self.MAX_INPUTS_PER_REQUEST]
+            try:
+                response = self._create_embeddings(
+                    [text for _, text in chunk],
+                    sum(len(text) // 4 + 1 for _, text in chunk)
+                )
+                for item in response.data:
+                    embeddings[chunk[item.index][0]] = item.embedding
+            except Exception as e:
+                print(f"⚠ Error generating embeddings for {len(chunk)} texts: {e}")
+        
         return embeddings
     
+    def _create_embeddings(self, texts, estimated_tokens: int):
+        """One embeddings request under the shared rate limit, with retries"""
+        start = time.monotonic()
+        response = call_with_retry(
+            lambda: self.client.embeddings.create(input=texts, model=self.deployment_name),
+            limiter=self.rate_limiter, policy=self.retry_policy, tokens=estimated_tokens
+        )
+        seconds = time.monotonic() - start
+        usage = getattr(response, "usage", None)
+        tokens = getattr(usage, "prompt_tokens", None) or 0
+        with self._lock:
+            self.usage["requests"] += 1
+            self.usage["texts"] += 1 if isinstance(texts, str) else len(texts)
+            self.usage["prompt_tokens"] += tokens
+            self.usage["request_seconds"] += seconds
+        if self.usage_meter:
+            self.usage_meter.record("embedding", tokens, seconds=seconds)
+        return response
+    
+    def usage_stats(self) -> Dict:
+        """Embedding requests, texts embedded, tokens and request wall time (retries included) so far"""
+        with self._lock:
+            return dict(self.usage)
+    
     @staticmethod
     def cosine_similarity(embedding1: List[float], embedding2: List[float]) -> float:
         """
@@ -110,20 +188,7 @@ class EmbeddingService:
         Returns:
             Cosine similarity score (0 to 1)
         """
-        try:
-            from sklearn.metrics.pairwise import cosine_similarity
-            
-            # Convert to numpy arrays
-            emb1 = np.array(embedding1).reshape(1, -1)
-            emb2 = np.array(embedding2).reshape(1, -1)
-            
-            # Calculate cosine similarity
-            similarity = cosine_similarity(emb1, emb2)[0][0]
-            return float(similarity)
-            
-        except Exception as e:
-            print(f"⚠ Error calculating similarity: {e}")
-            return 0.0
+        return _cosine_similarity(embedding1, embedding2)
 
 
 class MockEmbeddingService:
@@ -157,16 +222,12 @@ class MockEmbeddingService:
         """Generate mock embeddings for multiple texts"""
         return [self.embed_text(text) for text in texts]
     
+    def usage_stats(self) -> Dict:
+        """No provider usage"""
+        return {}
+    
     @staticmethod
     def cosine_similarity(embedding1: List[float], embedding2: List[float]) -> float:
         """Calculate cosine similarity"""
-        try:
-            from sklearn.metrics.pairwise import cosine_similarity
-            emb1 = np.array(embedding1).reshape(1, -1)
-            emb2 = np.array(embedding2).reshape(1, -1)
-            similarity = cosine_similarity(emb1, emb2)[0][0]
-            return float(similarity)
-        except Exception as e:
-            print(f"⚠ Error calculating similarity: {e}")
-            return 0.0
+        return _cosine_similarity(embedding1, embedding2)
 
@@ -0,0 +1,211 @@
+"""
+Hedged LLM - Duplicate slow requests to cut tail latency
+
+HedgedLLM wraps a BaseLLM. When a request has not finished by a deadline,
+the p-th percentile of recent primary-attempt latencies, a duplicate is sent
+and the first successful reply wins. A losing async hedge is cancelled; a
+losing primary, like any blocking loser, runs to completion in the
+background and its answer is ignored.
+Wrapping a RoutedLLM sends the duplicate to the best backend at that
+moment, usually another one, since the busy backend scores worse.
+
+The deadline is computed from primary attempts only: winner latencies
+would shrink as hedging cuts the tail, pulling the deadline down and
+causing ever more hedges. A primary cut short (by the event loop closing)
+counts with its time until then, which is past the deadline, so it still
+ranks as slow.
+hedge_stats reports primary ("before") and winner ("after") percentiles.
+
+Hedges are capped at max_hedge_ratio of requests to bound the extra cost,
+and no request is hedged until min_samples latencies have been observed.
+Multi-question prompts are passed through unhedged.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Dict, List, Optional, Sequence
+from src.components.playbook import Playbook, Bullet
+from src.models.base_llm import BaseLLM
+
+
+def latency_percentiles(samples: Sequence[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 of latency samples, in seconds (None when there are none)"""
+    ordered = sorted(samples)
+    return {f"p{q}": _percentile(ordered, q) for q in (50, 95, 99)}
+
+
+def _percentile(ordered: Sequence[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class HedgedLLM(BaseLLM):
+    """BaseLLM wrapper that hedges requests slower than a latency percentile"""
+
+    def __init__(self, llm: BaseLLM, percentile: float = 95.0, max_hedge_ratio: float = 0.05,
+                 min_samples: int = 20, window: int = 1000, max_workers: int = 16):
+        """
+        Args:
+            llm: LLM whose requests are hedged (e.g. AzureOpenAILLM or RoutedLLM)
+            percentile: Latency percentile after which a duplicate is sent
+            max_hedge_ratio: Most hedges as a share of requests
+            min_samples: Latencies observed before hedging starts
+            window: Recent primary-attempt latencies the percentile is computed over
+            max_workers: Threads running blocking requests (generate_sql)
+        """
+        self.llm = llm
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.model_name = getattr(llm, "model_name", type(llm).__name__)
+        self.system_message = getattr(llm, "system_message", "")
+        self.batch_system_message = getattr(llm, "batch_system_message", self.system_message)
+        self.counts = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+        self._primary_latencies = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._background = set()
+
+    def generate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                     relevant_bullets: List[Bullet]) -> str:
+        """Generate SQL, sending a duplicate if the request outlives the deadline"""
+        request = lambda: self.llm.generate_sql(question, schema, playbook, relevant_bullets)
+        start = time.monotonic()
+        deadline = self._deadline()
+        if deadline is None:
+            sql = request()
+            self._record_primary(time.monotonic() - start)
+        else:
+            primary = self._executor.submit(request)
+            primary.add_done_callback(lambda _: self._record_primary(time.monotonic() - start))
+            try:
+                sql = primary.result(timeout=deadline)
+            except FutureTimeout:
+                sql = primary.result() if not self._take_hedge() else \
+                    self._first_result(primary, self._executor.submit(request))
+        self._record(time.monotonic() - start)
+        return sql
+
+    async def agenerate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                            relevant_bullets: List[Bullet]) -> str:
+        """Asynchronous generate_sql; the losing request is cancelled"""
+        request = lambda: self.llm.agenerate_sql(question, schema, playbook, relevant_bullets)
+        start = time.monotonic()
+        deadline = self._deadline()
+        if deadline is None:
+            sql = await request()
+            self._record_primary(time.monotonic() - start)
+        else:
+            primary = asyncio.ensure_future(request())
+            primary.add_done_callback(lambda _: self._record_primary(time.monotonic() - start))
+            hedge = None
+            try:
+                done, _ = await asyncio.wait({primary}, timeout=deadline)
+                if done or not self._take_hedge():
+                    sql = await primary
+                else:
+                    hedge = asyncio.ensure_future(request())
+                    sql = await self._afirst_result(primary, hedge)
+            finally:
+                if hedge is not None and not hedge.done():
+                    hedge.cancel()
+                if not primary.done():
+                    if hedge is not None and hedge.done() and not hedge.cancelled() and hedge.exception() is None:
+                        # The hedge won: the primary finishes in the background so its latency is known
+                        self._background.add(primary)
+                        primary.add_done_callback(self._background_done)
+                    else:
+                        primary.cancel()
+        self._record(time.monotonic() - start)
+        return sql
+
+    async def agenerate_sql_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                                  playbook: Playbook, relevant_bullets: List[Bullet]) -> List[Optional[str]]:
+        return await self.llm.agenerate_sql_batch(questions, schemas, playbook, relevant_bullets)
+
+    async def arelease_loop(self):
+        await self.llm.arelease_loop()
+
+    def _first_result(self, primary, hedge) -> str:
+        """Result of the first of two futures to succeed (the primary's error if both fail)"""
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._won(future is hedge)
+                    return future.result()
+        return primary.result()
+
+    async def _afirst_result(self, primary: asyncio.Future, hedge: asyncio.Future) -> str:
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    self._won(task is hedge)
+                    return task.result()
+        return primary.result()
+
+    def _background_done(self, task: asyncio.Future):
+        self._background.discard(task)
+        if not task.cancelled():
+            task.exception()  # a losing primary's error is not raised
+
+    def _deadline(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while too few latencies are known"""
+        with self._lock:
+            if len(self._primary_latencies) < self.min_samples:
+                return None
+            return _percentile(sorted(self._primary_latencies), self.percentile)
+
+    def _take_hedge(self) -> bool:
+        """Whether a hedge fits under max_hedge_ratio (counted if so)"""
+        with self._lock:
+            if self.counts["hedged"] + 1 > self.max_hedge_ratio * (self.counts["requests"] + 1):
+                return False
+            self.counts["hedged"] += 1
+            return True
+
+    def _won(self, by_hedge: bool):
+        if by_hedge:
+            with self._lock:
+                self.counts["hedge_wins"] += 1
+
+    def _record_primary(self, latency: float):
+        with self._lock:
+            self._primary_latencies.append(latency)
+
+    def _record(self, latency: float):
+        """Latency the caller saw (the winner's, when hedged)"""
+        with self._lock:
+            self.counts["requests"] += 1
+            self._latencies.append(latency)
+
+    def hedge_stats(self) -> Dict:
+        """
+        Hedges sent and won, the current deadline and recent latency percentiles
+
+        "primary" holds the p50/p95/p99 of first attempts (latency without
+        hedging), "winner" those of what callers saw.
+        """
+        with self._lock:
+            requests = self.counts["requests"]
+            primary = list(self._primary_latencies)
+            latencies = list(self._latencies)
+        return {
+            **self.counts,
+            "hedge_ratio": self.counts["hedged"] / requests if requests else 0.0,
+            "deadline": self._deadline(),
+            "primary": latency_percentiles(primary),
+            "winner": latency_percentiles(latencies),
+        }
+
+    def usage_stats(self) -> Dict:
+        """Usage of the wrapped LLM (hedges included), with hedging metrics under "hedging" """
+        return {**self.llm.usage_stats(), "hedging": self.hedge_stats()}
@@ -0,0 +1,155 @@
+"""
+HTTP Pool - Shared pooled HTTP clients for the LLM and embedding services
+
+One HTTPClientFactory hands out a single keep-alive connection pool per
+endpoint, so the chat client (LangChain) and the embeddings client (openai
+SDK) reuse the same warm connections instead of each paying for TCP and TLS
+handshakes. HTTP/2 is used when the optional `h2` package is installed.
+
+Async connections belong to the event loop that opened them, and
+Generator.generate_batch runs a fresh loop per batch. The async client
+therefore routes each request to a pool owned by the running loop; pools of
+closed loops are dropped.
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class _LoopLocalTransport(httpx.AsyncBaseTransport):
+    """Async transport that keeps one connection pool per event loop"""
+
+    def __init__(self, limits: httpx.Limits, http2: bool):
+        self.limits = limits
+        self.http2 = http2
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _pool(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                for stale in [other for other in self._pools if other.is_closed()]:
+                    del self._pools[stale]
+                pool = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2, retries=0)
+                self._pools[loop] = pool
+            return pool
+
+    @property
+    def event_loops(self) -> int:
+        return len(self._pools)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool().handle_async_request(request)
+
+    async def aclose(self):
+        """Close the running loop's pool"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.pop(loop, None)
+        if pool is not None:
+            await pool.aclose()
+
+
+class HTTPClientFactory:
+    """Process-wide pooled httpx clients, one per endpoint"""
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, write_timeout: float = 30.0,
+                 pool_timeout: float = 10.0, http2: bool = True):
+        """
+        Args:
+            max_connections: Open connections per endpoint (and per event loop for async)
+            max_keepalive_connections: Idle connections kept open for reuse
+            keepalive_expiry: Seconds an idle connection is kept
+            connect_timeout: Seconds to establish a connection
+            read_timeout: Seconds to wait for response data
+            write_timeout: Seconds to send request data
+            pool_timeout: Seconds to wait for a free connection from the pool
+            http2: Negotiate HTTP/2 when `h2` is installed
+        """
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout,
+                                     write=write_timeout, pool=pool_timeout)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._clients: Dict[str, httpx.Client] = {}
+        self._async_clients: Dict[str, httpx.AsyncClient] = {}
+        self._loop_transports: Dict[str, _LoopLocalTransport] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(endpoint: str) -> str:
+        parts = urlsplit(endpoint)
+        return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+    def client(self, endpoint: str) -> httpx.Client:
+        """Pooled synchronous client for an endpoint (thread-safe, shared)"""
+        key = self._key(endpoint)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                transport = httpx.HTTPTransport(limits=self.limits, http2=self.http2, retries=0)
+                client = httpx.Client(transport=transport, timeout=self.timeout)
+                self._clients[key] = client
+            return client
+
+    def async_client(self, endpoint: str) -> httpx.AsyncClient:
+        """Pooled asynchronous client for an endpoint; connections are kept per event loop"""
+        key = self._key(endpoint)
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is None:
+                transport = _LoopLocalTransport(self.limits, self.http2)
+                client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+                self._async_clients[key] = client
+                self._loop_transports[key] = transport
+            return client
+
+    async def arelease_loop(self):
+        """Close the running event loop's async connections (call before the loop ends)"""
+        for transport in list(self._loop_transports.values()):
+            await transport.aclose()
+
+    def stats(self) -> Dict:
+        """Endpoints with a pool, event loops holding async pools, and whether HTTP/2 is on"""
+        return {
+            "endpoints": len(self._clients.keys() | self._async_clients.keys()),
+            "event_loops": max((transport.event_loops for transport in self._loop_transports.values()),
+                               default=0),
+            "http2": self.http2,
+        }
+
+    def close(self):
+        """Close the synchronous clients"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+_shared_factory: Optional[HTTPClientFactory] = None
+_shared_lock = threading.Lock()
+
+
+def shared_client_factory() -> HTTPClientFactory:
+    """Default factory used by services constructed without one"""
+    global _shared_factory
+    with _shared_lock:
+        if _shared_factory is None:
+            _shared_factory = HTTPClientFactory()
+        return _shared_factory
@@ -0,0 +1,579 @@
+"""
+Local Server - Offline stand-in for the Azure OpenAI / OpenAI HTTP API
+
+Speaks the chat-completions and embeddings wire formats used by
+AzureOpenAILLM (via LangChain) and EmbeddingService (via the openai SDK), so
+the real clients, with their rate limiting, retries, caching and concurrency,
+can be load-tested end to end without an endpoint:
+
+- chat completions are answered with the MockLLM rules, parsed back out of
+  the prompt built by BaseLLM (single- and multi-question prompts)
+- embeddings are the deterministic hash embeddings of MockEmbeddingService
+- latency follows a configurable distribution; requests beyond a
+  requests-per-minute budget, or chosen at random, get 429 with Retry-After;
+  a configurable share gets 500/503
+- usage reports prompt/completion tokens and simulated prefix-cache hits
+- completions can stream as server-sent events, token by token, optionally
+  followed by a trailing explanation (as chatty models do)
+
+LocalBatchRunner is the matching stand-in for batch jobs (BatchJobLLM): it
+answers job files in a background thread, writing result lines as it goes,
+and picks up an unfinished job again after a restart.
+
+Usage:
+    python -m src.models.local_server --port 8000 --latency-mean 0.3 --throttle-rate 0.05
+
+Point the clients at it with endpoint "http://127.0.0.1:8000" and any API key.
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from src.models.batch_jobs import BatchJobClient
+from src.models.mock_llm import MockLLM
+from src.models.embedding_service import MockEmbeddingService
+from src.models.rate_limiter import TokenBucket
+
+_QUESTION_RE = re.compile(r"^Question: (.*)$", re.MULTILINE)
+_TABLES_RE = re.compile(r"^Tables: (\[.*\])$", re.MULTILINE)
+_COLUMNS_RE = re.compile(r"^Columns: (\[.*\])$", re.MULTILINE)
+_BATCH_SCHEMA_RE = re.compile(r"^(S\d+): Tables: (\[.*?\]) Columns: (\[.*\])$", re.MULTILINE)
+_BATCH_QUESTION_RE = re.compile(r"^(\d+)\. \[(S\d+)\] (.*)$", re.MULTILINE)
+_TOKEN_RE = re.compile(r"\s*\S{1,4}|\s+$")
+
+# Prefix-cache simulation: the provider caches prompts of at least 1024 tokens
+# in 128-token blocks; at about 4 characters per token
+_CACHE_MIN_CHARS = 4096
+_CACHE_BLOCK_CHARS = 512
+
+
+class LatencyModel:
+    """Per-request service time drawn from a named distribution"""
+
+    DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+    def __init__(self, distribution: str = "fixed", mean: float = 0.0, spread: float = 0.5):
+        """
+        Args:
+            distribution: One of DISTRIBUTIONS
+            mean: Mean latency in seconds
+            spread: Half-width as a fraction of the mean (uniform) or sigma (lognormal)
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.mean = mean
+        self.spread = spread
+
+    def sample(self, rng: random.Random) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "uniform":
+            return rng.uniform(self.mean * (1 - self.spread), self.mean * (1 + self.spread))
+        if self.distribution == "exponential":
+            return rng.expovariate(1.0 / self.mean)
+        if self.distribution == "lognormal":
+            # Parameterized so the distribution's mean equals self.mean
+            return rng.lognormvariate(math.log(self.mean) - self.spread ** 2 / 2, self.spread)
+        return self.mean
+
+
+class StandInConfig:
+    """Behaviour of the stand-in server"""
+
+    def __init__(self, latency: Optional[LatencyModel] = None,
+                 requests_per_minute: Optional[float] = None,
+                 throttle_rate: float = 0.0, error_rate: float = 0.0,
+                 retry_after: float = 1.0, seed: int = 0,
+                 token_delay: float = 0.0, trailing_text: str = ""):
+        """
+        Args:
+            latency: Service-time model (default: no delay)
+            requests_per_minute: Budget beyond which requests get 429 (None = unlimited)
+            throttle_rate: Share of requests answered 429 at random
+            error_rate: Share of requests answered 500/503 at random
+            retry_after: Retry-After seconds sent with 429s
+            seed: Seed for latency and fault injection
+            token_delay: Generation time per completion token, in seconds
+            trailing_text: Text appended after single-question SQL answers
+        """
+        self.latency = latency if latency else LatencyModel()
+        self.requests_per_minute = requests_per_minute
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.token_delay = token_delay
+        self.trailing_text = trailing_text
+
+
+class StandInServer:
+    """Threaded local HTTP server with chat-completions and embeddings endpoints"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: Optional[StandInConfig] = None):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 = any free port; see .url)
+            config: Latency, throttling and error injection settings
+        """
+        self.config = config if config else StandInConfig()
+        self.mock_llm = MockLLM()
+        self.embedder = MockEmbeddingService()
+        self.stats = {"connections": 0, "chat": 0, "streamed": 0, "client_disconnects": 0, "embeddings": 0,
+                      "throttled": 0, "errors": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0}
+        self._bucket = TokenBucket(self.config.requests_per_minute) if self.config.requests_per_minute else None
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._prefix_blocks = set()
+        self._thread: Optional[threading.Thread] = None
+
+        handler = type("StandInHandler", (_Handler,), {"server_state": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fault(self) -> Optional[Tuple[int, Dict[str, str]]]:
+        """Injected (status, headers) for this request, or None to serve it"""
+        with self._lock:
+            if self._bucket and self._bucket.reserve(1) > 0:
+                self._bucket.adjust(1)  # rejected requests do not consume the budget
+                throttled = True
+            else:
+                throttled = self._rng.random() < self.config.throttle_rate
+            if throttled:
+                self.stats["throttled"] += 1
+                return 429, {"Retry-After": str(self.config.retry_after)}
+            if self._rng.random() < self.config.error_rate:
+                self.stats["errors"] += 1
+                return self._rng.choice((500, 503)), {}
+        return None
+
+    def latency(self) -> float:
+        with self._lock:
+            return self.config.latency.sample(self._rng)
+
+    def cached_prompt_tokens(self, prompt: str) -> int:
+        """Simulated provider prefix cache: leading 128-token blocks seen in earlier prompts"""
+        if len(prompt) < _CACHE_MIN_CHARS:
+            return 0
+        digest = hashlib.sha1()
+        cached_blocks = 0
+        still_cached = True
+        with self._lock:
+            for end in range(_CACHE_BLOCK_CHARS, len(prompt) + 1, _CACHE_BLOCK_CHARS):
+                digest.update(prompt[end - _CACHE_BLOCK_CHARS:end].encode("utf-8"))
+                block = digest.copy().hexdigest()
+                if still_cached and block in self._prefix_blocks:
+                    cached_blocks += 1
+                else:
+                    still_cached = False
+                    self._prefix_blocks.add(block)
+        return cached_blocks * _CACHE_BLOCK_CHARS // 4
+
+    def answer(self, prompt: str) -> str:
+        """MockLLM answer for a prompt built by BaseLLM (single or multi-question)"""
+        content = answer_prompt(prompt, self.mock_llm)
+        # Multi-question answers are JSON arrays and get no trailing text
+        return content if content.startswith("[") else content + self.config.trailing_text
+
+    def embed(self, text: str) -> List[float]:
+        # MockEmbeddingService seeds numpy's global generator
+        with self._lock:
+            return self.embedder.embed_text(text) or [0.0] * 1536
+
+
+class LocalBatchRunner(BatchJobClient):
+    """Offline batch-job runner answering job files with the MockLLM rules"""
+
+    def __init__(self, work_dir: Union[str, Path], seconds_per_request: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            work_dir: Directory holding submitted jobs, their status and output
+            seconds_per_request: Processing time per request line
+            error_rate: Share of requests answered with a 500 result line
+            seed: Seed for error injection
+        """
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.seconds_per_request = seconds_per_request
+        self.error_rate = error_rate
+        self.mock_llm = MockLLM()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._threads: Dict[str, threading.Thread] = {}
+
+    def submit(self, input_path: Path) -> str:
+        data = Path(input_path).read_bytes()
+        job_id = f"batch_{hashlib.sha1(data).hexdigest()[:12]}_{int(time.time() * 1000)}"
+        (self.work_dir / f"{job_id}.input.jsonl").write_bytes(data)
+        total = sum(1 for line in data.decode("utf-8").splitlines() if line.strip())
+        self._write_status(job_id, {"status": "in_progress", "completed": 0, "total": total})
+        self._start(job_id)
+        return job_id
+
+    def poll(self, job_id: str) -> Dict:
+        status = json.loads(self._status_path(job_id).read_text())
+        if status["status"] == "in_progress":
+            # A runner restarted mid-job continues where the output file ends
+            self._start(job_id)
+        return status
+
+    def iter_results(self, job_id: str, skip: int = 0) -> Iterator[str]:
+        output_path = self.work_dir / f"{job_id}.output.jsonl"
+        if not output_path.exists():
+            return
+        lines = output_path.read_text().split("\n")
+        # The last element is empty or a line still being written
+        yield from lines[skip:-1]
+
+    def _start(self, job_id: str):
+        with self._lock:
+            thread = self._threads.get(job_id)
+            if thread and thread.is_alive():
+                return
+            thread = threading.Thread(target=self._run, args=(job_id,), daemon=True)
+            self._threads[job_id] = thread
+            thread.start()
+
+    def _run(self, job_id: str):
+        requests = [json.loads(line) for line in
+                    (self.work_dir / f"{job_id}.input.jsonl").read_text().splitlines() if line.strip()]
+        output_path = self.work_dir / f"{job_id}.output.jsonl"
+        written = output_path.read_text() if output_path.exists() else ""
+        # Drop a line cut off by a crash; it is answered again
+        written = written[:written.rfind("\n") + 1]
+        output_path.write_text(written)
+        done = written.count("\n")
+        with open(output_path, "a") as output:
+            for request in requests[done:]:
+                if self.seconds_per_request:
+                    time.sleep(self.seconds_per_request)
+                output.write(json.dumps(self._result_line(request)) + "\n")
+                output.flush()
+                done += 1
+                self._write_status(job_id, {"status": "in_progress", "completed": done, "total": len(requests)})
+        self._write_status(job_id, {"status": "completed", "completed": done, "total": len(requests)})
+
+    def _result_line(self, request: Dict) -> Dict:
+        """Result line in the provider's output-file format"""
+        line_id = f"batch_req_{hashlib.md5(request['custom_id'].encode('utf-8')).hexdigest()[:16]}"
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+        if failed:
+            return {"id": line_id, "custom_id": request["custom_id"],
+                    "response": {"status_code": 500, "body": {"error": {"message": "Injected by local stand-in"}}},
+                    "error": None}
+
+        messages = request["body"].get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        user_prompt = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        with self._lock:
+            content = answer_prompt(user_prompt, self.mock_llm)
+        completion_tokens = len(_TOKEN_RE.findall(content))
+        return {
+            "id": line_id,
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "object": "chat.completion",
+                    "model": request["body"].get("model", "local-stand-in"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": _tokens(prompt),
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": _tokens(prompt) + completion_tokens,
+                    },
+                },
+            },
+            "error": None,
+        }
+
+    def _status_path(self, job_id: str) -> Path:
+        return self.work_dir / f"{job_id}.json"
+
+    def _write_status(self, job_id: str, status: Dict):
+        # Replace atomically, so poll never reads a half-written status
+        temp_path = self.work_dir / f"{job_id}.json.tmp"
+        temp_path.write_text(json.dumps(status))
+        temp_path.replace(self._status_path(job_id))
+
+
+def answer_prompt(prompt: str, mock_llm: MockLLM) -> str:
+    """MockLLM answer for a prompt built by BaseLLM: SQL, or a JSON array for multi-question prompts"""
+    schemas = {label: {"tables": _literal_list(tables), "columns": _literal_list(columns)}
+               for label, tables, columns in _BATCH_SCHEMA_RE.findall(prompt)}
+    items = _BATCH_QUESTION_RE.findall(prompt)
+    if schemas and items:
+        return json.dumps([
+            {"id": int(number), "sql": mock_llm._rule_sql(question, schemas.get(label, {}))}
+            for number, label, question in items
+        ])
+
+    question = _QUESTION_RE.search(prompt)
+    tables = _TABLES_RE.search(prompt)
+    columns = _COLUMNS_RE.search(prompt)
+    schema = {
+        "tables": _literal_list(tables.group(1)) if tables else ["table"],
+        "columns": _literal_list(columns.group(1)) if columns else [],
+    }
+    return mock_llm._rule_sql(question.group(1) if question else prompt, schema)
+
+
+def _literal_list(text: str) -> List[str]:
+    """Parse a Python list-of-strings repr as printed in the prompt"""
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return []
+    return [str(item) for item in value] if isinstance(value, (list, tuple)) else []
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Routes /chat/completions and /embeddings (Azure deployment or OpenAI paths)"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pools are exercised
+    server_state: StandInServer = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; without this, Nagle's
+        # algorithm stalls every response on a reused keep-alive connection
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server_state._lock:
+            self.server_state.stats["connections"] += 1
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send(200, self.server_state.stats)
+        else:
+            self._send(404, {"error": {"code": "404", "message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": {"code": "400", "message": "Invalid JSON"}})
+            return
+
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            handler = self._chat
+        elif path.endswith("/embeddings"):
+            handler = self._embeddings
+        else:
+            self._send(404, {"error": {"code": "404", "message": "Not found"}})
+            return
+
+        state = self.server_state
+        fault = state.fault()
+        if fault:
+            status, headers = fault
+            self._send(status, {"error": {"code": str(status), "message": "Injected by local stand-in"}}, headers)
+            return
+
+        delay = state.latency()
+        if delay:
+            time.sleep(delay)
+        handler(body)
+
+    def _chat(self, body: Dict):
+        state = self.server_state
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        user_prompt = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        content = state.answer(user_prompt)
+
+        pieces = _TOKEN_RE.findall(content)
+        prompt_tokens = _tokens(prompt)
+        cached = state.cached_prompt_tokens(prompt)
+        with state._lock:
+            state.stats["chat"] += 1
+            state.stats["prompt_tokens"] += prompt_tokens
+            state.stats["cached_prompt_tokens"] += cached
+
+        header = {
+            "id": f"chatcmpl-{hashlib.md5(prompt.encode('utf-8')).hexdigest()[:24]}",
+            "created": int(time.time()),
+            "model": body.get("model", "local-stand-in"),
+        }
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces),
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            self._stream_chat(header, pieces, usage if include_usage else None)
+            return
+
+        if state.config.token_delay:
+            time.sleep(state.config.token_delay * len(pieces))
+        self._send(200, {
+            **header,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _stream_chat(self, header: Dict, pieces: List[str], usage: Optional[Dict]):
+        """Send a completion as server-sent events, one token per event"""
+        state = self.server_state
+        with state._lock:
+            state.stats["streamed"] += 1
+
+        def chunk(delta: Dict, finish_reason: Optional[str] = None) -> Dict:
+            return {**header, "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._send_event(chunk({"role": "assistant", "content": ""}))
+            for piece in pieces:
+                if state.config.token_delay:
+                    time.sleep(state.config.token_delay)
+                self._send_event(chunk({"content": piece}))
+            self._send_event(chunk({}, "stop"))
+            if usage is not None:
+                self._send_event({**header, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. once its SQL statement was complete)
+            self.close_connection = True
+            with state._lock:
+                state.stats["client_disconnects"] += 1
+
+    def _send_event(self, payload: Dict):
+        self._write_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _embeddings(self, body: Dict):
+        state = self.server_state
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        data = [{"object": "embedding", "index": i, "embedding": state.embed(str(text))}
+                for i, text in enumerate(inputs)]
+        tokens = sum(_tokens(str(text)) for text in inputs)
+        with state._lock:
+            state.stats["embeddings"] += 1
+
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "local-stand-in"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the request (e.g. a hedged duplicate won)
+            self.close_connection = True
+            with self.server_state._lock:
+                self.server_state.stats["client_disconnects"] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Azure OpenAI / OpenAI stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-dist", choices=LatencyModel.DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--latency-mean", type=float, default=0.0, help="Mean seconds per request")
+    parser.add_argument("--latency-spread", type=float, default=0.5,
+                        help="Uniform half-width fraction or lognormal sigma")
+    parser.add_argument("--rpm", type=float, default=None, help="Requests per minute before 429s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of random 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of random 500/503s")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per completion token")
+    parser.add_argument("--trailing-text", default="", help="Text appended after each single-question SQL answer")
+    args = parser.parse_args()
+
+    config = StandInConfig(
+        latency=LatencyModel(args.latency_dist, args.latency_mean, args.latency_spread),
+        requests_per_minute=args.rpm,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        token_delay=args.token_delay,
+        trailing_text=args.trailing_text,
+    )
+    server = StandInServer(args.host, args.port, config)
+    print(f"Local stand-in listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
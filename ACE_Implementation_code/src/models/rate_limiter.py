@@ -0,0 +1,300 @@
+"""
+Rate Limiter - Provider-level throttling, retry and concurrency control
+
+- TokenBucket / RateLimiter: requests-per-minute and tokens-per-minute budgets
+  shared by every client of one provider (chat and embeddings)
+- RetryPolicy: jittered exponential backoff on 429, 5xx, timeouts and
+  connection errors, honouring Retry-After when the server sends it
+- AIMDController: additive-increase / multiplicative-decrease limit on
+  in-flight requests, driven by observed latency and throttling
+- call_with_retry / acall_with_retry: run one request under all three
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_RETRYABLE_ERRORS = {"APITimeoutError", "APIConnectionError", "Timeout", "TimeoutException",
+                     "ConnectError", "ReadTimeout", "ConnectTimeout"}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a per-minute rate"""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        """
+        Args:
+            per_minute: Sustained refill rate
+            burst_seconds: Bucket capacity, as seconds of refill
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` tokens, going into debt if needed
+
+        Returns:
+            Seconds the caller must wait before using the reservation
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """Return (positive) or take (negative) tokens after the real cost is known"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def available(self) -> float:
+        """Tokens in the bucket right now (negative while in debt), without taking any"""
+        with self._lock:
+            return min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+
+class RateLimiter:
+    """Requests/min and tokens/min budgets for one provider"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, burst_seconds: float = 10.0):
+        """
+        Args:
+            requests_per_minute: Request budget (None = unlimited)
+            tokens_per_minute: Token budget (None = unlimited)
+            burst_seconds: Burst allowance of each bucket
+        """
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute else None
+        self.waited_seconds = 0.0
+
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        self.waited_seconds += wait
+        return wait
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request using about `tokens` tokens fits the budget"""
+        wait = self._reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        """Asynchronous acquire"""
+        wait = self._reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def headroom(self) -> float:
+        """Share of the tighter budget still available right now (1.0 = full burst, 0.0 = exhausted)"""
+        shares = [bucket.available() / bucket.capacity for bucket in (self.requests, self.tokens) if bucket]
+        return max(0.0, min(shares, default=1.0))
+
+    def refund(self, tokens: int):
+        """Return the token reservation of an attempt that failed (it used no tokens)"""
+        if self.tokens and tokens:
+            self.tokens.adjust(tokens)
+
+    def record_usage(self, estimated: int, actual: Optional[int]):
+        """Correct the token budget once a response reports its real usage"""
+        if self.tokens and actual is not None:
+            self.tokens.adjust(estimated - actual)
+
+
+class RetryPolicy:
+    """Jittered exponential backoff for transient API failures"""
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        """
+        Args:
+            max_retries: Retries after the first attempt
+            base_delay: Backoff ceiling of the first retry, in seconds
+            max_delay: Upper bound on any single wait
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def status_code(error: Exception) -> Optional[int]:
+        """HTTP status carried by an openai/httpx error, if any"""
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        return status
+
+    def is_throttle(self, error: Exception) -> bool:
+        return self.status_code(error) == 429
+
+    def is_retryable(self, error: Exception) -> bool:
+        status = self.status_code(error)
+        if status is not None:
+            return status == 408 or status == 429 or status >= 500
+        return type(error).__name__ in _RETRYABLE_ERRORS
+
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Seconds to wait before retry number `attempt` (0-based), with full jitter"""
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+        if retry_after is not None:
+            try:
+                return min(self.max_delay, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease limit on in-flight requests"""
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0,
+                 baseline_decay: float = 0.01):
+        """
+        Args:
+            initial: Starting concurrency limit
+            minimum: Lowest limit
+            maximum: Highest limit
+            decrease_factor: Multiplier applied on throttling or a latency spike
+            latency_tolerance: Latency (vs the baseline latency) treated as congestion
+            baseline_decay: Share of the gap to the smoothed latency the baseline closes per
+                completion. The baseline is the best smoothed latency seen, drifting up slowly
+                so it follows latency that grows with the prompt (e.g. a growing playbook)
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.baseline_decay = baseline_decay
+        self.in_flight = 0
+        self.throttles = 0
+        self.latency_ewma: Optional[float] = None
+        self._best_latency: Optional[float] = None
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        # asyncio.run creates a new loop per batch; conditions are per loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        """Wait for an in-flight slot under the current limit"""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def on_success(self, latency: float):
+        """Additive increase (about +1 per limit's worth of completions) unless latency spikes"""
+        with self._lock:
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            if self._best_latency is None or self.latency_ewma < self._best_latency:
+                self._best_latency = self.latency_ewma
+            else:
+                self._best_latency += self.baseline_decay * (self.latency_ewma - self._best_latency)
+            if self.latency_ewma > self._best_latency * self.latency_tolerance:
+                self._decrease()
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_failure(self, throttled: bool):
+        """Multiplicative decrease on throttling"""
+        with self._lock:
+            if throttled:
+                self.throttles += 1
+                self._decrease()
+
+    def _decrease(self):
+        # At most one decrease per round trip (smoothed latency), so the failures of one
+        # congested window cut the limit once; before any success every throttle cuts
+        now = time.monotonic()
+        if now - self._last_decrease >= (self.latency_ewma or 0.0):
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            self._last_decrease = now
+
+
+def call_with_retry(fn: Callable[[], T], limiter: Optional[RateLimiter] = None,
+                    policy: Optional[RetryPolicy] = None,
+                    controller: Optional[AIMDController] = None, tokens: int = 0) -> T:
+    """
+    Run a blocking request under the rate limit, retrying transient failures
+
+    Raises:
+        The last error once it is not retryable or retries are exhausted
+    """
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.max_retries + 1):
+        if limiter:
+            limiter.acquire(tokens)
+        start = time.monotonic()
+        try:
+            result = fn()
+        except Exception as error:
+            if limiter:
+                limiter.refund(tokens)
+            if controller:
+                controller.on_failure(policy.is_throttle(error))
+            if attempt == policy.max_retries or not policy.is_retryable(error):
+                raise
+            time.sleep(policy.delay(attempt, error))
+        else:
+            if controller:
+                controller.on_success(time.monotonic() - start)
+            return result
+
+
+async def acall_with_retry(fn: Callable[[], Awaitable[T]], limiter: Optional[RateLimiter] = None,
+                           policy: Optional[RetryPolicy] = None,
+                           controller: Optional[AIMDController] = None, tokens: int = 0) -> T:
+    """Asynchronous call_with_retry; also holds an AIMD in-flight slot per attempt"""
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.max_retries + 1):
+        if limiter:
+            await limiter.aacquire(tokens)
+        if controller:
+            await controller.acquire()
+        start = time.monotonic()
+        try:
+            result = await fn()
+        except Exception as error:
+            if limiter:
+                limiter.refund(tokens)
+            if controller:
+                controller.on_failure(policy.is_throttle(error))
+            if attempt == policy.max_retries or not policy.is_retryable(error):
+                raise
+            retry_delay = policy.delay(attempt, error)
+        else:
+            if controller:
+                controller.on_success(time.monotonic() - start)
+            return result
+        finally:
+            if controller:
+                await controller.release()
+        await asyncio.sleep(retry_delay)
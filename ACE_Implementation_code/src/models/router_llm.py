@@ -0,0 +1,257 @@
+"""
+Router LLM - Latency-aware routing over a pool of deployments
+
+RoutedLLM is a BaseLLM that sends each request to one of several backends
+(e.g. AzureOpenAILLM instances for deployments in different regions):
+
+- the backend with the lowest score wins, where score = EWMA latency
+  x (1 + in-flight requests) / remaining rate-limit headroom; unmeasured
+  backends score 0 so each is measured first, and a small share of requests
+  explores a random backend so recovered or improved backends are noticed
+- a failed request (LLMRequestError, after the backend's own retries) fails
+  over to the next-best backend
+- after failure_threshold consecutive failures a backend is drained for a
+  cooldown that doubles on every repeated drain; after the cooldown a single
+  probe request is let through, and on success the backend rejoins the pool
+  with a fresh latency estimate
+
+routing_stats() reports the decisions and per-backend state.
+"""
+
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+from src.components.playbook import Playbook, Bullet
+from src.models.base_llm import BaseLLM, LLMRequestError
+from src.models.rate_limiter import RateLimiter
+
+T = TypeVar("T")
+
+# Lowest headroom used in the score, so an exhausted backend is penalized but still comparable
+_MIN_HEADROOM = 0.05
+
+
+class Backend:
+    """One deployment in a RoutedLLM pool, with its routing state"""
+
+    def __init__(self, name: str, llm: BaseLLM, rate_limiter: Optional[RateLimiter] = None):
+        """
+        Args:
+            name: Label used in metrics
+            llm: Provider for this deployment
+            rate_limiter: This deployment's budget, read for headroom (optional)
+        """
+        self.name = name
+        self.llm = llm
+        self.rate_limiter = rate_limiter
+        self.latency_ewma: Optional[float] = None
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.drained_until = 0.0
+        self.drain_seconds = 0.0
+        self.probing = False
+        self.stats = {"routed": 0, "succeeded": 0, "failed": 0, "drains": 0, "recoveries": 0}
+
+    def headroom(self) -> float:
+        return self.rate_limiter.headroom() if self.rate_limiter else 1.0
+
+    def state(self, now: float) -> str:
+        if now < self.drained_until:
+            return "drained"
+        return "probing" if self.probing else "healthy"
+
+
+class RoutedLLM(BaseLLM):
+    """BaseLLM that routes each request to the best backend in a pool"""
+
+    def __init__(self, backends: Sequence[Backend], ewma_alpha: float = 0.2,
+                 failure_threshold: int = 3, drain_seconds: float = 10.0,
+                 max_drain_seconds: float = 300.0, explore_rate: float = 0.05, seed: int = 0):
+        """
+        Args:
+            backends: Deployments to route between (at least one)
+            ewma_alpha: Weight of the newest latency sample
+            failure_threshold: Consecutive failures that drain a backend
+            drain_seconds: First drain cooldown; doubles on each repeated drain
+            max_drain_seconds: Longest drain cooldown
+            explore_rate: Share of requests sent to a random healthy backend
+            seed: Seed for exploration
+        """
+        if not backends:
+            raise ValueError("RoutedLLM needs at least one backend")
+        self.backends = list(backends)
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.drain_seconds = drain_seconds
+        self.max_drain_seconds = max_drain_seconds
+        self.explore_rate = explore_rate
+        self.model_name = getattr(self.backends[0].llm, "model_name", type(self.backends[0].llm).__name__)
+        self.system_message = getattr(self.backends[0].llm, "system_message", "")
+        self.batch_system_message = getattr(self.backends[0].llm, "batch_system_message", self.system_message)
+        self.decisions = {"requests": 0, "failovers": 0, "explored": 0, "all_drained": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                     relevant_bullets: List[Bullet]) -> str:
+        """Generate SQL on the best backend, failing over on errors"""
+        return self._call(lambda llm: llm.generate_sql(question, schema, playbook, relevant_bullets))
+
+    async def agenerate_sql(self, question: str, schema: Dict, playbook: Playbook,
+                            relevant_bullets: List[Bullet]) -> str:
+        """Asynchronous generate_sql"""
+        return await self._acall(lambda llm: llm.agenerate_sql(question, schema, playbook, relevant_bullets))
+
+    async def agenerate_sql_batch(self, questions: Sequence[str], schemas: Sequence[Dict],
+                                  playbook: Playbook, relevant_bullets: List[Bullet]) -> List[Optional[str]]:
+        """Multi-question prompt on the best backend (not counted in its latency estimate)"""
+        return await self._acall(
+            lambda llm: llm.agenerate_sql_batch(questions, schemas, playbook, relevant_bullets),
+            measure=False
+        )
+
+    async def arelease_loop(self):
+        for backend in self.backends:
+            await backend.llm.arelease_loop()
+
+    def _call(self, request: Callable[[BaseLLM], T]) -> T:
+        tried: List[Backend] = []
+        while True:
+            backend = self._choose(tried)
+            start = time.monotonic()
+            try:
+                result = request(backend.llm)
+            except LLMRequestError as e:
+                self._finish(backend, succeeded=False)
+                if len(tried) == len(self.backends):
+                    raise LLMRequestError(f"All {len(self.backends)} backends failed; last error: {e}") from e
+                continue
+            except BaseException:
+                self._finish(backend)
+                raise
+            self._finish(backend, succeeded=True, latency=time.monotonic() - start)
+            return result
+
+    async def _acall(self, request: Callable[[BaseLLM], Awaitable[T]], measure: bool = True) -> T:
+        tried: List[Backend] = []
+        while True:
+            backend = self._choose(tried)
+            start = time.monotonic()
+            try:
+                result = await request(backend.llm)
+            except LLMRequestError as e:
+                self._finish(backend, succeeded=False)
+                if len(tried) == len(self.backends):
+                    raise LLMRequestError(f"All {len(self.backends)} backends failed; last error: {e}") from e
+                continue
+            except BaseException:
+                # Includes cancellation: release the slot without judging the backend
+                self._finish(backend)
+                raise
+            self._finish(backend, succeeded=True, latency=time.monotonic() - start if measure else None)
+            return result
+
+    def _choose(self, tried: List[Backend]) -> Backend:
+        """Pick (and reserve) the best backend not tried yet for this request; appended to tried"""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [backend for backend in self.backends if backend not in tried]
+            available = [
+                backend for backend in candidates
+                if backend.drained_until <= now and not (backend.probing and backend.in_flight)
+            ]
+            if not available:
+                # Everything is drained: try the backend that comes back first rather than failing
+                backend = min(candidates, key=lambda b: b.drained_until)
+                self.decisions["all_drained"] += 1
+            elif len(available) > 1 and self._rng.random() < self.explore_rate:
+                backend = self._rng.choice(available)
+                self.decisions["explored"] += 1
+            else:
+                backend = min(available, key=self._score)
+            if tried:
+                self.decisions["failovers"] += 1
+            else:
+                self.decisions["requests"] += 1
+            backend.in_flight += 1
+            backend.stats["routed"] += 1
+            tried.append(backend)
+            return backend
+
+    @staticmethod
+    def _score(backend: Backend) -> float:
+        """Expected wait on a backend; lower is better (unmeasured backends are tried first)"""
+        latency = backend.latency_ewma or 0.0
+        return latency * (1 + backend.in_flight) / max(backend.headroom(), _MIN_HEADROOM)
+
+    def _finish(self, backend: Backend, succeeded: Optional[bool] = None, latency: Optional[float] = None):
+        """Release a backend's slot and update its health from the outcome (None = no verdict)"""
+        with self._lock:
+            backend.in_flight -= 1
+            if succeeded is False:
+                backend.stats["failed"] += 1
+                backend.consecutive_failures += 1
+                if backend.probing or backend.consecutive_failures >= self.failure_threshold:
+                    self._drain(backend)
+            elif succeeded:
+                backend.stats["succeeded"] += 1
+                backend.consecutive_failures = 0
+                if backend.probing:
+                    # Rejoin with a fresh estimate instead of the one from before the drain
+                    backend.probing = False
+                    backend.drain_seconds = 0.0
+                    backend.latency_ewma = None
+                    backend.stats["recoveries"] += 1
+                    print(f"  ✓ Backend {backend.name} recovered")
+                if latency is not None:
+                    backend.latency_ewma = latency if backend.latency_ewma is None else \
+                        (1 - self.ewma_alpha) * backend.latency_ewma + self.ewma_alpha * latency
+
+    def _drain(self, backend: Backend):
+        backend.drain_seconds = min(self.max_drain_seconds, backend.drain_seconds * 2 or self.drain_seconds)
+        backend.drained_until = time.monotonic() + backend.drain_seconds
+        backend.probing = True
+        backend.consecutive_failures = 0
+        backend.stats["drains"] += 1
+        print(f"  ⚠️  Draining backend {backend.name} for {backend.drain_seconds:.1f}s")
+
+    def routing_stats(self) -> Dict:
+        """Routing decisions and per-backend state, latency estimate, headroom and traffic share"""
+        now = time.monotonic()
+        with self._lock:
+            routed = sum(backend.stats["routed"] for backend in self.backends)
+            return {
+                **self.decisions,
+                "backends": {
+                    backend.name: {
+                        "state": backend.state(now),
+                        "latency_ewma": backend.latency_ewma,
+                        "headroom": backend.headroom(),
+                        "in_flight": backend.in_flight,
+                        "share": backend.stats["routed"] / routed if routed else 0.0,
+                        **backend.stats,
+                    }
+                    for backend in self.backends
+                },
+            }
+
+    def usage_stats(self) -> Dict:
+        """Token usage summed over the backends, with the routing metrics under "routing" """
+        totals: Dict = {}
+        streamed_time: Dict[str, float] = {}
+        for backend in self.backends:
+            usage = backend.llm.usage_stats()
+            for key, value in usage.items():
+                if key.startswith("avg_"):
+                    # Averages over streamed requests; re-weighted below
+                    streamed_time[key] = streamed_time.get(key, 0.0) + value * usage.get("streamed_requests", 0)
+                elif isinstance(value, (int, float)) and not key.endswith("_ratio"):
+                    totals[key] = totals.get(key, 0) + value
+        prompt_tokens = totals.get("prompt_tokens", 0)
+        totals["cached_prompt_ratio"] = totals.get("cached_prompt_tokens", 0) / prompt_tokens if prompt_tokens else 0.0
+        streamed = totals.get("streamed_requests", 0)
+        for key, value in streamed_time.items():
+            totals[key] = value / streamed if streamed else 0.0
+        totals["routing"] = self.routing_stats()
+        return totals
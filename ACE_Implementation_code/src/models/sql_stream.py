@@ -0,0 +1,160 @@
+"""
+SQL Stream - Detect the end of the first SQL statement in a streamed response
+
+Models sometimes follow the query with an explanation. Fed the response as it
+streams, SQLStreamParser reports when a complete single statement has been
+seen, so the caller can stop reading:
+
+- a semicolon outside string literals and comments
+- a markdown fence after the statement (the closing ``` of a code block)
+- a line break after a statement with a FROM clause, when the next line
+  clearly is not SQL: it starts with markdown or a prose word ("This ...",
+  "Explanation: ...") rather than a keyword, identifier or operator. A line
+  starting with any other word keeps the statement open.
+
+The text up to the cut point gives the same SQL under the usual response
+cleanup as the full response would, minus any trailing prose.
+"""
+
+import re
+from typing import Optional
+
+# A statement starts at the beginning of a line (possibly right after a fence line)
+_STATEMENT_START_RE = re.compile(r"^[ \t]*(?:select|with)\b", re.IGNORECASE | re.MULTILINE)
+_FROM_RE = re.compile(r"\bfrom\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[A-Za-z_]+")
+_LAST_WORD_RE = re.compile(r"([A-Za-z_]+)\s*$")
+
+# Words that continue a query on the next line, or leave it open when a line ends with them
+_CONTINUATION_WORDS = {
+    "SELECT", "FROM", "WHERE", "AND", "OR", "NOT", "IN", "IS", "LIKE", "BETWEEN",
+    "GROUP", "ORDER", "BY", "HAVING", "LIMIT", "OFFSET", "JOIN", "INNER", "LEFT",
+    "RIGHT", "FULL", "OUTER", "CROSS", "ON", "USING", "UNION", "INTERSECT", "EXCEPT",
+    "AS", "ASC", "DESC", "DISTINCT", "CASE", "WHEN", "THEN", "ELSE", "END",
+    "NATURAL", "WINDOW", "FETCH", "PARTITION", "OVER", "FILTER", "QUALIFY", "LATERAL",
+    "ROWS", "RANGE", "COLLATE", "ESCAPE", "ALL", "ANY", "EXISTS", "WITH", "VALUES",
+}
+# Words that start an explanation after the query, not a continuation of it
+_PROSE_WORDS = {"THIS", "THE", "THESE", "HERE", "NOTE", "EXPLANATION", "IT", "I", "YOU", "ASSUMING"}
+_OPEN_LINE_ENDINGS = ",(=<>!+-*/"
+_CONTINUATION_STARTS = ",()=<>!'\""
+
+
+class SQLStreamParser:
+    """Incremental end-of-statement detector for streamed SQL responses"""
+
+    def __init__(self):
+        self.text = ""
+        self.end: Optional[int] = None
+
+    @property
+    def complete(self) -> bool:
+        """Whether a complete statement has been seen"""
+        return self.end is not None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Append streamed text
+
+        Returns:
+            True once a complete statement has been seen (stop reading)
+        """
+        if self.end is None and chunk:
+            self.text += chunk
+            self.end = statement_end(self.text)
+        return self.end is not None
+
+    def result(self) -> str:
+        """Response text up to the end of the statement (everything fed so far if incomplete)"""
+        return self.text if self.end is None else self.text[:self.end]
+
+
+def statement_end(text: str) -> Optional[int]:
+    """Index just past the first complete SQL statement in text, or None if not yet complete"""
+    start = _STATEMENT_START_RE.search(text)
+    if start is None:
+        return None
+
+    quote = None
+    depth = 0
+    # Statement text outside comments, for the line-break decision
+    code = []
+    i = start.start()
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif text.startswith("--", i):
+            i = text.find("\n", i)
+            if i < 0:
+                return None
+            continue
+        elif text.startswith("/*", i):
+            close = text.find("*/", i + 2)
+            if close < 0:
+                return None
+            code.append(" ")
+            i = close + 2
+            continue
+        elif char in "'\"":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == ";":
+            return i + 1
+        elif char == "`" and text.startswith("```", i):
+            return i
+        elif char == "\n" and depth <= 0:
+            decision = _line_break_ends("".join(code), text[i + 1:])
+            if decision is None:
+                return None
+            if decision:
+                return i
+        code.append(char)
+        i += 1
+    return None
+
+
+def _line_break_ends(statement: str, rest: str) -> Optional[bool]:
+    """Whether the statement ends at this line break (None = need more text to decide)"""
+    statement = statement.rstrip()
+    if not _FROM_RE.search(statement) or statement[-1:] in _OPEN_LINE_ENDINGS:
+        return False
+    last_word = _LAST_WORD_RE.search(statement)
+    if last_word and last_word.group(1).upper() in _CONTINUATION_WORDS:
+        return False
+
+    rest = _skip_comments(rest)
+    if not rest:
+        return None
+    if rest[0] in _CONTINUATION_STARTS:
+        return False
+    word = _WORD_RE.match(rest)
+    if word is None:
+        # Markdown or a list after the query; "-" and "/" may still open a comment
+        return None if rest in ("-", "/") else True
+    if word.end() == len(rest):
+        # The next word may still be growing ("OR" -> "ORDER", "The" -> "Then")
+        return None
+    return word.group().upper() in _PROSE_WORDS
+
+
+def _skip_comments(rest: str) -> str:
+    """Text after leading whitespace and comments ("" if that is all there is so far)"""
+    while True:
+        rest = rest.lstrip()
+        if rest.startswith("--"):
+            newline = rest.find("\n")
+            if newline < 0:
+                return ""
+            rest = rest[newline:]
+        elif rest.startswith("/*"):
+            close = rest.find("*/")
+            if close < 0:
+                return ""
+            rest = rest[close + 2:]
+        else:
+            return rest
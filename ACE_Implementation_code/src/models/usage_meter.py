@@ -0,0 +1,126 @@
+"""
+Usage Meter - Per-call token, wall-time and cost accounting
+
+LLM providers and the embedding service report every call to a shared
+UsageMeter: input, output and cached (prefix-cache) tokens, wall time
+including retries and queueing, and for generation the number of playbook
+bullets in the prompt. Calls are aggregated per phase (the trainer sets
+"epoch_1", "epoch_2", ..., "evaluation"), per stage ("generation",
+"batch_generation", "embedding") and per bullet count, which shows how
+playbook growth drives prompt size, latency and cost.
+
+Costs use per-1k-token prices per stage; stages without prices cost 0.
+"""
+
+import threading
+from typing import Dict, Optional
+
+_COUNTERS = ("calls", "input_tokens", "output_tokens", "cached_tokens", "seconds", "cost")
+
+
+def _empty() -> Dict:
+    return dict.fromkeys(_COUNTERS, 0)
+
+
+def _summary(counters: Dict) -> Dict:
+    """Counters with per-call averages and the cached share of input tokens"""
+    calls = counters["calls"]
+    return {
+        **counters,
+        "avg_input_tokens": counters["input_tokens"] / calls if calls else 0.0,
+        "avg_output_tokens": counters["output_tokens"] / calls if calls else 0.0,
+        "avg_seconds": counters["seconds"] / calls if calls else 0.0,
+        "cached_ratio": counters["cached_tokens"] / counters["input_tokens"] if counters["input_tokens"] else 0.0,
+    }
+
+
+class UsageMeter:
+    """Thread-safe ledger of model calls, aggregated per phase, stage and bullet count"""
+
+    def __init__(self, prices: Optional[Dict[str, Dict[str, float]]] = None, phase: str = "setup"):
+        """
+        Args:
+            prices: Per stage, {"input", "cached_input", "output"} prices per 1k tokens
+            phase: Label for calls until set_phase is called
+        """
+        self.prices = prices if prices else {}
+        self.phase = phase
+        self._total = _empty()
+        self._by_stage: Dict[str, Dict] = {}
+        self._by_phase: Dict[str, Dict[str, Dict]] = {}
+        self._by_bullets: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+
+    def set_phase(self, phase: str):
+        """Attribute the following calls to phase (e.g. "epoch_2")"""
+        with self._lock:
+            self.phase = phase
+
+    def record(self, stage: str, input_tokens: int, output_tokens: int = 0, cached_tokens: int = 0,
+               seconds: float = 0.0, bullets: Optional[int] = None):
+        """
+        Record one call
+
+        Args:
+            stage: "generation", "batch_generation" or "embedding"
+            input_tokens: Prompt tokens, cached ones included
+            output_tokens: Completion tokens
+            cached_tokens: Prompt tokens served from the provider's prefix cache
+            seconds: Wall time of the call, retries included
+            bullets: Playbook bullets in the prompt (None for calls without a playbook)
+        """
+        call = {
+            "calls": 1,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+            "seconds": seconds,
+            "cost": self.cost(stage, input_tokens, output_tokens, cached_tokens),
+        }
+        with self._lock:
+            buckets = [
+                self._total,
+                self._by_stage.setdefault(stage, _empty()),
+                self._by_phase.setdefault(self.phase, {}).setdefault(stage, _empty()),
+            ]
+            if bullets is not None:
+                buckets.append(self._by_bullets.setdefault(bullets, _empty()))
+            for bucket in buckets:
+                for key, value in call.items():
+                    bucket[key] += value
+
+    def cost(self, stage: str, input_tokens: int, output_tokens: int = 0, cached_tokens: int = 0) -> float:
+        """Price of a call at this stage's per-1k-token prices"""
+        prices = self.prices.get(stage, {})
+        input_price = prices.get("input", 0.0)
+        return ((input_tokens - cached_tokens) * input_price
+                + cached_tokens * prices.get("cached_input", input_price)
+                + output_tokens * prices.get("output", 0.0)) / 1000
+
+    def phase_totals(self, phase: str) -> Dict:
+        """Summary of one phase over all stages"""
+        with self._lock:
+            total = _empty()
+            for counters in self._by_phase.get(phase, {}).values():
+                for key, value in counters.items():
+                    total[key] += value
+        return _summary(total)
+
+    def totals(self) -> Dict:
+        with self._lock:
+            return _summary(self._total)
+
+    def report(self) -> Dict:
+        """Totals, and summaries per stage, per phase (with its stages) and per bullet count"""
+        with self._lock:
+            by_phase = {phase: {stage: _summary(counters) for stage, counters in stages.items()}
+                        for phase, stages in self._by_phase.items()}
+            report = {
+                "total": _summary(self._total),
+                "by_stage": {stage: _summary(counters) for stage, counters in self._by_stage.items()},
+                "by_bullets": {str(bullets): _summary(counters)
+                               for bullets, counters in sorted(self._by_bullets.items())},
+            }
+        report["by_phase"] = {phase: {"total": self.phase_totals(phase), **stages}
+                              for phase, stages in by_phase.items()}
+        return report
@@ -3,6 +3,8 @@ Training Module - ACE training loop and evaluation
 """
 
 from src.training.trainer import ACETrainer
+from src.training.budget import TrainingBudget
+from src.training.execution_evaluator import ExecutionEvaluator
 
-__all__ = ["ACETrainer"]
+__all__ = ["ACETrainer", "TrainingBudget", "ExecutionEvaluator"]
 
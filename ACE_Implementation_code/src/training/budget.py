@@ -0,0 +1,124 @@
+"""
+Training Budget - Wall-clock, request and token limits for train_offline
+
+TrainingBudget tracks a training run live against optional limits: seconds
+of wall-clock time, generation requests issued by the trainer (failed ones
+included) and tokens (input + output over all calls reported to a
+UsageMeter, embeddings included). From the cost per example so far it
+projects how many more examples the remaining budget covers, so the trainer
+can spend it on the examples that teach the playbook most; see
+prioritize_examples.
+"""
+
+import random
+import time
+from typing import Dict, List, Optional
+from src.models.usage_meter import UsageMeter
+
+# Last-seen outcome ranks: answered wrong first (they yield new insights), then unseen, then correct
+_PRIORITY = {False: 0, None: 1, True: 2}
+
+
+def prioritize_examples(examples: List[Dict], outcomes: Dict[str, bool],
+                        rng: Optional[random.Random] = None) -> List[Dict]:
+    """
+    Examples ordered by the value of spending budget on them
+
+    Examples answered wrong last time come first, then unseen ones, then
+    ones answered correctly; the order within each group is random.
+
+    Args:
+        examples: Training examples
+        outcomes: Last correctness per question
+        rng: Random generator for the order within a group
+    """
+    ordered = list(examples)
+    (rng if rng else random).shuffle(ordered)
+    return sorted(ordered, key=lambda example: _PRIORITY[outcomes.get(example["question"])])
+
+
+class TrainingBudget:
+    """Optional wall-clock, request and token limits, tracked live"""
+
+    def __init__(self, max_seconds: Optional[float] = None, max_requests: Optional[int] = None,
+                 max_tokens: Optional[int] = None, usage_meter: Optional[UsageMeter] = None):
+        """
+        Args:
+            max_seconds: Wall-clock limit from start() (None = unlimited)
+            max_requests: Generation requests the trainer may issue (None = unlimited)
+            max_tokens: Input + output tokens over all metered calls (None = unlimited)
+            usage_meter: Meter the model clients report to (needed for max_tokens)
+        """
+        if max_tokens is not None and usage_meter is None:
+            raise ValueError("A token budget needs the UsageMeter the model clients report to")
+        self.max_seconds = max_seconds
+        self.max_requests = max_requests
+        self.max_tokens = max_tokens
+        self.usage_meter = usage_meter
+        self.requests = 0
+        self.examples = 0
+        self._started = time.monotonic()
+        self._tokens_at_start = self._tokens()
+
+    @property
+    def limited(self) -> bool:
+        return any(limit is not None for limit in (self.max_seconds, self.max_requests, self.max_tokens))
+
+    def start(self):
+        """Start the clock and the request and token counts"""
+        self.requests = 0
+        self.examples = 0
+        self._started = time.monotonic()
+        self._tokens_at_start = self._tokens()
+
+    def charge_request(self):
+        """Count one generation request issued by the trainer"""
+        self.requests += 1
+
+    def charge_example(self):
+        """Count one example attempted (for the cost-per-example projection)"""
+        self.examples += 1
+
+    def used(self) -> Dict:
+        return {
+            "seconds": time.monotonic() - self._started,
+            "requests": self.requests,
+            "tokens": self._tokens() - self._tokens_at_start,
+        }
+
+    def exhausted(self) -> Optional[str]:
+        """Name of the first budget used up, or None while all have room"""
+        used = self.used()
+        for name, limit in (("seconds", self.max_seconds), ("requests", self.max_requests),
+                            ("tokens", self.max_tokens)):
+            if limit is not None and used[name] >= limit:
+                return name
+        return None
+
+    def affordable_examples(self) -> Optional[int]:
+        """Further examples the tightest remaining budget covers at the cost per example so far
+        (None when unlimited or before any example was attempted)"""
+        if not self.limited or not self.examples:
+            return None
+        used = self.used()
+        affordable = []
+        for name, limit in (("seconds", self.max_seconds), ("requests", self.max_requests),
+                            ("tokens", self.max_tokens)):
+            if limit is not None and used[name] > 0:
+                affordable.append(int(max(0.0, limit - used[name]) / (used[name] / self.examples)))
+        return min(affordable) if affordable else None
+
+    def stats(self) -> Dict:
+        """Limits, usage so far and the budget exhausted (if any)"""
+        return {
+            "limits": {"seconds": self.max_seconds, "requests": self.max_requests, "tokens": self.max_tokens},
+            "used": self.used(),
+            "examples": self.examples,
+            "exhausted": self.exhausted(),
+        }
+
+    def _tokens(self) -> int:
+        if not self.usage_meter:
+            return 0
+        totals = self.usage_meter.totals()
+        return totals["input_tokens"] + totals["output_tokens"]
@@ -0,0 +1,285 @@
+"""
+Execution Evaluator - Execution accuracy against local in-memory SQLite
+
+Each example's schema becomes an in-memory SQLite table filled with the
+example's table rows (WikiSQL) or deterministic synthetic rows. Both the
+generated and the gold query run against it and their result multisets are
+compared. Per query, extra rows that satisfy (and narrowly violate) the gold
+WHERE conditions are inserted inside a rolled-back transaction, so filters
+are actually exercised. Everything runs offline.
+"""
+
+import math
+import random
+import re
+import sqlite3
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from src.utils.sql_canonical import KEYWORDS, sql_equal, tokenize_sql
+
+# Same pool tuning as Reflector.analyze_batch
+MIN_ITEMS_PER_WORKER = 64
+CHUNKS_PER_WORKER = 4
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+# Schema names that are also SQL words are quoted only where an identifier can stand
+_SQL_WORDS = KEYWORDS | {"JOIN", "ON", "INNER", "LEFT", "OUTER", "NATURAL", "UNION", "OFFSET",
+                         "CASE", "WHEN", "THEN", "ELSE", "END"}
+_IDENT_BEFORE_RE = re.compile(r"(?:^|[,(=<>]|\b(?:SELECT|DISTINCT|WHERE|AND|OR|NOT|BY|HAVING))\s*$", re.IGNORECASE)
+_IDENT_AFTER_RE = re.compile(
+    r"^\s*(?:$|[,)=<>!]|(?:FROM|ASC|DESC|AND|OR|WHERE|GROUP|ORDER|HAVING|LIMIT|IS|IN|LIKE|BETWEEN|NOT)\b)",
+    re.IGNORECASE,
+)
+_WORDS = ["alpha", "beta", "gamma", "delta", "new york", "london", "sales", "it", "hr", "john"]
+
+
+class _Database:
+    """An in-memory SQLite table built from one schema"""
+
+    def __init__(self, table: str, columns: Sequence[str], rows: Sequence[Sequence], num_rows: int):
+        self.table = table
+        self.columns = list(columns)
+        self.connection = sqlite3.connect(":memory:", isolation_level=None)
+
+        # NUMERIC affinity makes '42' and 42 compare equal (WikiSQL cells are
+        # strings); text compares case-insensitively, as in WikiSQL's evaluation
+        column_defs = ", ".join(f"{_quote(column)} NUMERIC COLLATE NOCASE" for column in self.columns)
+        self.connection.execute(f"CREATE TABLE {_quote(table)} ({column_defs})")
+        self._insert(rows if rows else self._synthetic_rows(num_rows))
+
+        # Raw WikiSQL names (spaces, dots, dashes) are quoted before execution
+        names = sorted({table, *self.columns}, key=len, reverse=True)
+        self._name_re = re.compile(
+            r"(?<![\w.\"])(" + "|".join(re.escape(name) for name in names if name) + r")(?![\w\"])",
+            re.IGNORECASE,
+        )
+        self._canonical_names = {name.lower(): name for name in names}
+
+    def _synthetic_rows(self, num_rows: int) -> List[Tuple]:
+        seed = zlib.crc32("\x1f".join([self.table] + self.columns).encode("utf-8"))
+        rng = random.Random(seed)
+        rows = []
+        for _ in range(num_rows):
+            row = []
+            for _ in self.columns:
+                kind = rng.random()
+                if kind < 0.45:
+                    row.append(rng.randint(0, 100000))
+                elif kind < 0.6:
+                    row.append(round(rng.uniform(0, 1000), 2))
+                else:
+                    row.append(rng.choice(_WORDS))
+            rows.append(tuple(row))
+        return rows
+
+    def _insert(self, rows: Sequence[Sequence]):
+        placeholders = ", ".join("?" for _ in self.columns)
+        self.connection.executemany(
+            f"INSERT INTO {_quote(self.table)} VALUES ({placeholders})",
+            [tuple(row)[:len(self.columns)] for row in rows if len(row) >= len(self.columns)],
+        )
+
+    def quote_names(self, sql: str) -> str:
+        """Quote schema names outside string literals"""
+        parts = []
+        last = 0
+        for literal in _STRING_LITERAL_RE.finditer(sql):
+            parts.append(self._quote_segment(sql[last:literal.start()]))
+            parts.append(literal.group())
+            last = literal.end()
+        parts.append(self._quote_segment(sql[last:]))
+        return "".join(parts)
+
+    def _quote_segment(self, segment: str) -> str:
+        def quote(match) -> str:
+            before, after = segment[:match.start()], segment[match.end():]
+            if after.lstrip().startswith("("):
+                return match.group()  # function call
+            if match.group(1).upper() in _SQL_WORDS and not (
+                    _IDENT_BEFORE_RE.search(before) and _IDENT_AFTER_RE.match(after)):
+                return match.group()  # keyword, e.g. ORDER in ORDER BY with a column named Order
+            return _quote(self._canonical_names[match.group(1).lower()])
+
+        return self._name_re.sub(quote, segment)
+
+    def probe_rows(self, gold_sql: str) -> List[Tuple]:
+        """Rows that satisfy the gold WHERE conditions, plus one violating each condition"""
+        conditions = _where_conditions(gold_sql, self.columns)
+        if not conditions:
+            return []
+
+        rng = random.Random(zlib.crc32(gold_sql.encode("utf-8")))
+        rows = []
+        # The two satisfying rows fall on either side of a <> literal
+        for below, template in zip((False, True), self._synthetic_rows(2)):
+            row = list(template)
+            for index, op, value in conditions:
+                row[index] = _satisfying(op, value, below)
+            rows.append(tuple(row))
+
+        for index, op, value in conditions:
+            row = list(rows[0])
+            row[index] = _violating(op, value, rng)
+            rows.append(tuple(row))
+        return rows
+
+    def run(self, sql: str, extra_rows: List[Tuple]) -> Optional[Counter]:
+        """Execute a query (with extra rows visible) and return its result multiset, or None on error"""
+        self.connection.execute("BEGIN")
+        try:
+            if extra_rows:
+                self._insert(extra_rows)
+            cursor = self.connection.execute(self.quote_names(sql))
+            return Counter(tuple(_normalize_value(value) for value in row) for row in cursor.fetchall())
+        except sqlite3.Error:
+            return None
+        finally:
+            self.connection.execute("ROLLBACK")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _normalize_value(value):
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        return round(value, 6)
+    if isinstance(value, str):
+        return value.lower()
+    return value
+
+
+def _literal_value(kind: str, value: str):
+    if kind == "NUM":
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return value[1:-1].replace("''", "'")
+
+
+def _where_conditions(sql: str, columns: Sequence[str]) -> List[Tuple[int, str, object]]:
+    """(column index, operator, literal) for `column op literal` conditions in the WHERE clause"""
+    lowered = {column.lower(): i for i, column in enumerate(columns)}
+    tokens = tokenize_sql(sql)
+    try:
+        start = tokens.index(("KW", "WHERE")) + 1
+    except ValueError:
+        return []
+
+    conditions = []
+    for i in range(start, len(tokens)):
+        kind, value = tokens[i]
+        if kind != "OP" or i + 1 >= len(tokens) or tokens[i + 1][0] not in ("NUM", "STR"):
+            continue
+        # The column name may span several tokens (WikiSQL headers contain spaces)
+        j = i
+        while j > start and tokens[j - 1][0] == "IDENT":
+            j -= 1
+        name = " ".join(v for _, v in tokens[j:i])
+        if name in lowered:
+            conditions.append((lowered[name], value, _literal_value(*tokens[i + 1])))
+    return conditions
+
+
+def _satisfying(op: str, value, below: bool = False):
+    if op in ("=", "<=", ">="):
+        return value
+    below = op == "<" or (op == "<>" and below)
+    if isinstance(value, str):
+        # A longer string with the same prefix sorts after it, a proper prefix before it
+        return value[:-1] if below and value else value + " " + _WORDS[0]
+    return value - 1 if below else value + 1
+
+
+def _violating(op: str, value, rng: random.Random):
+    if op == "<>":
+        return value
+    if isinstance(value, str):
+        return value[:-1] if op in (">", ">=") else value + " " + rng.choice(_WORDS)
+    if op in (">", ">="):
+        return value - 1
+    return value + 1
+
+
+# Per-process LRU of prepared databases, keyed by schema (and table rows)
+_DATABASES: "OrderedDict[Tuple, _Database]" = OrderedDict()
+_DATABASE_CACHE_SIZE = 256
+
+
+def _database(schema: Dict, rows: Sequence[Sequence], num_rows: int) -> _Database:
+    table = (schema.get("tables") or ["table"])[0]
+    columns = tuple(schema.get("columns") or [])
+    key = (table, columns, hash(tuple(tuple(row) for row in rows)) if rows else None, num_rows)
+
+    database = _DATABASES.get(key)
+    if database is None:
+        database = _Database(table, columns, rows, num_rows)
+        _DATABASES[key] = database
+        if len(_DATABASES) > _DATABASE_CACHE_SIZE:
+            _DATABASES.popitem(last=False)[1].connection.close()
+    else:
+        _DATABASES.move_to_end(key)
+    return database
+
+
+def _execution_match(item: Tuple[str, str, Dict, Sequence[Sequence], int]) -> bool:
+    """Worker entry point: compare one (generated, gold, schema, rows, num_rows) pair"""
+    generated_sql, gold_sql, schema, rows, num_rows = item
+    if sql_equal(generated_sql, gold_sql):
+        return True
+
+    try:
+        database = _database(schema, rows, num_rows)
+    except sqlite3.Error:
+        return False
+
+    probes = database.probe_rows(gold_sql)
+    gold = database.run(gold_sql, probes)
+    if gold is None:
+        # Gold query is not executable here: only the canonical comparison can decide
+        return False
+    return database.run(generated_sql, probes) == gold
+
+
+class ExecutionEvaluator:
+    """Execution-accuracy evaluator over local in-memory SQLite tables"""
+
+    def __init__(self, num_rows: int = 20, workers: int = 1):
+        """
+        Initialize the evaluator
+
+        Args:
+            num_rows: Synthetic rows per table when an example has no table rows
+            workers: Processes used by evaluate_batch (1 = evaluate in this process)
+        """
+        self.num_rows = num_rows
+        self.workers = workers
+
+    def is_match(self, generated_sql: str, example: Dict) -> bool:
+        """Check whether the generated query returns the same rows as the example's gold SQL"""
+        return _execution_match(self._item(generated_sql, example))
+
+    def evaluate_batch(self, generated: List[str], examples: List[Dict]) -> List[bool]:
+        """
+        Execution matches for many examples, in order
+
+        Args:
+            generated: Generated SQL per example
+            examples: Examples with "sql", "schema" and optional "table_rows"
+
+        Returns:
+            One boolean per example
+        """
+        items = [self._item(sql, example) for sql, example in zip(generated, examples)]
+        if self.workers <= 1 or len(items) < self.workers * MIN_ITEMS_PER_WORKER:
+            return [_execution_match(item) for item in items]
+
+        chunksize = max(MIN_ITEMS_PER_WORKER, math.ceil(len(items) / (self.workers * CHUNKS_PER_WORKER)))
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(_execution_match, items, chunksize=chunksize))
+
+    def _item(self, generated_sql: str, example: Dict):
+        return (generated_sql, example["sql"], example["schema"], example.get("table_rows") or [], self.num_rows)
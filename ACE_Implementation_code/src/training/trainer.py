@@ -2,20 +2,30 @@
 ACE Trainer - Main training loop for ACE
 """
 
+import json
 import random
-from typing import List, Dict
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple, Union
 from src.components.playbook import Playbook
 from src.components.generator import Generator
 from src.components.reflector import Reflector
 from src.components.curator import Curator
+from src.models.base_llm import LLMRequestError
+from src.models.usage_meter import UsageMeter
 from src.data.dataset import WikiSQLDataset
+from src.training.budget import TrainingBudget, prioritize_examples
+from src.training.execution_evaluator import ExecutionEvaluator
+from src.utils.sql_canonical import sql_equal
 
 
 class ACETrainer:
     """Main training loop for ACE"""
     
     def __init__(self, dataset: WikiSQLDataset, generator: Generator = None, 
-                 playbook: Playbook = None, embedding_service=None):
+                 playbook: Playbook = None, embedding_service=None,
+                 curator: Curator = None, reflector: Reflector = None,
+                 execution_evaluator: ExecutionEvaluator = None,
+                 usage_meter: UsageMeter = None):
         """
         Initialize ACE trainer
         
@@ -24,22 +34,35 @@ class ACETrainer:
             generator: Custom generator (optional)
             playbook: Custom playbook (optional)
             embedding_service: Embedding service for semantic search (optional)
+            curator: Custom curator (optional)
+            reflector: Custom reflector (optional)
+            execution_evaluator: Also report execution accuracy in evaluate() (optional)
+            usage_meter: Meter shared with the LLM and embeddings; calls are
+                attributed to "epoch_<n>" and "evaluation" (optional)
         """
         self.dataset = dataset
         self.playbook = playbook if playbook else Playbook()
         self.generator = generator if generator else Generator(use_mock_llm=True)
-        self.reflector = Reflector()
-        self.curator = Curator()
+        self.reflector = reflector if reflector else Reflector()
+        self.curator = curator if curator else Curator()
         self.embedding_service = embedding_service
+        self.execution_evaluator = execution_evaluator
+        self.usage_meter = usage_meter
         
         self.metrics = {
             "accuracy_history": [],
             "playbook_size_history": [],
+            "usage_history": [],
+            "accuracy_gain_per_1k_tokens": [],
             "epoch_results": []
         }
+        # Last correctness per training question (drives budget prioritization)
+        self.outcomes: Dict[str, bool] = {}
     
     def train_offline(self, train_data: List[Dict], num_epochs: int = 10, 
-                      target_accuracy: float = 80.0) -> Playbook:
+                      target_accuracy: float = 80.0, batch_size: int = 1,
+                      reflection_workers: int = 1, budget: Optional[TrainingBudget] = None,
+                      checkpoint_path: Union[str, Path, None] = None) -> Playbook:
         """
         Offline training: Multiple epochs over training data
         
@@ -47,6 +70,16 @@ class ACETrainer:
             train_data: List of training examples
             num_epochs: Maximum number of training epochs
             target_accuracy: Stop training if accuracy exceeds this threshold
+            batch_size: Examples per curation mini-batch. With 1, each example's
+                updates are applied immediately; otherwise reflections are curated
+                together and applied as one delta at each mini-batch boundary.
+            reflection_workers: Processes used to analyze each mini-batch
+            budget: Wall-clock, request and token limits. When the remaining
+                budget does not cover an epoch, examples answered wrong last
+                time go first, then unseen ones; training stops as soon as a
+                budget is used up.
+            checkpoint_path: Where to save a checkpoint (see save_checkpoint)
+                when a budget is used up
         
         Returns:
             Trained playbook
@@ -54,30 +87,91 @@ class ACETrainer:
         print(f"=" * 60)
         print(f"ACE OFFLINE TRAINING - Max {num_epochs} epochs on {len(train_data)} examples")
         print(f"Target Accuracy: {target_accuracy}%")
+        if budget and budget.limited:
+            limits = budget.stats()["limits"]
+            print("Budget: " + ", ".join(f"{limit} {name}" for name, limit in limits.items() if limit is not None))
         print(f"=" * 60)
         
-        for epoch in range(num_epochs):
+        if budget:
+            budget.start()
+        exhausted = None
+        # Epochs restored from a checkpoint keep their numbers
+        first_epoch = len(self.metrics["accuracy_history"])
+        total = len(train_data)
+        for epoch in range(first_epoch, first_epoch + num_epochs):
+            exhausted = budget.exhausted() if budget else None
+            if exhausted:
+                print(f"\n  ⏹  {exhausted.capitalize()} budget used up before epoch {epoch + 1}")
+                break
+            
             print(f"\n{'='*60}")
-            print(f"EPOCH {epoch + 1}/{num_epochs}")
+            print(f"EPOCH {epoch + 1}/{first_epoch + num_epochs}")
             print(f"{'='*60}")
+            if self.usage_meter:
+                self.usage_meter.set_phase(f"epoch_{epoch + 1}")
             
             correct = 0
-            total = len(train_data)
+            scored = 0
+            skipped = 0
+            # Change in correctness on examples also scored in an earlier epoch
+            rescored = 0
+            rescored_gain = 0
             
             # Shuffle data each epoch
             random.shuffle(train_data)
+            pending_attempts = []
             
-            for idx, example in enumerate(train_data):
+            # Examples whose request fails are re-queued at the end of the epoch
+            queue = list(train_data)
+            affordable = budget.affordable_examples() if budget else None
+            if affordable is not None and affordable < total:
+                queue = prioritize_examples(train_data, self.outcomes)
+                wrong = sum(1 for example in train_data if self.outcomes.get(example["question"]) is False)
+                print(f"  Budget covers ~{affordable}/{total} examples: "
+                      f"{wrong} answered wrong last time go first, then unseen ones")
+            requeues = {}
+            
+            for example in queue:
+                exhausted = budget.exhausted() if budget else None
+                if exhausted:
+                    print(f"  ⏹  {exhausted.capitalize()} budget used up after {scored + skipped}/{total} examples")
+                    break
+                
                 # Generate SQL
-                generated_sql, used_bullets = self.generator.generate_sql(
-                    example["question"],
-                    example["schema"],
-                    self.playbook
-                )
+                if budget:
+                    budget.charge_request()
+                    if id(example) not in requeues:
+                        budget.charge_example()
+                try:
+                    # No cascade: local rule answers would credit bullets and reflections
+                    # with SQL the playbook had no part in
+                    generated_sql, used_bullets = self.generator.generate_sql(
+                        example["question"],
+                        example["schema"],
+                        self.playbook,
+                        use_cascade=False
+                    )
+                except LLMRequestError as e:
+                    attempts = requeues.get(id(example), 0)
+                    if attempts < self.generator.max_requeues:
+                        requeues[id(example)] = attempts + 1
+                        queue.append(example)
+                        print(f"  ↻ Re-queued after failed request: {e}")
+                    else:
+                        skipped += 1
+                        print(f"  ⚠️  Skipped (not scored) after failed request: {e}")
+                    continue
                 
                 # Check if correct
                 correct_sql = example["sql"]
-                is_correct = generated_sql.strip().lower() == correct_sql.strip().lower()
+                is_correct = sql_equal(generated_sql, correct_sql)
+                scored += 1
+                self.generator.record_outcome(example["question"], correct_sql, is_correct)
+                previous = self.outcomes.get(example["question"])
+                if previous is not None:
+                    rescored += 1
+                    rescored_gain += is_correct - previous
+                self.outcomes[example["question"]] = is_correct
                 
                 if is_correct:
                     correct += 1
@@ -89,50 +183,69 @@ class ACETrainer:
                     else:
                         self.playbook.update_bullet_feedback(bullet_id, is_helpful=False)
                 
-                # Reflect on the attempt
-                reflection = self.reflector.analyze(
-                    example["question"],
-                    generated_sql,
-                    correct_sql,
-                    is_correct
-                )
-                
-                # Generate playbook updates
-                updates = self.curator.generate_updates(reflection, self.playbook)
-                
-                # Debug: Show what's happening
-                if not is_correct:
-                    error_id = reflection.get("error_identification", "Unknown")
-                    key_insight = reflection.get("key_insight", "")
-                    print(f"    [Q: {example['question'][:40]}...]")
-                    print(f"    [Gen: {generated_sql[:60].replace(chr(10), ' ')}...]")
-                    print(f"    [Exp: {correct_sql[:60]}...]")
-                    print(f"    [Reflection: {error_id[:50]}...]")
-                    if key_insight and "semantically correct" not in key_insight:
-                        print(f"    [Insight: {key_insight[:80]}...]")
-                    if not updates:
-                        print(f"    [No updates - insight skipped or duplicate]")
-                
-                # Apply updates
-                for update in updates:
-                    if update["type"] == "ADD":
-                        self.playbook.add_bullet(update["section"], update["content"])
-                        print(f"  [+] Added to {update['section']}: {update['content'][:80]}...")
+                # Reflect and curate (deferred to the batch boundary in mini-batch mode)
+                if batch_size > 1:
+                    pending_attempts.append((example, generated_sql, is_correct))
+                    if len(pending_attempts) == batch_size:
+                        self._reflect_and_curate_batch(pending_attempts, reflection_workers)
+                        pending_attempts = []
+                else:
+                    reflection = self.reflector.analyze(
+                        example["question"],
+                        generated_sql,
+                        correct_sql,
+                        is_correct
+                    )
+                    updates = self.curator.generate_updates(reflection, self.playbook)
+                    self._print_reflection(example, generated_sql, is_correct, reflection, updates)
+                    self._apply_updates(updates)
                 
                 # Progress
-                if (idx + 1) % 5 == 0 or idx == 0:
-                    accuracy = correct / (idx + 1) * 100
-                    print(f"  Progress: {idx + 1}/{total} | Accuracy: {accuracy:.1f}% | Playbook size: {len(self.playbook.bullets)}")
+                if scored % 5 == 0 or scored == 1:
+                    accuracy = correct / scored * 100
+                    print(f"  Progress: {scored}/{total} | Accuracy: {accuracy:.1f}% | Playbook size: {len(self.playbook.bullets)}")
+            
+            if pending_attempts:
+                self._reflect_and_curate_batch(pending_attempts, reflection_workers)
             
-            # Epoch summary
-            epoch_accuracy = correct / total * 100
+            # Epoch summary (examples that could not be generated are not scored)
+            if not scored:
+                print(f"\n  EPOCH {epoch + 1}: no examples scored, not recorded")
+                if exhausted:
+                    break
+                continue
+            epoch_accuracy = correct / scored * 100
             self.metrics["accuracy_history"].append(epoch_accuracy)
             self.metrics["playbook_size_history"].append(len(self.playbook.bullets))
+            gain_per_1k = None
+            if self.usage_meter:
+                epoch_usage = self.usage_meter.phase_totals(f"epoch_{epoch + 1}")
+                self.metrics["usage_history"].append(epoch_usage)
+                tokens = epoch_usage["input_tokens"] + epoch_usage["output_tokens"]
+                if rescored and tokens:
+                    # Measured on the same examples, so partial or prioritized epochs compare fairly
+                    gain = rescored_gain / rescored * 100
+                    gain_per_1k = gain / tokens * 1000
+            self.metrics["accuracy_gain_per_1k_tokens"].append(gain_per_1k)
             
             print(f"\n  EPOCH {epoch + 1} SUMMARY:")
-            print(f"    Accuracy: {epoch_accuracy:.1f}% ({correct}/{total})")
+            print(f"    Accuracy: {epoch_accuracy:.1f}% ({correct}/{scored})")
+            if skipped:
+                print(f"    Skipped after failed requests: {skipped}")
             print(f"    Playbook size: {len(self.playbook.bullets)} bullets")
             print(f"    By section: {self.playbook.get_stats()['by_section']}")
+            cache_stats = self.reflector.cache_stats()
+            print(f"    Reflection cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+            if self.usage_meter and self.metrics["usage_history"][-1]["calls"]:
+                self._print_usage(self.metrics["usage_history"][-1])
+                if gain_per_1k is not None:
+                    print(f"    Accuracy gained per 1k tokens: {gain_per_1k:+.3f} points")
+            if budget and budget.limited:
+                used = budget.used()
+                print(f"    Budget used: {used['seconds']:.1f}s, {used['requests']} requests, {used['tokens']} tokens")
+            
+            if exhausted:
+                break
             
             # Early stopping if target accuracy reached
             if epoch_accuracy > target_accuracy:
@@ -142,8 +255,93 @@ class ACETrainer:
                 print(f"{'='*60}")
                 break
         
+        if exhausted and checkpoint_path:
+            self.save_checkpoint(checkpoint_path, reason=f"{exhausted} budget used up", budget=budget)
+        self.reflector.close()
+        if budget:
+            self.metrics["budget"] = budget.stats()
         return self.playbook
     
+    def save_checkpoint(self, path: Union[str, Path], reason: str = "",
+                        budget: Optional[TrainingBudget] = None):
+        """
+        Save the playbook, metrics and per-question outcomes as JSON
+        
+        The bullets use the playbook.json format; load_checkpoint continues
+        training from this state.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        checkpoint = {
+            "reason": reason,
+            "epochs": len(self.metrics["accuracy_history"]),
+            "budget": budget.stats() if budget else None,
+            "metrics": self.metrics,
+            "outcomes": self.outcomes,
+            "playbook": {
+                "bullets": [bullet.to_dict() for bullet in self.playbook.bullets],
+                "stats": self.playbook.get_stats(),
+            },
+        }
+        with open(path, "w") as f:
+            json.dump(checkpoint, f, indent=2)
+        print(f"  ✓ Checkpoint saved to {path} ({reason or 'on request'})")
+    
+    def load_checkpoint(self, path: Union[str, Path]):
+        """Restore the playbook, metrics and outcomes saved by save_checkpoint into an empty trainer"""
+        with open(path) as f:
+            checkpoint = json.load(f)
+        self.playbook.restore(checkpoint["playbook"]["bullets"])
+        self.metrics.update(checkpoint["metrics"])
+        self.outcomes = dict(checkpoint["outcomes"])
+        print(f"  ✓ Resumed from {path}: {checkpoint['epochs']} epochs, "
+              f"{len(self.playbook.bullets)} bullets")
+    
+    def _reflect_and_curate_batch(self, attempts: List[Tuple[Dict, str, bool]], workers: int):
+        """Reflect on a mini-batch of (example, generated_sql, is_correct) attempts and apply one delta"""
+        reflections = self.reflector.analyze_batch(
+            [(example["question"], generated_sql, example["sql"], is_correct)
+             for example, generated_sql, is_correct in attempts],
+            workers=workers
+        )
+        for (example, generated_sql, is_correct), reflection in zip(attempts, reflections):
+            self._print_reflection(example, generated_sql, is_correct, reflection)
+        
+        updates = self.curator.generate_updates_batch(reflections, self.playbook)
+        added = sum(1 for update in updates if update["type"] == "ADD")
+        print(f"  [Batch] {len(reflections)} reflections -> {added} new bullets")
+        self._apply_updates(updates)
+    
+    @staticmethod
+    def _print_usage(usage: Dict):
+        """Token, wall-time and cost summary of a phase"""
+        print(f"    Model calls: {usage['calls']} | Tokens: {usage['input_tokens']} in "
+              f"({usage['cached_ratio']:.0%} cached), {usage['output_tokens']} out | "
+              f"{usage['avg_input_tokens']:.0f} in/call, {usage['avg_seconds']:.2f}s/call | "
+              f"Cost: ${usage['cost']:.4f}")
+    
+    def _print_reflection(self, example: Dict, generated_sql: str, is_correct: bool,
+                          reflection: Dict, updates: List[Dict] = None):
+        """Debug: Show what's happening (once per distinct failed attempt)"""
+        if is_correct or reflection.get("cached"):
+            return
+        
+        error_id = reflection.get("error_identification", "Unknown")
+        key_insight = reflection.get("key_insight", "")
+        print(f"    [Q: {example['question'][:40]}...]")
+        print(f"    [Gen: {generated_sql[:60].replace(chr(10), ' ')}...]")
+        print(f"    [Exp: {example['sql'][:60]}...]")
+        print(f"    [Reflection: {error_id[:50]}...]")
+        if key_insight and "semantically correct" not in key_insight:
+            print(f"    [Insight: {key_insight[:80]}...]")
+        if updates == []:
+            print(f"    [No updates - insight skipped or duplicate]")
+    
+    def _apply_updates(self, updates: List[Dict]):
+        """Apply curator operations to the playbook"""
+        for bullet in self.playbook.apply_updates(updates):
+            print(f"  [+] Added to {bullet.section}: {bullet.content[:80]}...")
+    
     def evaluate(self, test_data: List[Dict]) -> Dict:
         """
         Evaluate on test data
@@ -156,18 +354,31 @@ class ACETrainer:
         print(f"{'='*60}\n")
         
         correct = 0
-        total = len(test_data)
         results = []
+        scored_examples = []
+        skipped = 0
+        if self.usage_meter:
+            self.usage_meter.set_phase("evaluation")
         
-        for idx, example in enumerate(test_data):
-            generated_sql, used_bullets = self.generator.generate_sql(
-                example["question"],
-                example["schema"],
-                self.playbook
-            )
+        # Generate all test queries against the same playbook, scoring each
+        # answer as it arrives (batch-job answers stream in completion order)
+        generations = self.generator.iter_batch(
+            [example["question"] for example in test_data],
+            [example["schema"] for example in test_data],
+            self.playbook
+        )
+        
+        for idx, generated_sql, used_bullets in generations:
+            example = test_data[idx]
+            if generated_sql is None:
+                # Request failed even after re-queuing: not scored as wrong
+                skipped += 1
+                continue
+            scored_examples.append(example)
             
             correct_sql = example["sql"]
-            is_correct = generated_sql.strip().lower() == correct_sql.strip().lower()
+            is_correct = sql_equal(generated_sql, correct_sql)
+            self.generator.record_outcome(example["question"], correct_sql, is_correct)
             
             if is_correct:
                 correct += 1
@@ -194,16 +405,38 @@ class ACETrainer:
                 print(f"  Correct: {correct_sql}")
                 print(f"  Result: {'✓ CORRECT' if is_correct else '✗ WRONG'}\n")
         
-        accuracy = correct / total * 100
+        total = len(results)
+        accuracy = correct / total * 100 if total else 0.0
         
         print(f"{'='*60}")
         print(f"FINAL TEST ACCURACY: {accuracy:.1f}% ({correct}/{total})")
-        print(f"{'='*60}\n")
+        if skipped:
+            print(f"SKIPPED AFTER FAILED REQUESTS: {skipped}")
         
-        return {
+        evaluation = {
             "accuracy": accuracy,
             "correct": correct,
             "total": total,
+            "skipped": skipped,
             "results": results
         }
+        
+        if self.execution_evaluator:
+            matches = self.execution_evaluator.evaluate_batch(
+                [result["generated"] for result in results], scored_examples
+            )
+            for result, match in zip(results, matches):
+                result["execution_match"] = match
+            execution_correct = sum(matches)
+            evaluation["execution_accuracy"] = execution_correct / total * 100 if total else 0.0
+            evaluation["execution_correct"] = execution_correct
+            print(f"EXECUTION ACCURACY: {evaluation['execution_accuracy']:.1f}% ({execution_correct}/{total})")
+        
+        if self.usage_meter:
+            evaluation["usage"] = self.usage_meter.phase_totals("evaluation")
+            if evaluation["usage"]["calls"]:
+                self._print_usage(evaluation["usage"])
+        print(f"{'='*60}\n")
+        
+        return evaluation
 
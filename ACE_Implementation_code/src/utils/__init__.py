@@ -0,0 +1,11 @@
+"""
+Utilities - Shared helpers used across ACE components
+"""
+
+from src.utils.mock_sql import classify_question, question_intent, rule_sql
+from src.utils.sql_canonical import canonicalize_sql, canonical_sql_text, sql_equal, tokenize_sql
+
+__all__ = [
+    "classify_question", "question_intent", "rule_sql",
+    "canonicalize_sql", "canonical_sql_text", "sql_equal", "tokenize_sql",
+]
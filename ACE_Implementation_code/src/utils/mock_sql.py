@@ -0,0 +1,100 @@
+"""
+Mock SQL - Compiled rule-based SQL generation shared by the mock generators
+
+Intents, their keyword needles and SQL templates live in one priority-ordered
+table, flattened at import into a single needle list. A question is lowercased
+once, the first needle it contains picks the intent and the intent's template
+is filled from the schema, producing exactly the SQL of the original if/elif
+rules.
+"""
+
+import re
+from typing import Callable, Dict, List, Sequence, Tuple
+
+_NUMBER_RE = re.compile(r"\d+")
+
+# render(question, table, columns) -> SQL
+Template = Callable[[str, str, Sequence[str]], str]
+
+
+def _aggregate(function: str, default: str) -> Template:
+    def render(question, table, columns):
+        return f"SELECT {function}({columns[0] if columns else default}) FROM {table}"
+    return render
+
+
+def _compare(operator: str, default: str) -> Template:
+    def render(question, table, columns):
+        number = _NUMBER_RE.search(question)
+        value = number.group() if number else "100"
+        return f"SELECT * FROM {table} WHERE {columns[0] if columns else default} {operator} {value}"
+    return render
+
+
+def _count(question, table, columns):
+    return f"SELECT COUNT(*) FROM {table}"
+
+
+def _group_by(question, table, columns):
+    col1 = columns[0] if len(columns) > 0 else "category"
+    col2 = columns[1] if len(columns) > 1 else "amount"
+    return f"SELECT {col1}, SUM({col2}) FROM {table} GROUP BY {col1}"
+
+
+def _select_all(question, table, columns):
+    return f"SELECT * FROM {table}"
+
+
+# (intent, needles, template), in priority order
+INTENT_TEMPLATES: Tuple[Tuple[str, Tuple[str, ...], Template], ...] = (
+    ("count", ("count", "how many"), _count),
+    ("sum", ("sum", "total"), _aggregate("SUM", "amount")),
+    ("average", ("average", "avg"), _aggregate("AVG", "price")),
+    ("max", ("maximum", "max"), _aggregate("MAX", "value")),
+    ("greater", ("greater than", "more than"), _compare(">", "value")),
+    ("less", ("less than",), _compare("<", "price")),
+    ("group", ("group by", "by"), _group_by),
+)
+FALLBACK_INTENT = ("select", (), _select_all)
+
+# Needles flattened in priority order: the first one contained in a question
+# decides its intent. CPython's substring search beats an alternation regex
+# (or a pure-Python automaton) here because the scan stops at the first hit.
+_NEEDLES = tuple((needle, intent) for intent in INTENT_TEMPLATES for needle in intent[1])
+
+
+def classify_question(question: str) -> Tuple[str, Tuple[str, ...], Template]:
+    """The INTENT_TEMPLATES entry of a question (FALLBACK_INTENT when no rule applies)"""
+    question_lower = question.lower()
+    for needle, intent in _NEEDLES:
+        if needle in question_lower:
+            return intent
+    return FALLBACK_INTENT
+
+
+def question_intent(question: str) -> str:
+    """Name of a question's intent"""
+    return classify_question(question)[0]
+
+
+def rule_sql(question: str, schema: Dict) -> str:
+    """Rule-based SQL for one question"""
+    return classify_question(question)[2](
+        question, schema.get("tables", ["table"])[0], schema.get("columns", ["*"])
+    )
+
+
+def generate_batch(questions: Sequence[str], schemas: Sequence[Dict]) -> List[str]:
+    """Rule-based SQL for many questions, in order (same output as rule_sql per item)"""
+    needles = _NEEDLES
+    results = []
+    append = results.append
+    for question, schema in zip(questions, schemas):
+        question_lower = question.lower()
+        for needle, intent in needles:
+            if needle in question_lower:
+                break
+        else:
+            intent = FALLBACK_INTENT
+        append(intent[2](question, schema.get("tables", ["table"])[0], schema.get("columns", ["*"])))
+    return results
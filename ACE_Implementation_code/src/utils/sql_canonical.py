@@ -0,0 +1,216 @@
+"""
+SQL Canonicalization - Tokenizer and canonical form for the WikiSQL subset
+
+Covers SELECT (with aggregates), FROM, WHERE, GROUP BY, HAVING, ORDER BY and
+LIMIT. The canonical form is insensitive to whitespace, keyword and identifier
+case, identifier quoting, clause order and the order of AND-ed WHERE
+conditions, and it is hashable so it can be compared, cached and used as a
+dictionary key. Results are memoized per raw SQL string.
+
+String literals are case-folded by default (fold_literal_case=True), which
+keeps the exact-match semantics of the original lower()-based comparison:
+WHERE name = 'Alice' equals WHERE name = 'ALICE'. Pass
+fold_literal_case=False to compare literals exactly.
+"""
+
+import re
+from functools import lru_cache
+from typing import Tuple
+
+# (kind, value) where kind is one of KW, IDENT, STR, NUM, OP, PUNCT
+Token = Tuple[str, str]
+# ((clause, (token, ...)), ...) in canonical clause order
+CanonicalSQL = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+_CACHE_SIZE = 65536
+
+KEYWORDS = frozenset({
+    "SELECT", "FROM", "WHERE", "GROUP", "BY", "HAVING", "ORDER", "LIMIT",
+    "AND", "OR", "NOT", "AS", "ASC", "DESC", "DISTINCT", "IN", "LIKE",
+    "BETWEEN", "IS", "NULL", "COUNT", "SUM", "AVG", "MIN", "MAX",
+})
+
+# Clause keywords in canonical output order
+CLAUSE_ORDER = ("SELECT", "FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT")
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<str>'(?:[^']|'')*')
+  | (?P<qident>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<num>\d+(?:\.\d+)?(?![^\s,()'"`;=<>!*]))
+  | (?P<op><=|>=|<>|!=|=|<|>)
+  | (?P<punct>[(),*;])
+  | (?P<word>[^\s,()'"`;=<>!*\[]+)
+""", re.VERBOSE)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def tokenize_sql(sql: str, fold_literal_case: bool = True) -> Tuple[Token, ...]:
+    """
+    Tokenize a SQL string
+
+    Identifiers may contain characters WikiSQL uses in raw column and table
+    names (dots, dashes, slashes). Keywords are uppercased, identifiers
+    lowercased, and identifier quotes are normalized away.
+
+    Args:
+        sql: Raw SQL string
+        fold_literal_case: Lowercase string literals too
+
+    Returns:
+        Tuple of (kind, value) tokens
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "ws":
+            continue
+        if kind == "str":
+            tokens.append(("STR", value.lower() if fold_literal_case else value))
+        elif kind == "qident":
+            tokens.append(("IDENT", value[1:-1].replace('""', '"').lower()))
+        elif kind == "num":
+            tokens.append(("NUM", _normalize_number(value)))
+        elif kind == "op":
+            tokens.append(("OP", "<>" if value == "!=" else value))
+        elif kind == "punct":
+            if value != ";":
+                tokens.append(("PUNCT", value))
+        elif value.upper() in KEYWORDS:
+            tokens.append(("KW", value.upper()))
+        else:
+            tokens.append(("IDENT", value.lower()))
+    return tuple(tokens)
+
+
+def _normalize_number(value: str) -> str:
+    """Drop insignificant fractional zeros ("50000.0" -> "50000")"""
+    if "." in value:
+        value = value.rstrip("0").rstrip(".")
+    return value or "0"
+
+
+def _split_clauses(tokens: Tuple[Token, ...]):
+    """Split top-level tokens into {clause: [token values]}; None if not a SELECT"""
+    clauses = {}
+    current = None
+    depth = 0
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == "PUNCT" and value == "(":
+            depth += 1
+        elif kind == "PUNCT" and value == ")":
+            depth -= 1
+
+        clause = None
+        if depth == 0 and kind == "KW":
+            if value in ("SELECT", "FROM", "WHERE", "HAVING", "LIMIT"):
+                clause = value
+            elif value in ("GROUP", "ORDER") and i + 1 < len(tokens) and tokens[i + 1] == ("KW", "BY"):
+                clause = f"{value} BY"
+                i += 1
+
+        if clause is not None:
+            if clause in clauses:
+                return None
+            current = clauses[clause] = []
+        elif current is None:
+            return None
+        else:
+            current.append(value)
+        i += 1
+
+    return clauses if "SELECT" in clauses else None
+
+
+def _canonical_conditions(values):
+    """Sort AND-ed conditions when the clause is a plain conjunction"""
+    if "OR" in values or "(" in values:
+        return tuple(values)
+
+    conditions, current = [], []
+    between = False
+    for value in values:
+        if value == "AND" and not between:
+            conditions.append(tuple(current))
+            current = []
+        else:
+            # The AND of BETWEEN x AND y belongs to its condition
+            if value == "AND":
+                between = False
+            elif value == "BETWEEN":
+                between = True
+            current.append(value)
+    conditions.append(tuple(current))
+
+    ordered = []
+    for index, condition in enumerate(sorted(conditions)):
+        if index:
+            ordered.append("AND")
+        ordered.extend(condition)
+    return tuple(ordered)
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def canonicalize_sql(sql: str, fold_literal_case: bool = True) -> CanonicalSQL:
+    """
+    Canonical, hashable form of a SQL query
+
+    Queries that do not parse as a single SELECT fall back to their token
+    sequence under a "RAW" clause, so comparison still ignores whitespace,
+    case and quoting.
+
+    Args:
+        sql: Raw SQL string
+        fold_literal_case: Compare string literals case-insensitively
+
+    Returns:
+        Tuple of (clause, tokens) pairs in canonical clause order
+    """
+    tokens = tokenize_sql(sql, fold_literal_case)
+    clauses = _split_clauses(tokens)
+    if clauses is None:
+        return (("RAW", tuple(value for _, value in tokens)),)
+
+    canonical = []
+    for clause in CLAUSE_ORDER:
+        if clause in clauses:
+            values = clauses[clause]
+            if clause in ("WHERE", "HAVING"):
+                values = _canonical_conditions(values)
+            canonical.append((clause, tuple(values)))
+    return tuple(canonical)
+
+
+def _join(values) -> str:
+    """Join token values with SQL-style spacing"""
+    text = ""
+    for value in values:
+        if not text or text.endswith("(") or value in (")", ","):
+            text += value
+        elif value == "(" and text.split(" ")[-1] in ("COUNT", "SUM", "AVG", "MIN", "MAX"):
+            text += value
+        else:
+            text += " " + value
+    return text
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def canonical_sql_text(sql: str) -> str:
+    """Render the canonical form of a SQL query as a single-line string"""
+    parts = []
+    for clause, values in canonicalize_sql(sql):
+        body = _join(values)
+        if clause == "RAW":
+            parts.append(body)
+        else:
+            parts.append(f"{clause} {body}" if body else clause)
+    return " ".join(parts)
+
+
+def sql_equal(sql1: str, sql2: str, fold_literal_case: bool = True) -> bool:
+    """Check whether two SQL strings have the same canonical form (see fold_literal_case above)"""
+    return sql1 == sql2 or \
+        canonicalize_sql(sql1, fold_literal_case) == canonicalize_sql(sql2, fold_literal_case)
@@ -0,0 +1,92 @@
+"""Unit tests for batch-job resume"""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.components.playbook import Playbook
+from src.models.batch_jobs import BatchJobClient, BatchJobLLM
+from src.models.mock_llm import MockLLM
+
+SCHEMA = {"tables": ["t"], "columns": ["a"]}
+
+
+class FakeBatchClient(BatchJobClient):
+    """Answers every request with SELECT <custom id>; jobs listed in `fail` end expired after `keep` results"""
+
+    def __init__(self, fail=(), keep=0):
+        self.fail = set(fail)
+        self.keep = keep
+        self.jobs = {}
+
+    def submit(self, input_path):
+        job_id = f"job-{len(self.jobs)}"
+        self.jobs[job_id] = [json.loads(line)["custom_id"] for line in Path(input_path).read_text().splitlines()]
+        return job_id
+
+    def poll(self, job_id):
+        total = len(self.jobs[job_id])
+        if job_id in self.fail:
+            return {"status": "expired", "completed": min(self.keep, total), "total": total}
+        return {"status": "completed", "completed": total, "total": total}
+
+    def iter_results(self, job_id, skip=0):
+        ids = self.jobs[job_id][:self.keep] if job_id in self.fail else self.jobs[job_id]
+        for custom_id in ids[skip:]:
+            body = {"choices": [{"message": {"content": f"SELECT {custom_id}"}}], "usage": {}}
+            yield json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": body}})
+
+
+class BatchJobResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.questions = [f"question {i}" for i in range(5)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_job(self, client):
+        llm = BatchJobLLM(MockLLM(), client, self.tmp.name, "deployment", poll_interval=0.0, min_batch_size=1)
+        results = dict(llm.run_job(self.questions, [SCHEMA] * 5, Playbook(), [[]] * 5))
+        return results, llm.stats
+
+    def test_complete_job_is_read_from_disk_on_rerun(self):
+        client = FakeBatchClient()
+        self.run_job(client)
+        results, stats = self.run_job(client)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(stats["results_from_disk"], 5)
+        self.assertEqual(len(client.jobs), 1)
+
+    def test_expired_job_missing_requests_are_resubmitted_on_the_next_run(self):
+        client = FakeBatchClient(fail={"job-0"}, keep=2)
+        results, _ = self.run_job(client)
+        self.assertEqual(sorted(results), [0, 1])
+
+        results, stats = self.run_job(client)
+        self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+        self.assertEqual(results[4], "SELECT q-4")
+        self.assertEqual(client.jobs["job-1"], ["q-2", "q-3", "q-4"])
+        self.assertEqual(stats["jobs_submitted"], 1)
+
+    def test_resumed_job_that_expired_is_resubmitted_in_the_same_run(self):
+        client = FakeBatchClient(fail={"job-0"}, keep=2)
+        # Crash right after submission: the job id is saved, no results are
+        llm = BatchJobLLM(MockLLM(), client, self.tmp.name, "deployment", poll_interval=0.0, min_batch_size=1)
+        generator = llm.run_job(self.questions, [SCHEMA] * 5, Playbook(), [[]] * 5)
+        next(generator)
+        generator.close()
+        for path in Path(self.tmp.name).glob("*/results.jsonl"):
+            path.write_text("")
+
+        results, stats = self.run_job(client)
+        self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+        self.assertEqual(stats["jobs_resumed"], 1)
+        self.assertEqual(stats["jobs_submitted"], 1)
+        self.assertEqual(client.jobs["job-1"], ["q-2", "q-3", "q-4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
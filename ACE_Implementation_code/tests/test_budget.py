@@ -0,0 +1,135 @@
+"""Unit tests for training budgets and example prioritization"""
+
+import contextlib
+import io
+import random
+import unittest
+from unittest import mock
+
+from src.data.dataset import WikiSQLDataset
+from src.models.usage_meter import UsageMeter
+from src.training import budget as budget_module
+from src.training.budget import TrainingBudget, prioritize_examples
+from src.training.trainer import ACETrainer
+
+
+class FakeClock:
+    """Stands in for the time module: monotonic() only moves when advanced"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class TrainingBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(budget_module, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unlimited_budget_is_never_exhausted(self):
+        budget = TrainingBudget()
+        budget.start()
+        self.clock.now += 1e6
+        self.assertFalse(budget.limited)
+        self.assertIsNone(budget.exhausted())
+        self.assertIsNone(budget.affordable_examples())
+
+    def test_seconds_are_counted_from_start(self):
+        budget = TrainingBudget(max_seconds=60)
+        self.clock.now += 100
+        budget.start()
+        self.clock.now += 59
+        self.assertIsNone(budget.exhausted())
+        self.clock.now += 1
+        self.assertEqual(budget.exhausted(), "seconds")
+
+    def test_requests_are_exhausted_at_the_limit(self):
+        budget = TrainingBudget(max_requests=3)
+        budget.start()
+        for _ in range(2):
+            budget.charge_request()
+        self.assertIsNone(budget.exhausted())
+        budget.charge_request()
+        self.assertEqual(budget.exhausted(), "requests")
+
+    def test_tokens_count_only_usage_after_start(self):
+        meter = UsageMeter()
+        meter.record("generation", 500, 100)
+        budget = TrainingBudget(max_tokens=1000, usage_meter=meter)
+        budget.start()
+        meter.record("generation", 800, 100)
+        self.assertIsNone(budget.exhausted())
+        meter.record("embedding", 100)
+        self.assertEqual(budget.exhausted(), "tokens")
+        self.assertEqual(budget.used()["tokens"], 1000)
+
+    def test_token_budget_needs_a_meter(self):
+        with self.assertRaises(ValueError):
+            TrainingBudget(max_tokens=1000)
+
+    def test_first_budget_used_up_is_reported(self):
+        budget = TrainingBudget(max_seconds=10, max_requests=1)
+        budget.start()
+        budget.charge_request()
+        self.clock.now += 10
+        self.assertEqual(budget.exhausted(), "seconds")
+
+    def test_affordable_examples_follow_the_tightest_budget(self):
+        budget = TrainingBudget(max_seconds=100, max_requests=40)
+        budget.start()
+        self.assertIsNone(budget.affordable_examples())
+        for _ in range(5):
+            budget.charge_example()
+            budget.charge_request()
+            budget.charge_request()
+        self.clock.now += 10
+        # 2 s and 2 requests per example: 45 examples of time left, 15 of requests
+        self.assertEqual(budget.affordable_examples(), 15)
+
+    def test_affordable_examples_bottom_out_at_zero(self):
+        budget = TrainingBudget(max_requests=2)
+        budget.start()
+        budget.charge_example()
+        for _ in range(3):
+            budget.charge_request()
+        self.assertEqual(budget.affordable_examples(), 0)
+
+
+class PrioritizeExamplesTest(unittest.TestCase):
+
+    def test_wrong_then_unseen_then_correct(self):
+        examples = [{"question": f"q{i}"} for i in range(9)]
+        outcomes = {"q0": True, "q1": False, "q2": True, "q4": False, "q7": True}
+        ordered = prioritize_examples(examples, outcomes, random.Random(0))
+        groups = [outcomes.get(example["question"]) for example in ordered]
+        self.assertEqual(groups, [False] * 2 + [None] * 4 + [True] * 3)
+        self.assertEqual(sorted(e["question"] for e in ordered), sorted(e["question"] for e in examples))
+
+    def test_order_within_a_group_follows_the_rng(self):
+        examples = [{"question": f"q{i}"} for i in range(20)]
+        first = prioritize_examples(examples, {}, random.Random(1))
+        self.assertEqual(first, prioritize_examples(examples, {}, random.Random(1)))
+        self.assertNotEqual(first, examples)
+        self.assertEqual([e["question"] for e in examples], [f"q{i}" for i in range(20)])
+
+
+class TrainerBudgetTest(unittest.TestCase):
+
+    def test_training_stops_when_the_budget_is_used_up(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            dataset = WikiSQLDataset(sample_size=10, use_real_data=False)
+            trainer = ACETrainer(dataset)
+            budget = TrainingBudget(max_requests=3)
+            trainer.train_offline(dataset.data[:6], num_epochs=3, target_accuracy=101.0, budget=budget)
+        self.assertEqual(budget.requests, 3)
+        self.assertEqual(trainer.metrics["budget"]["exhausted"], "requests")
+        self.assertEqual(len(trainer.metrics["accuracy_history"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
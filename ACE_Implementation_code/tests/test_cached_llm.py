@@ -0,0 +1,70 @@
+"""Unit tests for the response cache's packed-request accounting"""
+
+import asyncio
+import unittest
+
+from src.components.playbook import Playbook
+from src.models.base_llm import BaseLLM
+from src.models.cached_llm import CachedLLM, ResponseCache
+
+SCHEMA = {"tables": ["t"], "columns": ["a"]}
+
+
+class FakeLLM(BaseLLM):
+    """Answers every question with SELECT <question>; packed requests leave `unanswered` questions out"""
+
+    system_message = "single"
+    batch_system_message = "batch"
+
+    def __init__(self, unanswered=()):
+        self.unanswered = set(unanswered)
+        self.batches = 0
+
+    def generate_sql(self, question, schema, playbook, relevant_bullets):
+        return f"SELECT {question}"
+
+    async def agenerate_sql_batch(self, questions, schemas, playbook, relevant_bullets):
+        self.batches += 1
+        return [None if q in self.unanswered else f"SELECT {q}" for q in questions]
+
+
+class CachedBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(":memory:")
+        self.playbook = Playbook()
+
+    def tearDown(self):
+        self.cache.close()
+
+    def batch(self, llm, questions):
+        cached = CachedLLM(llm, self.cache)
+        return asyncio.run(cached.agenerate_sql_batch(questions, [SCHEMA] * len(questions), self.playbook, []))
+
+    def test_each_question_is_one_lookup(self):
+        llm = FakeLLM()
+        self.batch(llm, ["a", "b", "c"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 3))
+
+        self.batch(llm, ["a", "b", "c"])
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 3))
+        self.assertEqual(llm.batches, 1)
+
+    def test_unanswered_questions_are_counted_by_the_fallback(self):
+        llm = FakeLLM(unanswered={"b"})
+        cached = CachedLLM(llm, self.cache)
+        results = self.batch(llm, ["a", "b"])
+        self.assertEqual(results, ["SELECT a", None])
+        cached.generate_sql("b", SCHEMA, self.playbook, [])
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_packed_entry_is_keyed_by_the_batch_system_message(self):
+        llm = FakeLLM()
+        self.batch(llm, ["a", "b"])
+        prompt = llm._build_batch_prompt(["a", "b"], [SCHEMA] * 2, self.playbook, [])
+        self.assertIsNotNone(self.cache.get(ResponseCache.make_key("batch", "FakeLLM", "batch", prompt)))
+        self.assertIsNone(self.cache.get(ResponseCache.make_key("batch", "FakeLLM", "single", prompt)))
+
+
+if __name__ == "__main__":
+    unittest.main()
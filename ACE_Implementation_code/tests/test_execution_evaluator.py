@@ -0,0 +1,87 @@
+"""Unit tests for execution accuracy against in-memory SQLite tables"""
+
+import random
+import unittest
+
+from src.training.execution_evaluator import (
+    ExecutionEvaluator, _Database, _execution_match, _satisfying, _violating
+)
+
+TABLE = "1-10015132-11"
+COLUMNS = ["No.", "Player name", "Position"]
+ROWS = [["3", "Antonio Lang", "Guard"], ["7", "Mo Williams", "Forward"], ["0", "Jim Paxson", "Guard"]]
+
+
+def example(sql: str, table_rows=None) -> dict:
+    return {"sql": sql, "schema": {"tables": [TABLE], "columns": COLUMNS}, "table_rows": table_rows}
+
+
+class QuoteNamesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.database = _Database("orders", ["Order", "Amount"], [], 5)
+
+    def test_keyword_named_column_is_quoted_where_an_identifier_stands(self):
+        self.assertEqual(
+            self.database.quote_names("SELECT Order FROM orders WHERE Order = 1 ORDER BY Amount"),
+            'SELECT "Order" FROM "orders" WHERE "Order" = 1 ORDER BY "Amount"',
+        )
+
+    def test_names_inside_string_literals_are_left_alone(self):
+        self.assertEqual(
+            self.database.quote_names("SELECT Amount FROM orders WHERE Order = 'Order'"),
+            "SELECT \"Amount\" FROM \"orders\" WHERE \"Order\" = 'Order'",
+        )
+
+    def test_keyword_named_column_runs(self):
+        self.assertIsNotNone(self.database.run("SELECT Order FROM orders ORDER BY Order", []))
+
+
+class ProbeValueTest(unittest.TestCase):
+
+    def test_not_equal_probes(self):
+        rng = random.Random(0)
+        for value in (5, 2.5, "sales"):
+            self.assertGreater(_satisfying("<>", value), value)
+            self.assertLess(_satisfying("<>", value, below=True), value)
+            self.assertEqual(_violating("<>", value, rng), value)
+
+    def test_string_probes_respect_the_ordering(self):
+        rng = random.Random(0)
+        self.assertLess(_satisfying("<", "m"), "m")
+        self.assertGreater(_satisfying(">", "m"), "m")
+        self.assertGreaterEqual(_violating("<", "m", rng), "m")
+        self.assertLessEqual(_violating(">", "m", rng), "m")
+
+
+class ExecutionMatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.evaluator = ExecutionEvaluator(num_rows=10)
+
+    def test_wikisql_table_rows_and_raw_names(self):
+        gold = example(f"SELECT Player name FROM {TABLE} WHERE No. = 3", ROWS)
+        self.assertTrue(self.evaluator.is_match(f"SELECT \"Player name\" FROM \"{TABLE}\" WHERE \"No.\" = '3'", gold))
+        self.assertFalse(self.evaluator.is_match(f"SELECT \"Player name\" FROM \"{TABLE}\" WHERE \"No.\" = 7", gold))
+
+    def test_table_rows_decide_otherwise_equivalent_filters(self):
+        # Only the row with No. = 0 tells these apart
+        gold = example(f"SELECT COUNT(Player name) FROM {TABLE}", ROWS)
+        generated = f"SELECT COUNT(Player name) FROM {TABLE} WHERE No. > 0"
+        self.assertFalse(self.evaluator.is_match(generated, gold))
+        self.assertTrue(self.evaluator.is_match(generated, example(gold["sql"], ROWS[:2])))
+
+    def test_not_equal_filter_is_exercised(self):
+        gold = example(f"SELECT Player name FROM {TABLE} WHERE No. <> 3")
+        self.assertFalse(self.evaluator.is_match(f"SELECT Player name FROM {TABLE} WHERE No. > 3", gold))
+        self.assertTrue(self.evaluator.is_match(f"SELECT Player name FROM {TABLE} WHERE NOT No. = 3", gold))
+
+    def test_gold_query_that_fails_to_run_only_matches_canonically(self):
+        gold_sql = f"SELECT Missing FROM {TABLE}"
+        schema = {"tables": [TABLE], "columns": COLUMNS}
+        self.assertFalse(_execution_match((f"SELECT Position FROM {TABLE}", gold_sql, schema, ROWS, 10)))
+        self.assertTrue(_execution_match((f"select missing from {TABLE}", gold_sql, schema, ROWS, 10)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Unit tests for hedged requests: ratio cap and losing-primary handling"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+from src.components.playbook import Playbook
+from src.models import hedged_llm
+from src.models.base_llm import BaseLLM, LLMRequestError
+from src.models.hedged_llm import HedgedLLM
+
+SCHEMA = {"tables": ["t"], "columns": ["a"]}
+# Event-loop turns a slow primary takes; the hedge answers in one
+SLOW_TURNS = 10
+
+
+class FakeClock:
+    """Stands in for the time module: monotonic() only moves when advanced"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class FakeLLM(BaseLLM):
+    """
+    The first attempt at a question is slow (SLOW_TURNS loop turns, 5 fake
+    seconds) and later attempts answer at once; either may be set to fail
+    """
+
+    def __init__(self, clock: FakeClock, primary_fails: bool = False, hedge_fails: bool = False):
+        self.clock = clock
+        self.primary_fails = primary_fails
+        self.hedge_fails = hedge_fails
+        self.attempts = {}
+
+    def generate_sql(self, question, schema, playbook, relevant_bullets):
+        raise NotImplementedError
+
+    async def agenerate_sql(self, question, schema, playbook, relevant_bullets):
+        attempt = self.attempts[question] = self.attempts.get(question, 0) + 1
+        if attempt == 1:
+            for _ in range(SLOW_TURNS):
+                await asyncio.sleep(0)
+            self.clock.now += 5.0
+            if self.primary_fails:
+                raise LLMRequestError("primary failed")
+        elif self.hedge_fails:
+            raise LLMRequestError("hedge failed")
+        return f"SELECT {question} #{attempt}"
+
+
+class HedgedLLMTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(hedged_llm, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.playbook = Playbook()
+
+    def hedged(self, llm: FakeLLM, max_hedge_ratio: float = 1.0) -> HedgedLLM:
+        # A zero deadline: every request is past it before its primary answers
+        hedged = HedgedLLM(llm, percentile=50.0, max_hedge_ratio=max_hedge_ratio, min_samples=10)
+        for _ in range(50):
+            hedged._record_primary(0.0)
+        self.addCleanup(hedged._executor.shutdown)
+        return hedged
+
+    def ask(self, hedged: HedgedLLM, questions):
+        async def scenario():
+            results = [await hedged.agenerate_sql(q, SCHEMA, self.playbook, []) for q in questions]
+            # Let losing primaries finish in the background
+            for _ in range(SLOW_TURNS * 2):
+                await asyncio.sleep(0)
+            return results
+        return asyncio.run(scenario())
+
+    def test_hedge_wins_and_the_losing_primary_finishes_in_the_background(self):
+        hedged = self.hedged(FakeLLM(self.clock))
+        self.assertEqual(self.ask(hedged, ["q"]), ["SELECT q #2"])
+        stats = hedged.hedge_stats()
+        self.assertEqual((stats["hedged"], stats["hedge_wins"]), (1, 1))
+        self.assertEqual(hedged._background, set())
+        # The deadline sees the primary's latency, not the winner's
+        self.assertEqual(stats["primary"]["p99"], 5.0)
+        self.assertEqual(stats["winner"]["p99"], 0.0)
+
+    def test_losing_primary_error_is_not_raised(self):
+        hedged = self.hedged(FakeLLM(self.clock, primary_fails=True))
+        self.assertEqual(self.ask(hedged, ["q"]), ["SELECT q #2"])
+        self.assertEqual(hedged._background, set())
+
+    def test_failed_hedge_falls_back_to_the_primary(self):
+        hedged = self.hedged(FakeLLM(self.clock, hedge_fails=True))
+        self.assertEqual(self.ask(hedged, ["q"]), ["SELECT q #1"])
+        self.assertEqual(hedged.hedge_stats()["hedge_wins"], 0)
+
+    def test_hedges_are_capped_at_the_ratio(self):
+        hedged = self.hedged(FakeLLM(self.clock), max_hedge_ratio=0.25)
+        questions = [f"q{i}" for i in range(8)]
+        results = self.ask(hedged, questions)
+        stats = hedged.hedge_stats()
+        self.assertEqual(stats["requests"], 8)
+        self.assertEqual(stats["hedged"], 2)
+        self.assertLessEqual(stats["hedge_ratio"], 0.25)
+        self.assertEqual(sum(sql.endswith("#2") for sql in results), 2)
+
+    def test_no_hedging_before_min_samples(self):
+        hedged = HedgedLLM(FakeLLM(self.clock), min_samples=10)
+        self.addCleanup(hedged._executor.shutdown)
+        self.assertEqual(self.ask(hedged, ["q"]), ["SELECT q #1"])
+        self.assertIsNone(hedged.hedge_stats()["deadline"])
+        self.assertEqual(hedged.counts["hedged"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Unit tests for the AIMD concurrency controller"""
+
+import unittest
+
+from src.models.rate_limiter import AIMDController, RateLimiter, RetryPolicy, call_with_retry
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+class AIMDControllerTest(unittest.TestCase):
+
+    def test_repeated_throttles_cut_the_limit_without_successes(self):
+        controller = AIMDController(initial=8, minimum=1)
+        for _ in range(50):
+            controller.on_failure(throttled=True)
+        self.assertEqual(controller.limit, 1)
+        self.assertEqual(controller.throttles, 50)
+
+    def test_throttles_within_one_round_trip_cut_once(self):
+        controller = AIMDController(initial=8, minimum=1)
+        controller.on_success(60.0)
+        limit = controller.limit
+        controller.on_failure(throttled=True)
+        controller.on_failure(throttled=True)
+        self.assertAlmostEqual(controller.limit, limit * controller.decrease_factor)
+
+    def test_throttle_after_recovery_cuts_without_a_window_of_successes(self):
+        controller = AIMDController(initial=8, minimum=1)
+        controller.on_failure(throttled=True)
+        controller.on_success(0.0)
+        limit = controller.limit
+        controller.on_failure(throttled=True)
+        self.assertLess(controller.limit, limit)
+
+    def test_other_failures_leave_the_limit(self):
+        controller = AIMDController(initial=8)
+        controller.on_failure(throttled=False)
+        self.assertEqual(controller.limit, 8)
+
+    def test_baseline_follows_steadily_growing_latency(self):
+        controller = AIMDController(initial=8, minimum=1)
+        latency = 1.0
+        for _ in range(2000):
+            controller.on_success(latency)
+            latency *= 1.001  # about 7x over the run, like a growing prompt
+        # A fixed baseline keeps flagging congestion and holds the limit far below the maximum
+        self.assertGreater(controller.limit, 0.75 * controller.maximum)
+
+    def test_latency_spike_cuts_the_limit(self):
+        controller = AIMDController(initial=8, minimum=1)
+        for _ in range(20):
+            controller.on_success(0.0)
+        limit = controller.limit
+        for _ in range(20):
+            controller.on_success(10.0)
+        self.assertLess(controller.limit, limit)
+
+
+class RetryTest(unittest.TestCase):
+
+    def test_failed_attempts_return_their_token_reservation(self):
+        limiter = RateLimiter(tokens_per_minute=60000)
+        full = limiter.tokens.available()
+        attempts = []
+
+        def request():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise Throttled()
+            return "ok"
+
+        result = call_with_retry(request, limiter=limiter, policy=RetryPolicy(base_delay=0.0), tokens=1000)
+        self.assertEqual(result, "ok")
+        self.assertEqual(len(attempts), 3)
+        # Only the successful attempt still holds its reservation
+        self.assertAlmostEqual(limiter.tokens.available(), full - 1000, delta=50)
+
+    def test_non_retryable_error_is_raised(self):
+        def request():
+            raise ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            call_with_retry(request, policy=RetryPolicy(base_delay=0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""Unit tests for latency-aware routing, failover and drain recovery"""
+
+import unittest
+from unittest import mock
+
+from src.components.playbook import Playbook
+from src.models import router_llm
+from src.models.base_llm import BaseLLM, LLMRequestError
+from src.models.router_llm import Backend, RoutedLLM
+
+SCHEMA = {"tables": ["t"], "columns": ["a"]}
+
+
+class FakeClock:
+    """Stands in for the time module: monotonic() only moves when advanced"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class FakeLLM(BaseLLM):
+    """Answers after `latency` seconds of fake time, or raises LLMRequestError while `failing`"""
+
+    def __init__(self, name: str, clock: FakeClock, latency: float = 1.0, failing: bool = False):
+        self.name = name
+        self.clock = clock
+        self.latency = latency
+        self.failing = failing
+        self.calls = 0
+
+    def generate_sql(self, question, schema, playbook, relevant_bullets):
+        self.calls += 1
+        self.clock.now += self.latency
+        if self.failing:
+            raise LLMRequestError(f"{self.name} is down")
+        return f"SELECT {self.name}"
+
+
+class RoutedLLMTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(router_llm, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.a = FakeLLM("a", self.clock, latency=1.0)
+        self.b = FakeLLM("b", self.clock, latency=2.0)
+        self.router = RoutedLLM([Backend("a", self.a), Backend("b", self.b)], failure_threshold=2,
+                                drain_seconds=10.0, explore_rate=0.0)
+        self.playbook = Playbook()
+
+    def ask(self) -> str:
+        return self.router.generate_sql("q", SCHEMA, self.playbook, [])
+
+    def backend(self, name: str) -> dict:
+        return self.router.routing_stats()["backends"][name]
+
+    def test_lowest_latency_backend_wins_once_both_are_measured(self):
+        self.ask()
+        self.ask()
+        self.assertEqual(self.ask(), "SELECT a")
+        self.assertEqual(self.backend("a")["latency_ewma"], 1.0)
+        self.assertEqual(self.backend("b")["latency_ewma"], 2.0)
+
+    def test_failed_request_fails_over_and_repeated_failures_drain(self):
+        self.a.failing = True
+        self.assertEqual(self.ask(), "SELECT b")
+        self.assertEqual(self.router.decisions["failovers"], 1)
+        self.assertEqual(self.backend("a")["state"], "healthy")
+
+        self.ask()
+        self.assertEqual(self.backend("a")["state"], "drained")
+        calls = self.a.calls
+        self.assertEqual(self.ask(), "SELECT b")
+        self.assertEqual(self.a.calls, calls)
+        self.assertEqual(self.router.decisions["failovers"], 2)
+
+    def test_all_backends_failing_raises(self):
+        self.a.failing = self.b.failing = True
+        with self.assertRaisesRegex(LLMRequestError, "All 2 backends failed"):
+            self.ask()
+
+    def test_probe_after_cooldown_recovers_the_backend(self):
+        self.a.failing = True
+        self.ask()
+        self.ask()
+        self.a.failing = False
+        self.a.latency = 0.5
+        self.clock.now += 10.0
+
+        self.assertEqual(self.ask(), "SELECT a")
+        stats = self.backend("a")
+        self.assertEqual(stats["state"], "healthy")
+        self.assertEqual(stats["recoveries"], 1)
+        # Fresh estimate, not blended with the latency from before the drain
+        self.assertEqual(stats["latency_ewma"], 0.5)
+
+    def test_failed_probe_drains_again_for_twice_as_long(self):
+        self.a.failing = True
+        self.ask()
+        self.ask()
+        self.clock.now += 10.0
+        self.ask()
+        stats = self.backend("a")
+        self.assertEqual(stats["state"], "drained")
+        self.assertEqual(stats["drains"], 2)
+        self.assertEqual(self.router.backends[0].drain_seconds, 20.0)
+
+    def test_only_one_probe_is_in_flight(self):
+        self.a.failing = True
+        self.ask()
+        self.ask()
+        self.clock.now += 10.0
+        first = self.router._choose([])
+        second = self.router._choose([])
+        self.assertEqual((first.name, second.name), ("a", "b"))
+
+    def test_everything_drained_tries_the_backend_that_returns_first(self):
+        self.a.failing = self.b.failing = True
+        for _ in range(2):
+            with self.assertRaises(LLMRequestError):
+                self.ask()
+        self.assertEqual(self.backend("a")["state"], "drained")
+        self.assertEqual(self.backend("b")["state"], "drained")
+        self.assertEqual(self.router._choose([]).name, "a")
+        self.assertEqual(self.router.decisions["all_drained"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Unit tests for the SQL canonicalizer"""
+
+import unittest
+
+from src.utils.sql_canonical import canonical_sql_text, sql_equal
+
+
+class SqlEqualTest(unittest.TestCase):
+
+    def test_whitespace_keyword_case_and_identifier_quotes_are_ignored(self):
+        self.assertTrue(sql_equal('select  "Name" from T', "SELECT name FROM t"))
+
+    def test_reordered_conjunction_is_equal(self):
+        self.assertTrue(sql_equal("SELECT a FROM t WHERE b = 1 AND c = 2",
+                                  "SELECT a FROM t WHERE c = 2 AND b = 1"))
+
+    def test_between_bounds_stay_with_their_column(self):
+        self.assertFalse(sql_equal("SELECT a FROM t WHERE a BETWEEN 1 AND 5 AND b BETWEEN 2 AND 3",
+                                   "SELECT a FROM t WHERE a BETWEEN 1 AND 3 AND b BETWEEN 2 AND 5"))
+
+    def test_between_conditions_can_be_reordered(self):
+        self.assertTrue(sql_equal("SELECT a FROM t WHERE a BETWEEN 1 AND 5 AND b = 2",
+                                  "SELECT a FROM t WHERE b = 2 AND a BETWEEN 1 AND 5"))
+
+    def test_or_is_not_reordered(self):
+        self.assertFalse(sql_equal("SELECT a FROM t WHERE b = 1 AND c = 2 OR d = 3",
+                                   "SELECT a FROM t WHERE c = 2 OR d = 3 AND b = 1"))
+
+    def test_parentheses_are_not_reordered(self):
+        # Conservative: grouped conditions are compared as written
+        self.assertFalse(sql_equal("SELECT a FROM t WHERE (b = 1 OR c = 2) AND d = 3",
+                                   "SELECT a FROM t WHERE d = 3 AND (b = 1 OR c = 2)"))
+        self.assertFalse(sql_equal("SELECT a FROM t WHERE (b = 1 OR c = 2) AND d = 3",
+                                   "SELECT a FROM t WHERE (b = 1 OR d = 3) AND c = 2"))
+
+    def test_different_values_differ(self):
+        self.assertFalse(sql_equal("SELECT a FROM t WHERE b = 1", "SELECT a FROM t WHERE b = 2"))
+
+    def test_literal_case_is_folded_by_default(self):
+        self.assertTrue(sql_equal("SELECT a FROM t WHERE n = 'Alice'", "SELECT a FROM t WHERE n = 'ALICE'"))
+
+    def test_literal_case_can_be_compared_exactly(self):
+        self.assertFalse(sql_equal("SELECT a FROM t WHERE n = 'Alice'", "SELECT a FROM t WHERE n = 'ALICE'",
+                                   fold_literal_case=False))
+        self.assertTrue(sql_equal("select a from t where n = 'Alice'", "SELECT a FROM t WHERE n = 'Alice'",
+                                  fold_literal_case=False))
+
+    def test_canonical_text_sorts_conditions(self):
+        self.assertEqual(canonical_sql_text("SELECT a FROM t WHERE c = 2 AND b BETWEEN 1 AND 3"),
+                         "SELECT a FROM t WHERE b BETWEEN 1 AND 3 AND c = 2")
+
+
+if __name__ == "__main__":
+    unittest.main()
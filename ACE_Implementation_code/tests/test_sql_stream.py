@@ -0,0 +1,62 @@
+"""Unit tests for end-of-statement detection in streamed SQL responses"""
+
+import unittest
+
+from src.models.sql_stream import SQLStreamParser, statement_end
+
+
+def streamed(text: str) -> str:
+    """Feed text one character at a time, as a stream would, and return the kept part"""
+    parser = SQLStreamParser()
+    for char in text:
+        if parser.feed(char):
+            break
+    return parser.result()
+
+
+class StatementEndTest(unittest.TestCase):
+
+    def assertCut(self, text: str, expected: str):
+        self.assertEqual(streamed(text), expected)
+        end = statement_end(text)
+        self.assertEqual(text if end is None else text[:end], expected)
+
+    def test_semicolon_ends_the_statement(self):
+        self.assertCut("SELECT a FROM t;\nThis returns a.", "SELECT a FROM t;")
+
+    def test_semicolon_inside_a_string_does_not_end_it(self):
+        self.assertCut("SELECT a FROM t WHERE b = 'x;y';", "SELECT a FROM t WHERE b = 'x;y';")
+
+    def test_semicolon_inside_a_line_comment_does_not_end_it(self):
+        self.assertCut("SELECT a FROM t -- c; x\nWHERE b=1;", "SELECT a FROM t -- c; x\nWHERE b=1;")
+
+    def test_semicolon_inside_a_block_comment_does_not_end_it(self):
+        self.assertCut("SELECT a FROM t /* ; */ WHERE b = 1;", "SELECT a FROM t /* ; */ WHERE b = 1;")
+
+    def test_closing_fence_ends_the_statement(self):
+        self.assertCut("```sql\nSELECT a FROM t\n```\nDone.", "```sql\nSELECT a FROM t")
+
+    def test_clause_on_the_next_line_continues(self):
+        for clause in ("WHERE b = 1", "NATURAL JOIN u", "WINDOW w AS (ORDER BY a)",
+                       "FETCH FIRST 5 ROWS ONLY", "ORDER BY a"):
+            text = f"SELECT a FROM t\n{clause}"
+            self.assertCut(text, text)
+
+    def test_unknown_word_on_the_next_line_keeps_reading(self):
+        self.assertCut("SELECT a FROM t\nfoo JOIN u", "SELECT a FROM t\nfoo JOIN u")
+
+    def test_comment_line_before_a_clause_continues(self):
+        text = "SELECT a FROM t\n-- only recent rows\nWHERE b > 1"
+        self.assertCut(text, text)
+
+    def test_prose_after_the_query_is_cut(self):
+        self.assertCut("SELECT a FROM t\nThis query returns a.", "SELECT a FROM t")
+        self.assertCut("SELECT a FROM t\n\nExplanation: it selects a.", "SELECT a FROM t")
+
+    def test_incomplete_statement_is_kept_whole(self):
+        self.assertIsNone(statement_end("SELECT a FROM t WHERE"))
+        self.assertCut("SELECT a FROM t WHERE", "SELECT a FROM t WHERE")
+
+
+if __name__ == "__main__":
+    unittest.main()